@@ -154,7 +154,10 @@ class CustomUser(AbstractUser, PermissionsMixin):
 
 class DriverProfile(models.Model):
     class Meta:
-        indexes = [models.Index(fields=["capacity"])]
+        indexes = [
+            models.Index(fields=["capacity"]),
+            models.Index(fields=["is_available", "capacity"]),
+        ]
 
     user = models.OneToOneField(
         CustomUser,
@@ -169,6 +172,17 @@ class DriverProfile(models.Model):
         help_text="Capacity in kg or liters",
         default=10,
     )
+    is_available = models.BooleanField(
+        default=True, help_text="Driver has no assigned or in-transit orders"
+    )
+    active_load = models.PositiveIntegerField(
+        default=0, help_text="Number of assigned or in-transit orders"
+    )
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    location_updated_at = models.DateTimeField(
+        null=True, blank=True, help_text="Time of the last reported position"
+    )
 
     def clean(self):
         if self.user.role != "driver":
@@ -123,9 +123,9 @@ def logout_user(request):
 
 
 def user_list_page(request):
-    if request.user.is_authenticated():
-        if request.user.is_superuser():
-            users = CustomUser.objects.filter(is_active=True).exclude(role="admin")
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("You do not have permission to view this page.")
+    users = CustomUser.objects.filter(is_active=True).exclude(role="admin")
     return render(request, "accounts/user_list.html", {"users": users})
 
 
@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DeliveryTariff
+
+
+@admin.register(DeliveryTariff)
+class DeliveryTariffAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "max_distance_km",
+        "base_price",
+        "price_per_km",
+        "price_per_kg",
+        "is_active",
+    )
+    list_filter = ("is_active",)
@@ -2,5 +2,9 @@ from django.apps import AppConfig
 
 
 class DeliveryConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.delivery'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "apps.delivery"
+
+    def ready(self):
+        import apps.delivery.checks
+        import apps.delivery.signals
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from apps.delivery.pubsub import uses_process_local_broker
+
+
+@register()
+def check_pubsub_broker(app_configs, **kwargs):
+    if settings.DEBUG or not uses_process_local_broker():
+        return []
+    return [
+        Warning(
+            "Live order updates use the in-process pub/sub broker, so status "
+            "changes made by Celery workers never reach subscribers.",
+            hint="Set DELIVERY_PUBSUB_REDIS_URL or use a Redis CELERY_BROKER_URL.",
+            id="delivery.W001",
+        )
+    ]
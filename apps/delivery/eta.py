@@ -0,0 +1,274 @@
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.delivery.geocoding import geocode_many, haversine
+from apps.delivery.models import TravelSpeed
+from apps.orders.models import Order, OrderEvent
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+VERSION_CACHE_KEY = "delivery:travel_speed:version"
+CURSOR_CACHE_KEY = "delivery:travel_speed:cursor"
+LOCK_CACHE_KEY = "delivery:travel_speed:lock"
+
+
+def _setting(name, default):
+    return getattr(settings, f"DELIVERY_ETA_{name}", default)
+
+
+def zones_of(points):
+    """Zone keys of ``(lat, lon)`` points on a grid of ``DELIVERY_ETA_ZONE_DEGREES``."""
+    size = _setting("ZONE_DEGREES", 0.05)
+    cells = np.floor(np.asarray(points, dtype=float).reshape(-1, 2) / size)
+    return [f"{int(row)}:{int(col)}" for row, col in cells]
+
+
+def hour_of_week(moment):
+    local = timezone.localtime(moment)
+    return local.weekday() * 24 + local.hour
+
+
+def update_travel_speeds(batch_size=5000):
+    """
+    Fold delivery legs completed since the last run into ``TravelSpeed``.
+
+    A leg runs from an order's ``in_transit`` event to its ``delivered``
+    event, over the estimated road distance between its pickup and drop-off,
+    and is counted in the drop-off's zone and the hour of the week it
+    started. Implausible speeds are discarded. Returns the number of legs
+    added.
+    """
+    if not cache.add(LOCK_CACHE_KEY, 1, timeout=600):
+        logger.info("Travel speeds are already being updated, skipping.")
+        return 0
+    try:
+        added = 0
+        while True:
+            cursor = cache.get(CURSOR_CACHE_KEY)
+            if cursor is None:
+                cursor = (
+                    TravelSpeed.objects.aggregate(cursor=Max("last_event_id"))["cursor"]
+                    or 0
+                )
+            events = list(
+                OrderEvent.objects.filter(
+                    id__gt=cursor, from_status="in_transit", to_status="delivered"
+                )
+                .order_by("id")
+                .values_list("id", "order_id", "created_at")[:batch_size]
+            )
+            if not events:
+                break
+            added += _add_legs(events)
+            cache.set(CURSOR_CACHE_KEY, events[-1][0], timeout=None)
+            if len(events) < batch_size:
+                break
+    finally:
+        cache.delete(LOCK_CACHE_KEY)
+
+    if added:
+        speed_table.invalidate()
+    logger.info(f"Added {added} delivery legs to the travel speed tables.")
+    return added
+
+
+def _add_legs(events):
+    order_ids = {order_id for _, order_id, _ in events}
+    started = dict(
+        OrderEvent.objects.filter(order_id__in=order_ids, to_status="in_transit")
+        .values("order_id")
+        .annotate(at=Max("created_at"))
+        .values_list("order_id", "at")
+    )
+    addresses = {
+        order_id: (pickup, dropoff)
+        for order_id, pickup, dropoff in Order.objects.filter(
+            pk__in=order_ids
+        ).values_list("pk", "pickup_address", "dropoff_address")
+    }
+    points = geocode_many(
+        [address for pair in addresses.values() for address in pair if address]
+    )
+
+    legs = []
+    for _, order_id, delivered_at in events:
+        start = started.get(order_id)
+        pickup, dropoff = addresses.get(order_id, (None, None))
+        if start is None or start >= delivered_at:
+            continue
+        if not points.get(pickup) or not points.get(dropoff):
+            continue
+        legs.append(
+            (
+                points[pickup],
+                points[dropoff],
+                (delivered_at - start).total_seconds(),
+                hour_of_week(start),
+            )
+        )
+    if not legs:
+        return 0
+
+    origins, destinations, durations, hours = zip(*legs)
+    distances = haversine(origins, destinations) * getattr(
+        settings, "DELIVERY_ROUTE_FACTOR", 1.3
+    )
+    durations = np.array(durations)
+    speeds = distances / durations * 3600
+    plausible = (speeds >= _setting("MIN_SPEED", 1.0)) & (
+        speeds <= _setting("MAX_SPEED", 150.0)
+    )
+
+    totals = {}
+    zones = zones_of(destinations)
+    for i in np.flatnonzero(plausible):
+        slot = totals.setdefault((zones[i], hours[i]), [0, 0.0, 0.0])
+        slot[0] += 1
+        slot[1] += float(distances[i])
+        slot[2] += float(durations[i])
+
+    last_event_id = events[-1][0]
+    with transaction.atomic():
+        existing = {
+            (row.zone, row.hour_of_week): row
+            for row in TravelSpeed.objects.select_for_update().filter(
+                zone__in={zone for zone, _ in totals}
+            )
+        }
+        fresh = []
+        for (zone, hour), (samples, distance, duration) in totals.items():
+            row = existing.get((zone, hour))
+            if row is None:
+                row = TravelSpeed(zone=zone, hour_of_week=hour)
+                fresh.append(row)
+            row.samples += samples
+            row.distance_km += distance
+            row.duration_seconds += duration
+            row.last_event_id = last_event_id
+        TravelSpeed.objects.bulk_create(fresh)
+        TravelSpeed.objects.bulk_update(
+            [row for key, row in existing.items() if key in totals],
+            ["samples", "distance_km", "duration_seconds", "last_event_id"],
+        )
+    return int(plausible.sum())
+
+
+class SpeedTable:
+    """
+    Average speeds per zone and hour of the week as NumPy arrays.
+
+    Slots with fewer than ``DELIVERY_ETA_MIN_SAMPLES`` legs fall back to the
+    zone's average over the week, then to the hour's average over all
+    zones, then to ``DELIVERY_ETA_DEFAULT_SPEED``. The table is loaded
+    lazily and reloaded when the version counter in the cache changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._zones = {}
+        self._slot_speeds = np.empty((0, HOURS_PER_WEEK))
+        self._zone_speeds = np.empty(0)
+        self._hour_speeds = np.full(HOURS_PER_WEEK, np.nan)
+
+    def _current_version(self):
+        return cache.get_or_set(VERSION_CACHE_KEY, 1, timeout=None)
+
+    def _load(self, version):
+        rows = list(
+            TravelSpeed.objects.values_list(
+                "zone", "hour_of_week", "samples", "distance_km", "duration_seconds"
+            )
+        )
+        self._zones = {}
+        for zone, *_ in rows:
+            self._zones.setdefault(zone, len(self._zones))
+
+        shape = (len(self._zones), HOURS_PER_WEEK)
+        samples = np.zeros(shape)
+        distances = np.zeros(shape)
+        durations = np.zeros(shape)
+        for zone, hour, count, distance, duration in rows:
+            row = self._zones[zone]
+            samples[row, hour] = count
+            distances[row, hour] = distance
+            durations[row, hour] = duration
+
+        minimum = _setting("MIN_SAMPLES", 5)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._slot_speeds = np.where(
+                samples >= minimum, distances / durations * 3600, np.nan
+            )
+            self._zone_speeds = np.where(
+                samples.sum(axis=1) >= minimum,
+                distances.sum(axis=1) / durations.sum(axis=1) * 3600,
+                np.nan,
+            )
+            self._hour_speeds = np.where(
+                samples.sum(axis=0) >= minimum,
+                distances.sum(axis=0) / durations.sum(axis=0) * 3600,
+                np.nan,
+            )
+        self._version = version
+        logger.debug(f"Loaded travel speeds for {len(self._zones)} zones (v{version}).")
+
+    def speeds(self, zones, hours):
+        """Expected speeds in km/h for paired zone keys and hours of the week."""
+        hours = np.asarray(hours, dtype=int)
+        with self._lock:
+            version = self._current_version()
+            if version != self._version:
+                self._load(version)
+            rows = np.array([self._zones.get(zone, -1) for zone in zones], dtype=int)
+            known = rows >= 0
+
+            speeds = np.full(len(rows), np.nan)
+            speeds[known] = self._slot_speeds[rows[known], hours[known]]
+            missing = np.isnan(speeds) & known
+            speeds[missing] = self._zone_speeds[rows[missing]]
+            missing = np.isnan(speeds)
+            speeds[missing] = self._hour_speeds[hours[missing]]
+        return np.where(np.isnan(speeds), _setting("DEFAULT_SPEED", 25.0), speeds)
+
+    def invalidate(self):
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+        with self._lock:
+            self._version = None
+
+
+speed_table = SpeedTable()
+
+
+def travel_times(origins, destinations, departure=None):
+    """Expected seconds to travel between paired ``(lat, lon)`` points."""
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    distances = haversine(origins, destinations) * getattr(
+        settings, "DELIVERY_ROUTE_FACTOR", 1.3
+    )
+    hours = np.full(len(destinations), hour_of_week(departure or timezone.now()))
+    return distances / speed_table.speeds(zones_of(destinations), hours) * 3600
+
+
+def route_eta(points, start=None, departure=None):
+    """
+    Seconds from ``departure`` until arrival at each of ``points``, visited
+    in order from ``start`` (or from the first point if not given), with
+    ``DELIVERY_ETA_STOP_SECONDS`` spent at every stop along the way.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if not len(points):
+        return np.empty(0)
+    origins = np.vstack(([start] if start is not None else points[:1], points[:-1]))
+    legs = travel_times(origins, points, departure)
+    return np.cumsum(legs) + _setting("STOP_SECONDS", 120) * np.arange(len(points))
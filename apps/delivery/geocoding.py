@@ -0,0 +1,291 @@
+import csv
+import logging
+import re
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.accounts.models import ShopProfile
+from apps.delivery.models import GeocodedAddress
+from apps.orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+MATRIX_VERSION_KEY = "delivery:distance_matrix:version"
+DROPOFFS_CACHE_KEY = "delivery:distance_matrix:dropoffs"
+MATRIX_CACHE_KEY = "delivery:distance_matrix:{}:{}"
+
+ABBREVIATIONS = {
+    "st": "street",
+    "str": "street",
+    "ave": "avenue",
+    "av": "avenue",
+    "rd": "road",
+    "blvd": "boulevard",
+    "ln": "lane",
+    "dr": "drive",
+    "sq": "square",
+    "pl": "place",
+    "apt": "apartment",
+}
+
+_punctuation = re.compile(r"[^\w\s]")
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_address(address):
+    """Canonical form of a free-text address used as the geocoding key."""
+    if not address:
+        return ""
+    text = unicodedata.normalize("NFKC", address).lower()
+    text = _punctuation.sub(" ", text)
+    words = [ABBREVIATIONS.get(word, word) for word in _whitespace.split(text) if word]
+    return " ".join(words)[:255]
+
+
+class Gazetteer:
+    """
+    Local address -> coordinates lookup loaded from the CSV file at
+    ``DELIVERY_GAZETTEER_PATH`` with ``address,latitude,longitude`` columns.
+
+    Entries may be street-level; a lookup for "12 elm avenue" falls back to
+    "elm avenue" by dropping leading words.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        path = self.path or getattr(settings, "DELIVERY_GAZETTEER_PATH", None)
+        entries = {}
+        if path:
+            with open(path, newline="", encoding="utf-8") as fh:
+                for row in csv.DictReader(fh):
+                    key = normalize_address(row["address"])
+                    if key:
+                        entries[key] = (float(row["latitude"]), float(row["longitude"]))
+        logger.info(f"Loaded {len(entries)} gazetteer entries from {path}.")
+        return entries
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def lookup(self, normalized):
+        words = normalized.split()
+        for start in range(len(words)):
+            point = self.entries.get(" ".join(words[start:]))
+            if point:
+                return point
+        return None
+
+
+gazetteer = Gazetteer()
+
+
+def geocode_many(addresses):
+    """
+    Resolve addresses to ``(latitude, longitude)`` or None.
+
+    Every distinct normalized address is looked up in the cache table with
+    one query; only unseen ones go to the gazetteer and are then stored,
+    so each address is geocoded once no matter how many orders use it.
+    Misses are retried once they are ``DELIVERY_GEOCODE_MISS_TTL`` seconds
+    old, so addresses added to the gazetteer are picked up.
+    """
+    keys = {address: normalize_address(address) for address in set(addresses)}
+    wanted = set(keys.values()) - {""}
+
+    known = {
+        row.normalized: row
+        for row in GeocodedAddress.objects.filter(normalized__in=wanted)
+    }
+    expired = timezone.now() - timedelta(
+        seconds=getattr(settings, "DELIVERY_GEOCODE_MISS_TTL", 86400)
+    )
+    stale = [
+        key for key, row in known.items() if not row.found and row.created_at < expired
+    ]
+    if stale:
+        GeocodedAddress.objects.filter(normalized__in=stale).delete()
+        for key in stale:
+            del known[key]
+        # Addresses first seen here are geocoded by the matrix build itself;
+        # only a retried miss can change a point the matrix already holds.
+        invalidate_distance_matrix()
+
+    fresh = []
+    for key in wanted - set(known):
+        point = gazetteer.lookup(key)
+        entry = GeocodedAddress(
+            normalized=key,
+            latitude=point[0] if point else None,
+            longitude=point[1] if point else None,
+        )
+        known[key] = entry
+        fresh.append(entry)
+    if fresh:
+        GeocodedAddress.objects.bulk_create(fresh, ignore_conflicts=True)
+        logger.debug(f"Geocoded {len(fresh)} new addresses.")
+
+    points = {}
+    for address, key in keys.items():
+        entry = known.get(key)
+        points[address] = (
+            (entry.latitude, entry.longitude) if entry and entry.found else None
+        )
+    return points
+
+
+def geocode(address):
+    return geocode_many([address])[address]
+
+
+def _radians(points):
+    return np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+
+
+def haversine(origins, destinations):
+    """Great-circle distances in km between paired ``(lat, lon)`` points."""
+    a, b = _radians(origins), _radians(destinations)
+    dlat = b[:, 0] - a[:, 0]
+    dlon = b[:, 1] - a[:, 1]
+    h = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def haversine_matrix(origins, destinations):
+    """All-pairs great-circle distances in km as an ``(n, m)`` array."""
+    a, b = _radians(origins), _radians(destinations)
+    dlat = b[None, :, 0] - a[:, None, 0]
+    dlon = b[None, :, 1] - a[:, None, 1]
+    h = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(a[:, None, 0]) * np.cos(b[None, :, 0]) * np.sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def route_distances(pickups, dropoffs):
+    """
+    Estimated road distance in km for each pickup/drop-off pair: the
+    great-circle distance scaled by ``DELIVERY_ROUTE_FACTOR``. Pairs with an
+    address that cannot be geocoded get NaN.
+    """
+    points = geocode_many(list(pickups) + list(dropoffs))
+    missing = (np.nan, np.nan)
+    origins = [points[address] or missing for address in pickups]
+    destinations = [points[address] or missing for address in dropoffs]
+    factor = getattr(settings, "DELIVERY_ROUTE_FACTOR", 1.3)
+    return haversine(origins, destinations) * factor
+
+
+class DistanceMatrix:
+    """Precomputed distances between labelled origins and destinations."""
+
+    def __init__(self, origins, destinations, distances):
+        self.origins = {key: i for i, key in enumerate(origins)}
+        self.destinations = {key: i for i, key in enumerate(destinations)}
+        self.distances = distances
+
+    def distance(self, origin, destination):
+        """Distance in km, or None if either end is not in the matrix."""
+        i = self.origins.get(origin)
+        j = self.destinations.get(normalize_address(destination))
+        if i is None or j is None:
+            return None
+        return float(self.distances[i, j])
+
+
+def invalidate_distance_matrix():
+    """Retire the cached matrix after shop addresses or geocodes change."""
+    try:
+        cache.incr(MATRIX_VERSION_KEY)
+    except ValueError:
+        cache.set(MATRIX_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def refresh_frequent_dropoffs(top=None):
+    """
+    Store the ``DELIVERY_MATRIX_DROPOFFS`` most frequent drop-off addresses
+    for ``shop_dropoff_matrix``. Run periodically rather than per lookup, as
+    it aggregates over every order.
+    """
+    top = top or getattr(settings, "DELIVERY_MATRIX_DROPOFFS", 500)
+    dropoffs = list(
+        Order.objects.exclude(dropoff_address__isnull=True)
+        .values("dropoff_address")
+        .annotate(uses=Count("pk"))
+        .order_by("-uses")
+        .values_list("dropoff_address", flat=True)[:top]
+    )
+    previous = cache.get(DROPOFFS_CACHE_KEY)
+    built = int(time.time() * 1000)
+    if previous and previous[0] >= built:
+        built = previous[0] + 1
+    entry = (built, dropoffs)
+    cache.set(DROPOFFS_CACHE_KEY, entry, timeout=None)
+    return entry
+
+
+def shop_dropoff_matrix(timeout=3600):
+    """
+    Distances from every geocoded shop to the most frequent drop-off
+    addresses, keyed by shop user id and normalized address.
+
+    The matrix is cached under the matrix version and the time the drop-off
+    list was built, so a lookup costs two cache reads; it is rebuilt only
+    after ``invalidate_distance_matrix`` or ``refresh_frequent_dropoffs``.
+    """
+    state = cache.get_many([MATRIX_VERSION_KEY, DROPOFFS_CACHE_KEY])
+    if MATRIX_VERSION_KEY not in state:
+        cache.add(MATRIX_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        state[MATRIX_VERSION_KEY] = cache.get(MATRIX_VERSION_KEY)
+    built, dropoffs = state.get(DROPOFFS_CACHE_KEY) or refresh_frequent_dropoffs()
+
+    key = MATRIX_CACHE_KEY.format(state[MATRIX_VERSION_KEY], built)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = _build_matrix(dropoffs)
+        cache.set(key, matrix, timeout)
+    return matrix
+
+
+def _build_matrix(dropoffs):
+    shops = list(
+        ShopProfile.objects.exclude(address__isnull=True).values_list(
+            "user_id", "address"
+        )
+    )
+    points = geocode_many([address for _, address in shops] + dropoffs)
+
+    origins = [
+        (shop_id, points[address]) for shop_id, address in shops if points[address]
+    ]
+    destinations = {}
+    for address in dropoffs:
+        if points[address]:
+            destinations.setdefault(normalize_address(address), points[address])
+
+    distances = haversine_matrix(
+        [point for _, point in origins], list(destinations.values())
+    )
+    return DistanceMatrix([shop_id for shop_id, _ in origins], destinations, distances)
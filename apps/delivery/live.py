@@ -0,0 +1,113 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.delivery.pubsub import (
+    customer_channel,
+    driver_channel,
+    get_broker,
+    order_channel,
+    publish,
+)
+from apps.orders.models import Order
+
+
+def publish_status_updates(events):
+    """
+    Push ``(order_id, from_status, to_status, driver_id)`` events to the
+    order and customer channels. Customers are looked up with one query.
+    """
+    customers = dict(
+        Order.objects.filter(pk__in={event[0] for event in events}).values_list(
+            "pk", "customer_id"
+        )
+    )
+    for order_id, from_status, to_status, driver_id in events:
+        message = {
+            "type": "status",
+            "order": order_id,
+            "from_status": from_status,
+            "status": to_status,
+            "driver": driver_id,
+        }
+        publish(order_channel(order_id), message)
+        if customers.get(order_id):
+            publish(customer_channel(customers[order_id]), message)
+
+
+def publish_positions(positions):
+    """Push ``{driver_id: (latitude, longitude, recorded_at)}`` to driver channels."""
+    for driver_id, (latitude, longitude, recorded_at) in positions.items():
+        publish(
+            driver_channel(driver_id),
+            {
+                "type": "position",
+                "driver": driver_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "recorded_at": recorded_at,
+            },
+        )
+
+
+class OrderFeed:
+    """
+    Live updates for a set of orders.
+
+    Besides the fixed order or customer channels, the feed follows the
+    channel of each driver currently carrying one of the orders, so that
+    position updates arrive only while a driver is on the job.
+    """
+
+    def __init__(self, channels, drivers):
+        self.subscription = get_broker().subscribe(channels)
+        self.drivers = {}
+        for order_id, driver_id in drivers.items():
+            self.follow(order_id, driver_id)
+
+    def follow(self, order_id, driver_id):
+        previous = self.drivers.pop(order_id, None)
+        if driver_id:
+            self.drivers[order_id] = driver_id
+            self.subscription.add(driver_channel(driver_id))
+        if previous and previous not in self.drivers.values():
+            self.subscription.discard(driver_channel(previous))
+
+    def handle(self, message):
+        if message["type"] != "status":
+            return
+        order_id = message["order"]
+        driver_id = None
+        if message["status"] in Order.ACTIVE_STATUSES:
+            driver_id = message["driver"] or self.drivers.get(order_id)
+        self.follow(order_id, driver_id)
+
+    def close(self):
+        self.subscription.close()
+
+
+def format_event(message):
+    data = json.dumps(message, cls=DjangoJSONEncoder)
+    return f"event: {message['type']}\ndata: {data}\n\n"
+
+
+async def event_stream(feed, snapshot, heartbeat=None):
+    """
+    Server-Sent Events for ``feed``: the ``snapshot`` message first, then
+    every update, with a comment line when idle for ``heartbeat`` seconds
+    to keep proxies from closing the connection.
+    """
+    if heartbeat is None:
+        heartbeat = getattr(settings, "DELIVERY_STREAM_HEARTBEAT", 15)
+    try:
+        yield format_event(snapshot)
+        while True:
+            message = await feed.subscription.get(timeout=heartbeat)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            feed.handle(message)
+            yield format_event(message)
+    finally:
+        feed.close()
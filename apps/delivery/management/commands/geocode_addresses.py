@@ -0,0 +1,34 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import CustomerProfile, ShopProfile
+from apps.delivery.geocoding import geocode_many
+from apps.orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Warm the geocode cache for every distinct address in the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        addresses = set(
+            chain(
+                Order.objects.values_list("pickup_address", flat=True).distinct(),
+                Order.objects.values_list("dropoff_address", flat=True).distinct(),
+                ShopProfile.objects.values_list("address", flat=True),
+                CustomerProfile.objects.values_list("address", flat=True),
+            )
+        )
+        addresses.discard(None)
+        addresses = sorted(addresses)
+
+        found = 0
+        size = options["batch_size"]
+        for start in range(0, len(addresses), size):
+            points = geocode_many(addresses[start : start + size])
+            found += sum(1 for point in points.values() if point)
+
+        self.stdout.write(f"Geocoded {found} of {len(addresses)} distinct addresses.")
@@ -1,3 +1,111 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+from apps.accounts.models import CustomUser
+
+
+class DeliveryTariff(models.Model):
+    """
+    Price list for one distance zone. Zones are bands of route distance: a
+    tariff applies to deliveries longer than the previous zone's
+    ``max_distance_km`` and up to its own.
+    """
+
+    class Meta:
+        ordering = ["max_distance_km"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["max_distance_km"],
+                condition=models.Q(is_active=True),
+                name="unique_active_tariff_zone",
+            )
+        ]
+
+    name = models.CharField(_("zone name"), max_length=100)
+    max_distance_km = models.FloatField(
+        _("zone limit (km)"), validators=[MinValueValidator(0.0)]
+    )
+    base_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    price_per_km = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} (up to {self.max_distance_km} km)"
+
+
+class GeocodedAddress(models.Model):
+    """Cached coordinates of a normalized address; misses are cached too."""
+
+    normalized = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    source = models.CharField(max_length=50, default="gazetteer")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def found(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def __str__(self):
+        return f"{self.normalized} ({self.latitude}, {self.longitude})"
+
+
+class TravelSpeed(models.Model):
+    """
+    Aggregated delivery legs for one zone and hour of the week, used to
+    estimate arrival times. ``last_event_id`` is the newest delivery event
+    folded into the row.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["zone", "hour_of_week"], name="unique_travel_speed_slot"
+            )
+        ]
+
+    zone = models.CharField(max_length=32)
+    hour_of_week = models.PositiveSmallIntegerField(
+        validators=[MaxValueValidator(167)], help_text="0 is Monday 00:00-01:00"
+    )
+    samples = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(default=0)
+    duration_seconds = models.FloatField(default=0)
+    last_event_id = models.PositiveBigIntegerField(default=0)
+
+    @property
+    def speed_kmh(self):
+        if not self.duration_seconds:
+            return None
+        return self.distance_km / self.duration_seconds * 3600
+
+    def __str__(self):
+        return f"{self.zone} @ {self.hour_of_week}: {self.speed_kmh} km/h"
+
+
+class DriverLocation(models.Model):
+    """One GPS ping reported by a driver's device."""
+
+    class Meta:
+        indexes = [models.Index(fields=["driver", "-recorded_at"])]
+
+    driver = models.ForeignKey(
+        CustomUser,
+        related_name="locations",
+        on_delete=models.CASCADE,
+        limit_choices_to={"role": "driver"},
+    )
+    latitude = models.FloatField(
+        validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)]
+    )
+    longitude = models.FloatField(
+        validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)]
+    )
+    recorded_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.driver_id} at ({self.latitude}, {self.longitude})"
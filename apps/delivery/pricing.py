@@ -0,0 +1,141 @@
+import logging
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from apps.delivery.models import DeliveryTariff
+from apps.orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+# Orders whose delivery price may still change
+OPEN_ORDER_STATUSES = ["created", "submitted", "pending", "ready_to_collect"]
+
+# Set while a re-quote of all open orders is waiting to run
+REQUOTE_SCHEDULED_KEY = "delivery:requote:scheduled"
+
+
+class TariffTable:
+    """Active tariffs as parallel NumPy arrays, ordered by zone limit."""
+
+    def __init__(self, tariffs):
+        tariffs = sorted(tariffs, key=lambda tariff: tariff.max_distance_km)
+        self.limits = np.array([t.max_distance_km for t in tariffs], dtype=float)
+        self.base = np.array([t.base_price for t in tariffs], dtype=float)
+        self.per_km = np.array([t.price_per_km for t in tariffs], dtype=float)
+        self.per_kg = np.array([t.price_per_kg for t in tariffs], dtype=float)
+
+    @classmethod
+    def load(cls):
+        return cls(DeliveryTariff.objects.filter(is_active=True))
+
+    def __len__(self):
+        return len(self.limits)
+
+    def quote(self, weights, distances):
+        """
+        Price many deliveries at once.
+
+        Returns an array of prices rounded to cents, with NaN for deliveries
+        beyond the last zone (or when there are no tariffs at all).
+        """
+        weights = np.asarray(weights, dtype=float)
+        distances = np.asarray(distances, dtype=float)
+        if not len(self):
+            return np.full(np.broadcast(weights, distances).shape, np.nan)
+
+        zones = np.searchsorted(self.limits, distances, side="left")
+        covered = zones < len(self)
+        zones = np.minimum(zones, len(self) - 1)
+
+        prices = (
+            self.base[zones]
+            + self.per_km[zones] * distances
+            + self.per_kg[zones] * weights
+        )
+        return np.where(covered, np.round(prices, 2), np.nan)
+
+
+def get_distance_resolver():
+    """
+    Return the callable mapping pickup and drop-off address lists to route
+    distances in km, configured by ``DELIVERY_DISTANCE_RESOLVER``.
+    """
+    return import_string(
+        getattr(
+            settings,
+            "DELIVERY_DISTANCE_RESOLVER",
+            "apps.delivery.geocoding.route_distances",
+        )
+    )
+
+
+def requote_open_orders(
+    tariffs=None, distance_resolver=None, batch_size=5000, order_ids=None
+):
+    """
+    Recompute ``delivery_price`` for every open order, or only for the open
+    ones among ``order_ids``.
+
+    Orders are streamed in batches; each batch is priced with one vectorized
+    call and written back with ``bulk_update``. Returns the number of orders
+    whose price changed.
+    """
+    started = time.perf_counter()
+    tariffs = tariffs or TariffTable.load()
+    resolve = distance_resolver or get_distance_resolver()
+
+    orders = (
+        Order.objects.filter(status__in=OPEN_ORDER_STATUSES)
+        .order_by("pk")
+        .values_list(
+            "pk", "total_weight", "pickup_address", "dropoff_address", "delivery_price"
+        )
+    )
+    if order_ids is None:
+        batches = _batches(orders.iterator(chunk_size=batch_size), batch_size)
+    else:
+        order_ids = sorted(set(order_ids))
+        batches = (
+            list(orders.filter(pk__in=order_ids[start : start + batch_size]))
+            for start in range(0, len(order_ids), batch_size)
+        )
+
+    changed = 0
+    for batch in batches:
+        if batch:
+            changed += _requote_batch(batch, tariffs, resolve)
+
+    logger.info(
+        f"Re-quoted open orders in {time.perf_counter() - started:.2f}s, "
+        f"{changed} prices changed."
+    )
+    return changed
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _requote_batch(rows, tariffs, resolve):
+    ids, weights, pickups, dropoffs, current = zip(*rows)
+    prices = tariffs.quote(weights, resolve(pickups, dropoffs))
+
+    current = np.array(current, dtype=float)
+    changed = ~np.isnan(prices) & (prices != current)
+    updates = [
+        Order(pk=ids[i], delivery_price=Decimal(f"{prices[i]:.2f}"))
+        for i in np.flatnonzero(changed)
+    ]
+    Order.objects.bulk_update(updates, ["delivery_price"], batch_size=1000)
+    return len(updates)
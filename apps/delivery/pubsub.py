@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def order_channel(order_id):
+    return f"order:{order_id}"
+
+
+def customer_channel(customer_id):
+    return f"customer:{customer_id}"
+
+
+def driver_channel(driver_id):
+    return f"driver:{driver_id}"
+
+
+class Subscription:
+    """
+    A bounded message queue bound to one event loop and a set of channels.
+
+    Subscriptions are plain asyncio objects, so an idle one costs a queue
+    and a parked coroutine rather than a thread. When a slow consumer lets
+    the queue fill up, the oldest message is dropped.
+    """
+
+    def __init__(self, broker, loop, maxsize):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.channels = set()
+
+    def add(self, channel):
+        self.broker._attach(self, channel)
+
+    def discard(self, channel):
+        self.broker._detach(self, channel)
+
+    def close(self):
+        for channel in list(self.channels):
+            self.discard(channel)
+
+    def deliver(self, message):
+        """Queue a message; must run on ``self.loop``."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next message, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InMemoryBroker:
+    """
+    Publish/subscribe within one process.
+
+    ``publish`` may be called from any thread; messages are handed to each
+    subscriber's event loop with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or getattr(
+            settings, "DELIVERY_PUBSUB_QUEUE_SIZE", 100
+        )
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channels=()):
+        subscription = Subscription(self, asyncio.get_running_loop(), self.queue_size)
+        for channel in channels:
+            subscription.add(channel)
+        return subscription
+
+    def _attach(self, subscription, channel):
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+            subscription.channels.add(channel)
+
+    def _detach(self, subscription, channel):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+            subscription.channels.discard(channel)
+
+    def subscriber_count(self, channel):
+        return len(self._channels.get(channel, ()))
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+    def dispatch(self, channel, message):
+        """Hand ``message`` to the local subscribers of ``channel``."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.deliver, {"channel": channel, **message}
+                )
+            except RuntimeError:
+                # The subscriber's event loop has been closed
+                subscription.close()
+        return len(subscribers)
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Share messages between processes through Redis pub/sub.
+
+    Each process keeps a single pattern subscription to Redis, read by one
+    background thread, and fans incoming messages out to its local
+    subscribers, so the number of Redis connections does not grow with the
+    number of clients.
+    """
+
+    def __init__(self, url=None, prefix="delivery:", queue_size=None):
+        import redis
+
+        super().__init__(queue_size=queue_size)
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url or redis_url() or "redis://redis:6379/1")
+        self._listener = None
+
+    def subscribe(self, channels=()):
+        self._ensure_listener()
+        return super().subscribe(channels)
+
+    def publish(self, channel, message):
+        self.client.publish(
+            self.prefix + channel, json.dumps(message, cls=DjangoJSONEncoder)
+        )
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{f"{self.prefix}*": self._on_message})
+                self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, raw):
+        channel = raw["channel"].decode()[len(self.prefix) :]
+        self.dispatch(channel, json.loads(raw["data"]))
+
+
+def redis_url():
+    """
+    Redis URL for pub/sub: ``DELIVERY_PUBSUB_REDIS_URL``, or the Celery
+    broker's URL when that is Redis. None when Redis is not configured.
+    """
+    url = getattr(settings, "DELIVERY_PUBSUB_REDIS_URL", None) or getattr(
+        settings, "CELERY_BROKER_URL", None
+    )
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return url
+    return None
+
+
+def broker_path():
+    """
+    Dotted path of the broker class: ``DELIVERY_PUBSUB_BROKER`` if set,
+    otherwise Redis whenever it is configured, as status changes are mostly
+    made by Celery workers and have to reach subscribers in web processes.
+    """
+    path = getattr(settings, "DELIVERY_PUBSUB_BROKER", None)
+    if path:
+        return path
+    if redis_url():
+        return "apps.delivery.pubsub.RedisBroker"
+    return "apps.delivery.pubsub.InMemoryBroker"
+
+
+def uses_process_local_broker():
+    """True if messages published by Celery workers cannot reach subscribers."""
+    return import_string(broker_path()) is InMemoryBroker and not getattr(
+        settings, "CELERY_TASK_ALWAYS_EAGER", False
+    )
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Process-wide broker, see ``broker_path``."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if uses_process_local_broker() and not settings.DEBUG:
+                    logger.warning(
+                        "Live updates use the in-process broker; changes made by "
+                        "Celery workers will not reach subscribers."
+                    )
+                _broker = import_string(broker_path())()
+    return _broker
+
+
+def publish(channel, message):
+    try:
+        get_broker().publish(channel, message)
+    except Exception as e:
+        logger.warning(f"Failed to publish to {channel}: {e}")
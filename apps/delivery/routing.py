@@ -0,0 +1,202 @@
+import logging
+import time
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from apps.delivery.geocoding import geocode_many, haversine_matrix
+from apps.orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+Stop = namedtuple("Stop", ["order_id", "kind", "address", "latitude", "longitude"])
+RoutePlan = namedtuple("RoutePlan", ["stops", "distance_km", "unrouted"])
+
+EPSILON = 1e-9
+
+
+class RouteOptimizer:
+    """
+    Shortest open path through pickup and drop-off stops.
+
+    ``distances`` is a square matrix whose first row/column is the fixed
+    start and whose last row/column is a fixed end; give the end zero
+    distance to every node for an open route. ``pairs`` lists
+    ``(pickup, dropoff)`` node indices; a drop-off is never visited before
+    its pickup. Nodes outside any pair can be visited at any point.
+
+    The route is seeded with a feasible nearest-neighbour tour and improved
+    by 2-opt and Or-opt moves until no move helps or the time budget runs
+    out. Move gains for all candidate positions are evaluated at once with
+    NumPy; precedence is only checked for improving moves.
+    """
+
+    def __init__(self, distances, pairs, time_budget=0.5):
+        self.distances = np.asarray(distances, dtype=float)
+        self.size = len(self.distances)
+        self.pickups = np.array([pickup for pickup, _ in pairs], dtype=int)
+        self.dropoffs = np.array([dropoff for _, dropoff in pairs], dtype=int)
+        self.pickup_of = {dropoff: pickup for pickup, dropoff in pairs}
+        self.deadline = time.perf_counter() + time_budget
+
+    def out_of_time(self):
+        return time.perf_counter() > self.deadline
+
+    def cost(self, route):
+        return float(self.distances[route[:-1], route[1:]].sum())
+
+    def feasible(self, route):
+        position = np.empty(self.size, dtype=int)
+        position[route] = np.arange(len(route))
+        return bool(np.all(position[self.pickups] < position[self.dropoffs]))
+
+    def seed(self):
+        end = self.size - 1
+        route, visited = [0], {0}
+        pending = set(range(1, end))
+        while pending:
+            ready = [
+                node
+                for node in pending
+                if node not in self.pickup_of or self.pickup_of[node] in visited
+            ]
+            nearest = min(ready, key=lambda node: self.distances[route[-1], node])
+            route.append(nearest)
+            visited.add(nearest)
+            pending.discard(nearest)
+        route.append(end)
+        return np.array(route, dtype=int)
+
+    def two_opt(self, route):
+        """Apply the first improving, feasible segment reversal, if any."""
+        d = self.distances
+        n = len(route)
+        for i in range(1, n - 2):
+            if self.out_of_time():
+                return None
+            a, b = route[i - 1], route[i]
+            js = np.arange(i + 1, n - 1)
+            c, e = route[js], route[js + 1]
+            delta = d[a, c] + d[b, e] - d[a, b] - d[c, e]
+            for k in np.argsort(delta):
+                if delta[k] >= -EPSILON:
+                    break
+                j = js[k]
+                candidate = np.concatenate(
+                    (route[:i], route[i : j + 1][::-1], route[j + 1 :])
+                )
+                if self.feasible(candidate):
+                    return candidate
+        return None
+
+    def or_opt(self, route):
+        """Apply the first improving, feasible move of a 1-3 stop segment."""
+        d = self.distances
+        n = len(route)
+        for length in (1, 2, 3):
+            for i in range(1, n - length):
+                if self.out_of_time():
+                    return None
+                p, q = route[i - 1], route[i + length]
+                first, last = route[i], route[i + length - 1]
+                removal = d[p, first] + d[last, q] - d[p, q]
+
+                rest = np.concatenate((route[:i], route[i + length :]))
+                ks = np.arange(len(rest) - 1)
+                ks = ks[ks != i - 1]
+                a, b = rest[ks], rest[ks + 1]
+                delta = d[a, first] + d[last, b] - d[a, b] - removal
+                for k in np.argsort(delta):
+                    if delta[k] >= -EPSILON:
+                        break
+                    at = ks[k] + 1
+                    candidate = np.concatenate(
+                        (rest[:at], route[i : i + length], rest[at:])
+                    )
+                    if self.feasible(candidate):
+                        return candidate
+        return None
+
+    def solve(self):
+        route = self.seed()
+        while not self.out_of_time():
+            improved = self.two_opt(route)
+            if improved is None:
+                improved = self.or_opt(route)
+            if improved is None:
+                break
+            route = improved
+        return route
+
+
+def plan_route(points, pairs, start=None, time_budget=0.5):
+    """
+    Order ``points`` (``(lat, lon)`` per stop) into a short open route that
+    begins at ``start`` if given, or at whichever stop suits best otherwise.
+    ``pairs`` holds ``(pickup, dropoff)`` indices into ``points``.
+
+    Returns the visiting order as indices into ``points`` and its length in km.
+    """
+    count = len(points)
+    if not count:
+        return [], 0.0
+
+    size = count + 2
+    distances = np.zeros((size, size))
+    distances[1:-1, 1:-1] = haversine_matrix(points, points)
+    if start is not None:
+        distances[0, 1:-1] = haversine_matrix([start], points)[0]
+
+    optimizer = RouteOptimizer(
+        distances,
+        [(pickup + 1, dropoff + 1) for pickup, dropoff in pairs],
+        time_budget=time_budget,
+    )
+    route = optimizer.solve()
+    return [int(node) - 1 for node in route[1:-1]], optimizer.cost(route)
+
+
+def plan_driver_route(driver_id, start=None, time_budget=None):
+    """
+    Plan the visiting order for a driver's assigned and in-transit orders.
+
+    Assigned orders contribute a pickup and a drop-off; in-transit orders
+    have been collected and only need their drop-off. Orders with an
+    address that cannot be geocoded are returned in ``unrouted``.
+    """
+    if time_budget is None:
+        time_budget = getattr(settings, "DELIVERY_ROUTE_TIME_BUDGET", 0.5)
+
+    orders = list(
+        Order.objects.filter(driver_id=driver_id, status__in=Order.ACTIVE_STATUSES)
+        .order_by("pk")
+        .values_list("pk", "status", "pickup_address", "dropoff_address")
+    )
+    coordinates = geocode_many(
+        [address for _, _, pickup, dropoff in orders for address in (pickup, dropoff)]
+    )
+
+    stops, pairs, unrouted = [], [], []
+    for order_id, status, pickup, dropoff in orders:
+        needs_pickup = status == "assigned"
+        if not coordinates[dropoff] or (needs_pickup and not coordinates[pickup]):
+            unrouted.append(order_id)
+            continue
+        if needs_pickup:
+            stops.append(Stop(order_id, "pickup", pickup, *coordinates[pickup]))
+            pairs.append((len(stops) - 1, len(stops)))
+        stops.append(Stop(order_id, "dropoff", dropoff, *coordinates[dropoff]))
+
+    started = time.perf_counter()
+    visit, distance = plan_route(
+        [(stop.latitude, stop.longitude) for stop in stops],
+        pairs,
+        start=start,
+        time_budget=time_budget,
+    )
+    logger.debug(
+        f"Planned {len(stops)} stops for driver {driver_id} "
+        f"in {time.perf_counter() - started:.3f}s ({distance:.1f} km)."
+    )
+    return RoutePlan([stops[i] for i in visit], distance, unrouted)
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.accounts.models import ShopProfile
+from apps.delivery.geocoding import invalidate_distance_matrix
+from apps.delivery.live import publish_status_updates
+from apps.delivery.models import DeliveryTariff, GeocodedAddress
+from apps.delivery.pricing import REQUOTE_SCHEDULED_KEY
+from apps.delivery.tasks import quote_orders, requote_orders
+from apps.orders.events import order_events_recorded
+from apps.orders.totals import order_totals_changed
+
+
+@receiver(post_save, sender=DeliveryTariff)
+@receiver(post_delete, sender=DeliveryTariff)
+def requote_on_tariff_change(sender, instance, **kwargs):
+    transaction.on_commit(schedule_requote)
+
+
+def schedule_requote():
+    """
+    Re-quote open orders ``TARIFF_REQUOTE_DELAY`` seconds from now, unless a
+    run is already waiting, so editing several tariffs queues a single run.
+    """
+    delay = getattr(settings, "TARIFF_REQUOTE_DELAY", 60)
+    if cache.add(REQUOTE_SCHEDULED_KEY, True, timeout=delay + 300):
+        requote_orders.apply_async(countdown=delay)
+
+
+@receiver(order_events_recorded)
+def quote_new_orders(sender, events, **kwargs):
+    order_ids = [order_id for order_id, from_status, _, _ in events if not from_status]
+    if order_ids:
+        transaction.on_commit(lambda: quote_orders.delay(order_ids))
+
+
+@receiver(order_totals_changed)
+def quote_changed_orders(sender, order_ids, **kwargs):
+    transaction.on_commit(lambda: quote_orders.delay(list(order_ids)))
+
+
+@receiver(order_events_recorded)
+def push_status_updates(sender, events, **kwargs):
+    transaction.on_commit(lambda: publish_status_updates(events))
+
+
+@receiver(post_save, sender=ShopProfile)
+@receiver(post_delete, sender=ShopProfile)
+def invalidate_matrix_on_shop_change(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "address" in update_fields:
+        transaction.on_commit(invalidate_distance_matrix)
+
+
+@receiver(post_save, sender=GeocodedAddress)
+@receiver(post_delete, sender=GeocodedAddress)
+def invalidate_matrix_on_geocode_change(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_distance_matrix)
@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+
+from celery import shared_task
+from django.core.cache import cache
+
+from apps.delivery.eta import update_travel_speeds
+from apps.delivery.geocoding import refresh_frequent_dropoffs
+from apps.delivery.pricing import REQUOTE_SCHEDULED_KEY, requote_open_orders
+from apps.delivery.tracking import location_buffer, store_locations
+
+
+@shared_task
+def requote_orders():
+    # Tariff changes made from here on need a run of their own
+    cache.delete(REQUOTE_SCHEDULED_KEY)
+    return requote_open_orders()
+
+
+@shared_task
+def quote_orders(order_ids):
+    return requote_open_orders(order_ids=order_ids)
+
+
+@shared_task
+def store_driver_locations(rows):
+    return store_locations(rows)
+
+
+@shared_task
+def flush_driver_locations():
+    """
+    Flush the pings buffered by this worker process. Web processes flush
+    their own buffers from a timer, as a task cannot reach their memory.
+    """
+    return location_buffer.flush()
+
+
+@shared_task
+def refresh_travel_speeds():
+    return update_travel_speeds()
+
+
+@shared_task
+def refresh_distance_matrix():
+    """Rebuild the drop-off list behind the cached shop distance matrix."""
+    return len(refresh_frequent_dropoffs()[1])
@@ -0,0 +1,175 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+LATEST_CACHE_KEY = "delivery:driver_location:{}"
+
+
+def _setting(name, default):
+    return getattr(settings, f"DRIVER_LOCATION_{name}", default)
+
+
+class LocationBuffer:
+    """
+    In-memory staging area for driver GPS pings.
+
+    The latest position per driver is written through to the cache, so any
+    process can read it without touching the database. Pings are appended
+    to a bounded ring buffer and handed to Celery for a ``bulk_create`` once
+    ``flush_size`` pings are waiting or the oldest one is ``flush_interval``
+    seconds old. A timer flushes the buffer when that age is reached even if
+    no further ping arrives, and the buffer is flushed on interpreter exit.
+    If the buffer fills up faster than it is flushed, the oldest pings are
+    dropped.
+    """
+
+    def __init__(self, capacity=None, flush_size=None, flush_interval=None):
+        self.capacity = capacity or _setting("BUFFER_SIZE", 50000)
+        self.flush_size = flush_size or _setting("FLUSH_SIZE", 1000)
+        self.flush_interval = flush_interval or _setting("FLUSH_INTERVAL", 5.0)
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=self.capacity)
+        self._oldest_at = None
+        self._timer = None
+        self.dropped = 0
+
+    def add(self, driver_id, latitude, longitude, recorded_at=None):
+        """Record one ping and flush the buffer if it is due."""
+        return self.add_many([(driver_id, latitude, longitude, recorded_at)])
+
+    def add_many(self, pings):
+        """
+        Record ``(driver_id, latitude, longitude, recorded_at)`` pings and
+        return the ``{driver_id: (latitude, longitude, recorded_at)}``
+        positions that are now the latest known ones.
+        """
+        now = timezone.now()
+        newest = {}
+        with self._lock:
+            for driver_id, latitude, longitude, recorded_at in pings:
+                recorded_at = recorded_at or now
+                if len(self._pending) == self._pending.maxlen:
+                    self.dropped += 1
+                self._pending.append(
+                    (driver_id, latitude, longitude, recorded_at.isoformat())
+                )
+                current = newest.get(driver_id)
+                if current is None or current[2] <= recorded_at:
+                    newest[driver_id] = (latitude, longitude, recorded_at)
+            if self._oldest_at is None:
+                self._oldest_at = time.monotonic()
+                self._start_timer()
+            due = (
+                len(self._pending) >= self.flush_size
+                or time.monotonic() - self._oldest_at >= self.flush_interval
+            )
+
+        latest = self._store_latest(newest)
+        if due:
+            self.flush()
+        return latest
+
+    def _store_latest(self, newest):
+        # Another process may have stored a later fix for the same driver.
+        keys = {LATEST_CACHE_KEY.format(driver_id): driver_id for driver_id in newest}
+        stored = cache.get_many(list(keys))
+        latest = {}
+        for key, driver_id in keys.items():
+            point = newest[driver_id]
+            if key not in stored or stored[key][2] <= point[2]:
+                latest[driver_id] = point
+        if latest:
+            cache.set_many(
+                {
+                    LATEST_CACHE_KEY.format(driver_id): point
+                    for driver_id, point in latest.items()
+                },
+                timeout=_setting("LATEST_TIMEOUT", 3600),
+            )
+        return latest
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not flush driver pings.")
+
+    def drain(self):
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+            self._oldest_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return rows
+
+    def flush(self):
+        """Send all waiting pings to Celery for storage."""
+        from apps.delivery.tasks import store_driver_locations
+
+        rows = self.drain()
+        if rows:
+            store_driver_locations.delay(rows)
+        if self.dropped:
+            logger.warning(f"Dropped {self.dropped} driver pings, buffer was full.")
+            self.dropped = 0
+        return len(rows)
+
+    def latest(self, driver_id):
+        """``(latitude, longitude, recorded_at)`` of a driver, or None."""
+        return cache.get(LATEST_CACHE_KEY.format(driver_id))
+
+    def latest_many(self, driver_ids):
+        keys = {
+            LATEST_CACHE_KEY.format(driver_id): driver_id for driver_id in driver_ids
+        }
+        return {keys[key]: point for key, point in cache.get_many(list(keys)).items()}
+
+
+location_buffer = LocationBuffer()
+atexit.register(location_buffer.flush)
+
+
+def store_locations(rows, batch_size=1000):
+    """
+    Write buffered ``(driver_id, lat, lon, iso recorded_at)`` rows to the
+    history and move each driver's current position to their latest fix.
+    """
+    from apps.delivery.models import DriverLocation
+    from apps.orders.availability import update_driver_positions
+
+    locations = [
+        DriverLocation(
+            driver_id=driver_id,
+            latitude=latitude,
+            longitude=longitude,
+            recorded_at=parse_datetime(recorded_at),
+        )
+        for driver_id, latitude, longitude, recorded_at in rows
+    ]
+    DriverLocation.objects.bulk_create(locations, batch_size=batch_size)
+
+    latest = {}
+    for location in sorted(locations, key=lambda location: location.recorded_at):
+        latest[location.driver_id] = (
+            location.latitude,
+            location.longitude,
+            location.recorded_at,
+        )
+    update_driver_positions(latest)
+    return len(rows)
@@ -0,0 +1,23 @@
+from django.urls import path
+
+from .views import (
+    customer_stream,
+    driver_location,
+    driver_route,
+    order_eta,
+    order_stream,
+    report_location,
+)
+
+app_name = "delivery"
+
+urlpatterns = [
+    path("routes/<int:driver_id>/", driver_route, name="driver-route"),
+    path("eta/orders/<int:order_id>/", order_eta, name="order-eta"),
+    path("locations/", report_location, name="report-location"),
+    path("locations/<int:driver_id>/", driver_location, name="driver-location"),
+    path("streams/orders/<int:order_id>/", order_stream, name="order-stream"),
+    path(
+        "streams/customers/<int:customer_id>/", customer_stream, name="customer-stream"
+    ),
+]
@@ -1,3 +1,234 @@
-from django.shortcuts import render
+from datetime import timedelta
 
-# Create your views here.
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from apps.delivery.eta import route_eta
+from apps.delivery.geocoding import geocode_many
+from apps.delivery.live import OrderFeed, event_stream, publish_positions
+from apps.delivery.pubsub import customer_channel, order_channel
+from apps.delivery.routing import plan_driver_route
+from apps.delivery.serializers import LocationPingSerializer
+from apps.delivery.tracking import location_buffer
+from apps.orders.models import Order
+
+
+@api_view(["GET"])
+def driver_route(request, driver_id):
+    if not (request.user.is_staff or request.user.id == driver_id):
+        return Response(
+            {"error": "You can only view your own route."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    position = location_buffer.latest(driver_id)
+    start = position[:2] if position else None
+    plan = plan_driver_route(driver_id, start=start)
+    etas = route_eta(
+        [(stop.latitude, stop.longitude) for stop in plan.stops], start=start
+    )
+    return Response(
+        {
+            "driver": driver_id,
+            "distance_km": round(plan.distance_km, 3),
+            "stops": [
+                {**stop._asdict(), "eta_seconds": round(float(eta))}
+                for stop, eta in zip(plan.stops, etas)
+            ],
+            "unrouted": plan.unrouted,
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def order_eta(request, order_id):
+    """
+    Estimated arrival at the drop-off of an order: from the driver's last
+    position once a driver is assigned, otherwise from the pickup now.
+    """
+    order = (
+        Order.objects.filter(pk=order_id)
+        .values(
+            "status",
+            "customer_id",
+            "shop_id",
+            "driver_id",
+            "pickup_address",
+            "dropoff_address",
+        )
+        .first()
+    )
+    if order is None:
+        return Response({"error": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
+    if not (
+        request.user.is_staff
+        or request.user.id
+        in (order["customer_id"], order["shop_id"], order["driver_id"])
+    ):
+        return Response(
+            {"error": "You can only view your own orders."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    response = {"order": order_id, "status": order["status"], "eta_seconds": None}
+    if order["status"] == "delivered":
+        return Response(response)
+
+    points = geocode_many([order["pickup_address"], order["dropoff_address"]])
+    pickup, dropoff = points[order["pickup_address"]], points[order["dropoff_address"]]
+    position = None
+    if order["status"] in Order.ACTIVE_STATUSES:
+        position = location_buffer.latest(order["driver_id"])
+    start = position[:2] if position else None
+    stops = (
+        [dropoff] if order["status"] == "in_transit" and start else [pickup, dropoff]
+    )
+    if all(stops):
+        now = timezone.now()
+        eta = float(route_eta(stops, start=start, departure=now)[-1])
+        response["eta_seconds"] = round(eta)
+        response["estimated_arrival"] = now + timedelta(seconds=eta)
+    return Response(response)
+
+
+@api_view(["POST"])
+def report_location(request):
+    """Accept one GPS ping or a list of pings from the current driver."""
+    if getattr(request.user, "role", None) != "driver":
+        return Response(
+            {"error": "Only drivers can report their location."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    many = isinstance(request.data, list)
+    serializer = LocationPingSerializer(data=request.data, many=many)
+    serializer.is_valid(raise_exception=True)
+    pings = serializer.validated_data if many else [serializer.validated_data]
+
+    latest = location_buffer.add_many(
+        (
+            request.user.id,
+            ping["latitude"],
+            ping["longitude"],
+            ping.get("recorded_at"),
+        )
+        for ping in pings
+    )
+    publish_positions(latest)
+    return Response({"accepted": len(pings)}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+def driver_location(request, driver_id):
+    """Latest known position of a driver, served without a database query."""
+    if not (request.user.is_staff or request.user.id == driver_id):
+        return Response(
+            {"error": "You can only view your own location."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    point = location_buffer.latest(driver_id)
+    if point is None:
+        return Response(
+            {"error": "No location reported yet."}, status=status.HTTP_404_NOT_FOUND
+        )
+    latitude, longitude, recorded_at = point
+    return Response(
+        {
+            "driver": driver_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "recorded_at": recorded_at,
+        }
+    )
+
+
+def _requires_asgi(request):
+    # Under WSGI Django drains an async stream before sending anything, so
+    # an endless event stream would hold a worker and never reach the client.
+    if isinstance(request, ASGIRequest):
+        return None
+    return JsonResponse({"error": "Live updates need the ASGI server."}, status=501)
+
+
+def _event_stream_response(feed, snapshot):
+    response = StreamingHttpResponse(
+        event_stream(feed, snapshot), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def order_stream(request, order_id):
+    """Server-Sent Events with status and driver position updates of an order."""
+    error = _requires_asgi(request)
+    if error:
+        return error
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+    # Subscribe before reading the snapshot, so a change made in between is
+    # queued behind the snapshot rather than lost.
+    feed = OrderFeed([order_channel(order_id)], {})
+    order = await (
+        Order.objects.filter(pk=order_id)
+        .values("id", "status", "driver_id", "customer_id", "shop_id")
+        .afirst()
+    )
+    if order is None:
+        feed.close()
+        return JsonResponse({"error": "Order not found."}, status=404)
+    if not (
+        user.is_staff
+        or user.id in (order["customer_id"], order["shop_id"], order["driver_id"])
+    ):
+        feed.close()
+        return JsonResponse(
+            {"error": "You can only follow your own orders."}, status=403
+        )
+
+    if order["status"] in Order.ACTIVE_STATUSES:
+        feed.follow(order_id, order["driver_id"])
+    snapshot = {
+        "type": "snapshot",
+        "orders": [
+            {"order": order_id, "status": order["status"], "driver": order["driver_id"]}
+        ],
+    }
+    return _event_stream_response(feed, snapshot)
+
+
+async def customer_stream(request, customer_id):
+    """Server-Sent Events with updates for every open order of a customer."""
+    error = _requires_asgi(request)
+    if error:
+        return error
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    if not (user.is_staff or user.id == customer_id):
+        return JsonResponse(
+            {"error": "You can only follow your own orders."}, status=403
+        )
+
+    feed = OrderFeed([customer_channel(customer_id)], {})
+    orders = [
+        {"order": order_id, "status": order_status, "driver": driver_id}
+        async for order_id, order_status, driver_id in Order.objects.filter(
+            customer_id=customer_id
+        )
+        .exclude(status="delivered")
+        .order_by("pk")
+        .values_list("pk", "status", "driver_id")
+    ]
+    for order in orders:
+        if order["status"] in Order.ACTIVE_STATUSES:
+            feed.follow(order["order"], order["driver"])
+    return _event_stream_response(feed, {"type": "snapshot", "orders": orders})
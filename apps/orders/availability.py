@@ -0,0 +1,319 @@
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.accounts.models import DriverProfile
+from apps.orders.models import Order
+from apps.orders.spatial import SpatialGrid
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = "orders:driver_availability:version"
+SEQUENCE_CACHE_KEY = "orders:driver_availability:sequence"
+CHANGE_CACHE_KEY = "orders:driver_availability:change:{}"
+
+
+def refresh_driver_availability(driver_ids):
+    """
+    Recompute ``active_load``/``is_available`` for the given drivers in one
+    UPDATE and sync the in-process index with the result. Returns the ids of
+    the drivers this freed, i.e. that were busy before and are free now.
+    """
+    driver_ids = [driver_id for driver_id in set(driver_ids) if driver_id]
+    if not driver_ids:
+        return []
+
+    active_orders = Order.objects.filter(
+        driver_id=OuterRef("user_id"), status__in=Order.ACTIVE_STATUSES
+    )
+    active_count = (
+        active_orders.order_by()
+        .values("driver_id")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    profiles = DriverProfile.objects.filter(user_id__in=driver_ids)
+    rows = list(
+        profiles.filter(user__is_active=True)
+        .annotate(free=~Exists(active_orders))
+        .values_list(
+            "user_id", "is_available", "free", "capacity", "latitude", "longitude"
+        )
+    )
+    profiles.update(
+        active_load=Coalesce(Subquery(active_count), 0),
+        is_available=~Exists(active_orders),
+    )
+    driver_index.update(
+        (driver_id, free, capacity, latitude, longitude)
+        for driver_id, _, free, capacity, latitude, longitude in rows
+    )
+    return [
+        driver_id for driver_id, was_free, free, *_ in rows if free and not was_free
+    ]
+
+
+class DriverAvailabilityIndex:
+    """
+    Free drivers sorted by capacity, for O(log n) best-fit lookups, and
+    placed on a spatial grid by their last known position for nearest-driver
+    lookups.
+
+    The index is loaded lazily from ``DriverProfile.is_available`` and kept
+    coherent across processes through the cache. Each change to a driver is
+    published as an entry in a numbered change log, and other processes
+    apply the entries they have not seen on their next lookup, at
+    O(log n) per driver. Only ``invalidate`` (for bulk changes), a process
+    falling more than ``DRIVER_INDEX_CHANGE_BACKLOG`` changes behind, or an
+    expired entry makes a process reload everything. Position changes are
+    applied locally as they arrive and picked up by other processes at most
+    ``DRIVER_POSITION_REFRESH`` seconds later.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._capacities = {}
+        self._grid = SpatialGrid(getattr(settings, "DRIVER_GRID_CELL_DEGREES", 0.02))
+        self._version = None
+        self._sequence = None
+        self._loaded_at = None
+
+    def _current_state(self):
+        state = cache.get_many([VERSION_CACHE_KEY, SEQUENCE_CACHE_KEY])
+        if VERSION_CACHE_KEY not in state:
+            cache.add(VERSION_CACHE_KEY, 1, timeout=None)
+            state[VERSION_CACHE_KEY] = cache.get(VERSION_CACHE_KEY)
+        if SEQUENCE_CACHE_KEY not in state:
+            # Start from the time, so a sequence evicted from the cache comes
+            # back ahead of every process rather than behind.
+            cache.add(SEQUENCE_CACHE_KEY, int(time.time() * 1000), timeout=None)
+            state[SEQUENCE_CACHE_KEY] = cache.get(SEQUENCE_CACHE_KEY)
+        return state[VERSION_CACHE_KEY], state[SEQUENCE_CACHE_KEY]
+
+    def _bump_version(self):
+        try:
+            return cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+            return 1
+
+    def _publish(self, rows):
+        try:
+            sequence = cache.incr(SEQUENCE_CACHE_KEY)
+        except ValueError:
+            sequence = int(time.time() * 1000)
+            cache.set(SEQUENCE_CACHE_KEY, sequence, timeout=None)
+        cache.set(
+            CHANGE_CACHE_KEY.format(sequence),
+            rows,
+            timeout=getattr(settings, "DRIVER_INDEX_CHANGE_TIMEOUT", 3600),
+        )
+        return sequence
+
+    def _load(self, version, sequence):
+        rows = DriverProfile.objects.filter(
+            is_available=True, user__is_active=True, user__role="driver"
+        ).values_list("user_id", "capacity", "latitude", "longitude")
+        self._capacities = {}
+        self._grid = SpatialGrid(self._grid.cell_degrees)
+        for driver_id, capacity, latitude, longitude in rows:
+            self._capacities[driver_id] = float(capacity)
+            if latitude is not None and longitude is not None:
+                self._grid.insert(driver_id, latitude, longitude, float(capacity))
+        self._entries = sorted(
+            (capacity, driver_id) for driver_id, capacity in self._capacities.items()
+        )
+        self._version = version
+        self._sequence = sequence
+        self._loaded_at = time.monotonic()
+        logger.debug(f"Loaded {len(self._entries)} available drivers (v{version}).")
+
+    def _catch_up(self, sequence):
+        """Apply the published changes since ``self._sequence``; False if lost."""
+        backlog = getattr(settings, "DRIVER_INDEX_CHANGE_BACKLOG", 1000)
+        if not 0 < sequence - self._sequence <= backlog:
+            return False
+        keys = [
+            CHANGE_CACHE_KEY.format(number)
+            for number in range(self._sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            self._apply(changes[key])
+        self._sequence = sequence
+        return True
+
+    def _ensure_fresh(self):
+        version, sequence = self._current_state()
+        refresh = getattr(settings, "DRIVER_POSITION_REFRESH", 30)
+        if version != self._version or time.monotonic() - self._loaded_at > refresh:
+            self._load(version, sequence)
+        elif sequence != self._sequence and not self._catch_up(sequence):
+            self._load(version, sequence)
+
+    def _apply(self, rows):
+        for driver_id, is_available, capacity, latitude, longitude in rows:
+            previous = self._capacities.pop(driver_id, None)
+            if previous is not None:
+                self._entries.remove((previous, driver_id))
+            self._grid.remove(driver_id)
+            if is_available:
+                self._capacities[driver_id] = float(capacity)
+                insort(self._entries, (float(capacity), driver_id))
+                if latitude is not None and longitude is not None:
+                    self._grid.insert(driver_id, latitude, longitude, float(capacity))
+
+    def find(self, min_capacity, exclude=()):
+        """Return the id of the smallest free driver with enough capacity, or None."""
+        with self._lock:
+            self._ensure_fresh()
+            index = bisect_left(self._entries, (float(min_capacity), float("-inf")))
+            for _, driver_id in self._entries[index:]:
+                if driver_id not in exclude:
+                    return driver_id
+        return None
+
+    def nearest(
+        self, latitude, longitude, min_capacity=0, k=1, exclude=(), max_km=None
+    ):
+        """
+        Up to ``k`` ``(distance_km, driver_id)`` pairs for the free drivers
+        with enough capacity closest to the given point, nearest first.
+        Drivers without a known position are not considered.
+        """
+        if max_km is None:
+            max_km = getattr(settings, "DRIVER_SEARCH_RADIUS_KM", 50)
+        with self._lock:
+            self._ensure_fresh()
+            return self._grid.nearest(
+                latitude,
+                longitude,
+                k=k,
+                min_weight=float(min_capacity),
+                exclude=exclude,
+                max_km=max_km,
+            )
+
+    def available(self):
+        """Return ``(driver_id, capacity)`` pairs for every free driver."""
+        with self._lock:
+            self._ensure_fresh()
+            return [(driver_id, capacity) for capacity, driver_id in self._entries]
+
+    def update(self, rows):
+        """
+        Apply ``(driver_id, is_available, capacity, latitude, longitude)``
+        changes locally and publish them for other processes.
+        """
+        rows = list(rows)
+        with self._lock:
+            self._apply(rows)
+            sequence = self._publish(rows)
+            if self._sequence is not None and sequence == self._sequence + 1:
+                self._sequence = sequence
+
+    def move(self, positions):
+        """
+        Apply ``{driver_id: (latitude, longitude)}`` position changes to the
+        free drivers held locally, without publishing a new version.
+        """
+        with self._lock:
+            for driver_id, (latitude, longitude) in positions.items():
+                capacity = self._capacities.get(driver_id)
+                if capacity is not None:
+                    self._grid.insert(driver_id, latitude, longitude, capacity)
+
+    def discard(self, driver_id):
+        self.update([(driver_id, False, None, None, None)])
+
+    def invalidate(self):
+        """Force every process, including this one, to reload on next lookup."""
+        with self._lock:
+            self._bump_version()
+            self._version = None
+
+    def forget(self):
+        """Make this process alone reload on next lookup."""
+        with self._lock:
+            self._version = None
+
+
+driver_index = DriverAvailabilityIndex()
+
+
+def claim_driver(driver_id):
+    """
+    Atomically mark a free driver as busy. Returns False if another worker
+    claimed the driver first.
+    """
+    claimed = DriverProfile.objects.filter(user_id=driver_id, is_available=True).update(
+        is_available=False, active_load=F("active_load") + 1
+    )
+    driver_index.discard(driver_id)
+    return bool(claimed)
+
+
+def update_driver_positions(positions):
+    """
+    Store ``{driver_id: (latitude, longitude, recorded_at)}`` as the current
+    driver positions, skipping fixes older than the stored one.
+    """
+    profiles = {
+        profile.user_id: profile
+        for profile in DriverProfile.objects.filter(user_id__in=positions).only(
+            "user_id", "location_updated_at"
+        )
+    }
+    changed = []
+    for driver_id, (latitude, longitude, recorded_at) in positions.items():
+        profile = profiles.get(driver_id)
+        if profile is None or (
+            profile.location_updated_at and profile.location_updated_at > recorded_at
+        ):
+            continue
+        profile.latitude = latitude
+        profile.longitude = longitude
+        profile.location_updated_at = recorded_at
+        changed.append(profile)
+    DriverProfile.objects.bulk_update(
+        changed, ["latitude", "longitude", "location_updated_at"], batch_size=500
+    )
+    driver_index.move(
+        {profile.user_id: (profile.latitude, profile.longitude) for profile in changed}
+    )
+    return len(changed)
+
+
+def find_available_driver(min_capacity, near=None):
+    """
+    Claim and return the id of a free driver with enough capacity, or None.
+
+    With a ``(latitude, longitude)`` given as ``near``, the closest such
+    driver is picked; otherwise, or when no positioned driver is within
+    ``DRIVER_SEARCH_RADIUS_KM``, the best-fitting one by capacity.
+    """
+    tried = set()
+    while True:
+        driver_id = None
+        if near is not None:
+            nearest = driver_index.nearest(
+                *near, min_capacity=min_capacity, exclude=tried
+            )
+            if nearest:
+                driver_id = nearest[0][1]
+        if driver_id is None:
+            driver_id = driver_index.find(min_capacity, exclude=tried)
+        if driver_id is None:
+            return None
+        if claim_driver(driver_id):
+            return driver_id
+        tried.add(driver_id)
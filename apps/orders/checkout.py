@@ -0,0 +1,80 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from apps.accounts.models import CustomerProfile
+from apps.orders.events import record_events
+from apps.orders.models import Order, OrderItem
+from apps.products.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+def checkout_cart(customer, cart):
+    """
+    Create one order per shop for a whole cart in a single transaction.
+
+    ``cart`` maps product ids to quantities. Products are loaded with one
+    query, priced in memory and written with ``bulk_create``; order totals
+    are computed up front, so no per-item signals or re-sums are involved.
+    """
+    profile = CustomerProfile.objects.filter(user=customer).only("address").first()
+    if not profile or not profile.address:
+        raise CheckoutError("You must have an address to create an order.")
+
+    products = (
+        Product.objects.filter(is_active=True)
+        .select_related("supplier__shop_profile")
+        .in_bulk(list(cart))
+    )
+    missing = sorted(set(cart) - set(products))
+    if missing:
+        raise CheckoutError(f"Products not available: {missing}")
+
+    lines_by_shop = defaultdict(list)
+    for product_id, quantity in cart.items():
+        product = products[product_id]
+        lines_by_shop[product.supplier].append((product, quantity))
+
+    orders = []
+    for shop in lines_by_shop:
+        shop_profile = getattr(shop, "shop_profile", None)
+        if not shop_profile or not shop_profile.address:
+            raise CheckoutError(f"Shop {shop} does not have a valid address.")
+        orders.append(
+            Order(
+                shop=shop,
+                customer=customer,
+                pickup_address=shop_profile.address,
+                dropoff_address=profile.address,
+                status="created",
+            )
+        )
+
+    items = []
+    for order in orders:
+        for product, quantity in lines_by_shop[order.shop]:
+            item = OrderItem(
+                order=order,
+                product=product,
+                quantity=quantity,
+                total_price=product.price * quantity,
+            )
+            order.total_amount += item.total_price
+            order.total_weight += product.weight * quantity
+            items.append(item)
+
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(items)
+        record_events((order.pk, None, order.status, None) for order in orders)
+
+    logger.info(
+        f"Checkout by '{customer}' created {len(orders)} orders with {len(items)} items."
+    )
+    return orders
@@ -0,0 +1,74 @@
+from collections import namedtuple
+
+from django.utils import timezone
+
+from apps.delivery.geocoding import normalize_address
+
+Trip = namedtuple("Trip", ["order_ids", "weight"])
+
+
+def pack_orders(orders, capacity, max_orders=None):
+    """
+    First-fit decreasing bin packing of ``(order_id, weight)`` pairs into
+    trips of at most ``capacity`` total weight and ``max_orders`` orders.
+    Orders heavier than ``capacity`` get a trip of their own.
+    """
+    bins = []
+    for order_id, weight in sorted(orders, key=lambda order: order[1], reverse=True):
+        weight = float(weight)
+        for trip in bins:
+            if trip[0] + weight <= capacity and (
+                not max_orders or len(trip[1]) < max_orders
+            ):
+                trip[0] += weight
+                trip[1].append(order_id)
+                break
+        else:
+            bins.append([weight, [order_id]])
+    return [Trip(order_ids, weight) for weight, order_ids in bins]
+
+
+def consolidate_orders(orders, capacity, window, max_orders=None, now=None, idle=0):
+    """
+    Turn ready orders into trips.
+
+    ``orders`` are ``(order_id, shop_id, pickup_address, weight, ready_at)``
+    rows. Orders sharing a shop and normalized pickup address are packed
+    together once the oldest of them has waited ``window`` seconds; younger
+    groups are held back so later orders can join them. A young group of a
+    single order is released anyway, oldest first, while ``idle`` drivers
+    would otherwise have no trip. Orders without a pickup address travel
+    alone. Returns the trips and the held order ids.
+    """
+    now = now or timezone.now()
+    trips, held, singles, groups = [], [], [], {}
+    for order_id, shop_id, pickup_address, weight, ready_at in orders:
+        pickup = normalize_address(pickup_address)
+        if not pickup:
+            trips.append(Trip([order_id], float(weight)))
+            continue
+        groups.setdefault((shop_id, pickup), []).append((order_id, weight, ready_at))
+
+    for group in groups.values():
+        oldest = min(ready_at for _, _, ready_at in group)
+        if (now - oldest).total_seconds() < window:
+            if len(group) == 1:
+                singles.append(group[0])
+            else:
+                held.extend(order_id for order_id, _, _ in group)
+            continue
+        trips.extend(
+            pack_orders(
+                [(order_id, weight) for order_id, weight, _ in group],
+                capacity,
+                max_orders,
+            )
+        )
+
+    singles.sort(key=lambda single: single[2])
+    spare = max(idle - len(trips), 0)
+    trips.extend(
+        Trip([order_id], float(weight)) for order_id, weight, _ in singles[:spare]
+    )
+    held.extend(order_id for order_id, _, _ in singles[spare:])
+    return trips, held
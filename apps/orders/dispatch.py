@@ -0,0 +1,152 @@
+import logging
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.accounts.models import DriverProfile
+from apps.orders.consolidation import consolidate_orders
+from apps.orders.models import Order, OrderEvent
+from apps.orders.transitions import notify_transition, validate_transition
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchResult(
+    namedtuple(
+        "DispatchResult",
+        ["matched", "unmatched", "elapsed", "trips", "held"],
+        defaults=(0, 0),
+    )
+):
+    @property
+    def orders_per_second(self):
+        return self.matched / self.elapsed if self.elapsed else 0.0
+
+
+def match_orders_to_drivers(orders, drivers):
+    """
+    Best-fit assignment of orders to drivers.
+
+    ``orders`` and ``drivers`` are iterables of ``(id, weight)`` and
+    ``(id, capacity)``. Heaviest orders are placed first, each on the free
+    driver with the smallest capacity that still fits it, so large vehicles
+    stay available for the loads that need them. Returns a dict mapping
+    order ids to driver ids.
+    """
+    free = sorted((float(capacity), driver_id) for driver_id, capacity in drivers)
+    capacities = [capacity for capacity, _ in free]
+
+    assignments = {}
+    for order_id, weight in sorted(orders, key=lambda order: order[1], reverse=True):
+        index = bisect_left(capacities, weight)
+        if index == len(capacities):
+            continue
+        assignments[order_id] = free[index][1]
+        del free[index]
+        del capacities[index]
+    return assignments
+
+
+def apply_assignments(assignments, batch_size=500):
+    """
+    Write ``{order_id: driver_id}`` assignments with one conditional UPDATE
+    per batch and announce them as ``ready_to_collect -> assigned`` transitions.
+    The orders are expected to be locked by the caller.
+    """
+    validate_transition("ready_to_collect", "assigned")
+    now = timezone.now()
+    pairs = list(assignments.items())
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start : start + batch_size]
+        Order.objects.filter(
+            pk__in=[order_id for order_id, _ in batch], status="ready_to_collect"
+        ).update(
+            driver_id=Case(
+                *[
+                    When(pk=order_id, then=Value(driver_id))
+                    for order_id, driver_id in batch
+                ]
+            ),
+            status="assigned",
+            updated_at=now,
+        )
+    notify_transition(
+        "ready_to_collect",
+        "assigned",
+        {order_id: {"driver_id": driver_id} for order_id, driver_id in pairs},
+    )
+
+
+def dispatch_ready_orders(limit=None):
+    """
+    Assign every pending ``ready_to_collect`` order in one pass.
+
+    Pending orders and free drivers are each read once and locked (rows held
+    by a concurrent dispatcher are skipped). Orders from the same pickup are
+    consolidated into trips (see ``consolidate_orders``), timed from their
+    latest ``ready_to_collect`` event rather than their last save. Trips are
+    matched to drivers in memory and the result is written back with batched
+    UPDATEs in the same transaction.
+    """
+    started = time.perf_counter()
+    window = getattr(settings, "ORDER_CONSOLIDATION_WINDOW", 120)
+    max_orders = getattr(settings, "ORDER_TRIP_MAX_ORDERS", 10)
+
+    ready_since = (
+        OrderEvent.objects.filter(order_id=OuterRef("pk"), to_status="ready_to_collect")
+        .order_by("-id")
+        .values("created_at")[:1]
+    )
+    with transaction.atomic():
+        orders = (
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status="ready_to_collect", driver__isnull=True)
+            .annotate(ready_at=Coalesce(Subquery(ready_since), "created_at"))
+            .order_by("created_at")
+            .values_list("id", "shop_id", "pickup_address", "total_weight", "ready_at")
+        )
+        if limit:
+            orders = orders[:limit]
+        orders = list(orders)
+
+        drivers = []
+        if orders:
+            drivers = list(
+                DriverProfile.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(is_available=True, user__role="driver", user__is_active=True)
+                .values_list("user_id", "capacity")
+            )
+
+        capacity = max((float(capacity) for _, capacity in drivers), default=0.0)
+        trips, held = consolidate_orders(
+            orders, capacity, window, max_orders, idle=len(drivers)
+        )
+        trip_drivers = match_orders_to_drivers(
+            ((index, trip.weight) for index, trip in enumerate(trips)), drivers
+        )
+        assignments = {
+            order_id: driver_id
+            for index, driver_id in trip_drivers.items()
+            for order_id in trips[index].order_ids
+        }
+        apply_assignments(assignments)
+
+    result = DispatchResult(
+        matched=len(assignments),
+        unmatched=len(orders) - len(assignments) - len(held),
+        elapsed=time.perf_counter() - started,
+        trips=len(trip_drivers),
+        held=len(held),
+    )
+    logger.info(
+        f"Dispatched {result.matched} orders on {result.trips} trips "
+        f"({result.unmatched} unmatched, {result.held} held) "
+        f"in {result.elapsed:.3f}s, {result.orders_per_second:.1f} orders/s."
+    )
+    return result
@@ -0,0 +1,49 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.dispatch import Signal
+
+from apps.orders.models import OrderEvent
+
+EXPORT_FIELDS = (
+    "id",
+    "order_id",
+    "from_status",
+    "to_status",
+    "driver_id",
+    "created_at",
+)
+
+# Sent with the ``events`` tuples just appended to the log
+order_events_recorded = Signal()
+
+
+def record_events(events):
+    """Append ``(order_id, from_status, to_status, driver_id)`` tuples to the log."""
+    events = list(events)
+    created = OrderEvent.objects.bulk_create(
+        OrderEvent(
+            order_id=order_id,
+            from_status=from_status,
+            to_status=to_status,
+            driver_id=driver_id,
+        )
+        for order_id, from_status, to_status, driver_id in events
+    )
+    if events:
+        order_events_recorded.send(sender=OrderEvent, events=events)
+    return created
+
+
+def iter_events_ndjson(since=0, limit=None, chunk_size=2000):
+    """
+    Yield events with an id greater than ``since`` as NDJSON lines, oldest
+    first. The id of the last line is the cursor for the next export.
+    """
+    events = (
+        OrderEvent.objects.filter(id__gt=since).order_by("id").values(*EXPORT_FIELDS)
+    )
+    if limit:
+        events = events[:limit]
+    for event in events.iterator(chunk_size=chunk_size):
+        yield json.dumps(event, cls=DjangoJSONEncoder) + "\n"
@@ -0,0 +1,132 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from apps.accounts.models import CustomUser, DriverProfile
+from apps.orders.availability import driver_index
+from apps.orders.dispatch import dispatch_ready_orders
+from apps.orders.models import Order
+from apps.orders.tasks import assign_driver
+
+# The driver index publishes its changes through the cache; keep them away
+# from the processes dispatching for real.
+PRIVATE_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-dispatch",
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-order assign_driver against the batched dispatcher on "
+        "synthetic data. All generated rows are rolled back afterwards. "
+        "Refuses to run against a database with ready orders or free drivers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--drivers", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--i-know-this-is-not-production",
+            action="store_true",
+            dest="not_production",
+            help="Run even though other ready orders or free drivers exist.",
+        )
+
+    def handle(self, *args, **options):
+        # Both dispatchers would pick up, and lock, orders and drivers that
+        # are not part of the benchmark.
+        in_use = (
+            Order.objects.filter(status="ready_to_collect").exists()
+            or DriverProfile.objects.filter(is_available=True).exists()
+        )
+        if in_use and not options["not_production"]:
+            raise CommandError(
+                "The database has ready orders or free drivers; run the "
+                "benchmark on a scratch database or pass "
+                "--i-know-this-is-not-production."
+            )
+        random.seed(options["seed"])
+
+        with override_settings(CACHES=PRIVATE_CACHES), transaction.atomic():
+            order_ids, driver_ids = self.generate(options["orders"], options["drivers"])
+
+            self.report("assign_driver", *self.run_per_order(order_ids))
+            self.reset(order_ids, driver_ids)
+            self.report("dispatch_ready_orders", *self.run_batched())
+
+            transaction.set_rollback(True)
+        # The local index still holds the rolled-back drivers.
+        driver_index.forget()
+
+    def generate(self, order_count, driver_count):
+        prefix = f"bench{int(time.time())}"
+        shop = CustomUser.objects.create(
+            email=f"{prefix}-shop@bench.local",
+            username=f"{prefix}-shop",
+            first_name="Bench",
+            role="shop",
+        )
+        drivers = CustomUser.objects.bulk_create(
+            CustomUser(
+                email=f"{prefix}-driver{i}@bench.local",
+                username=f"{prefix}-driver{i}",
+                first_name="Bench",
+                role="driver",
+            )
+            for i in range(driver_count)
+        )
+        DriverProfile.objects.bulk_create(
+            DriverProfile(
+                user=driver,
+                vehicle_type="van",
+                capacity=random.choice([10, 25, 50, 100, 250, 500]),
+            )
+            for driver in drivers
+        )
+        orders = Order.objects.bulk_create(
+            Order(
+                shop=shop,
+                status="ready_to_collect",
+                total_weight=round(random.uniform(0.5, 300), 2),
+            )
+            for _ in range(order_count)
+        )
+        driver_index.invalidate()
+        return [order.id for order in orders], [driver.id for driver in drivers]
+
+    def reset(self, order_ids, driver_ids):
+        Order.objects.filter(pk__in=order_ids).update(
+            status="ready_to_collect", driver=None
+        )
+        DriverProfile.objects.filter(user_id__in=driver_ids).update(
+            is_available=True, active_load=0
+        )
+        driver_index.invalidate()
+
+    def run_per_order(self, order_ids):
+        matched = 0
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for order_id in order_ids:
+                if assign_driver(order_id):
+                    matched += 1
+        return matched, time.perf_counter() - started, len(queries)
+
+    def run_batched(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = dispatch_ready_orders()
+        return result.matched, result.elapsed, len(queries)
+
+    def report(self, name, matched, elapsed, queries):
+        rate = matched / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"{name:<24} matched={matched:<6} time={elapsed:.3f}s "
+            f"rate={rate:.1f} orders/s queries={queries}"
+        )
@@ -0,0 +1,94 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.orders.spatial import EARTH_RADIUS_KM, SpatialGrid
+
+
+class Command(BaseCommand):
+    help = (
+        "Time k-nearest free driver lookups on the spatial grid against a "
+        "brute-force scan, using synthetic drivers spread over a city."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=10000)
+        parser.add_argument("--queries", type=int, default=10000)
+        parser.add_argument("-k", type=int, default=5)
+        parser.add_argument("--cell-degrees", type=float, default=0.02)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        k = options["k"]
+        capacities = [10, 25, 50, 100, 250, 500]
+
+        drivers = [
+            (
+                random.uniform(51.2, 51.8),
+                random.uniform(-0.6, 0.4),
+                float(random.choice(capacities)),
+            )
+            for _ in range(options["drivers"])
+        ]
+        queries = [
+            (
+                random.uniform(51.3, 51.7),
+                random.uniform(-0.5, 0.3),
+                random.choice(capacities),
+            )
+            for _ in range(options["queries"])
+        ]
+
+        started = time.perf_counter()
+        grid = SpatialGrid(options["cell_degrees"])
+        for driver_id, (latitude, longitude, capacity) in enumerate(drivers):
+            grid.insert(driver_id, latitude, longitude, capacity)
+        self.stdout.write(
+            f"Indexed {len(grid)} drivers in {time.perf_counter() - started:.3f}s"
+        )
+
+        timings = []
+        results = []
+        for latitude, longitude, capacity in queries:
+            started = time.perf_counter()
+            results.append(grid.nearest(latitude, longitude, k=k, min_weight=capacity))
+            timings.append(time.perf_counter() - started)
+        self.report("grid", timings)
+
+        points = np.radians([(lat, lon) for lat, lon, _ in drivers])
+        weights = np.array([capacity for _, _, capacity in drivers])
+        timings = []
+        mismatches = 0
+        sample = min(len(queries), 1000)
+        for (latitude, longitude, capacity), found in zip(queries[:sample], results):
+            started = time.perf_counter()
+            expected = self.brute_force(
+                points, weights, latitude, longitude, capacity, k
+            )
+            timings.append(time.perf_counter() - started)
+            if [key for _, key in found] != expected:
+                mismatches += 1
+        self.report("brute force", timings)
+        self.stdout.write(f"Mismatches against brute force: {mismatches}/{sample}")
+
+    def brute_force(self, points, weights, latitude, longitude, capacity, k):
+        lat, lon = np.radians(latitude), np.radians(longitude)
+        h = (
+            np.sin((points[:, 0] - lat) / 2) ** 2
+            + np.cos(lat) * np.cos(points[:, 0]) * np.sin((points[:, 1] - lon) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+        distances[weights < capacity] = np.inf
+        nearest = np.argsort(distances)[:k]
+        return [int(i) for i in nearest if np.isfinite(distances[i])]
+
+    def report(self, name, timings):
+        timings = np.array(timings) * 1e6
+        self.stdout.write(
+            f"{name:<12} queries={len(timings):<6} "
+            f"mean={timings.mean():.1f}us p50={np.percentile(timings, 50):.1f}us "
+            f"p99={np.percentile(timings, 99):.1f}us"
+        )
@@ -0,0 +1,199 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from apps.accounts.models import (
+    CustomerProfile,
+    CustomUser,
+    DriverProfile,
+    ShopProfile,
+)
+from apps.orders.availability import driver_index
+from apps.orders.models import Order
+from apps.orders.tasks import assign_driver
+from apps.products.models import Product
+
+STREETS = ["Market Street", "Elm Avenue", "Harbour Road", "Station Road", "High Street"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate shops, products, customers and drivers, replay an order "
+        "workload through the real views and tasks, and report throughput, "
+        "latency percentiles and query counts per step. All generated rows "
+        "are rolled back afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=20)
+        parser.add_argument("--products", type=int, default=20, help="Per shop.")
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--drivers", type=int, default=100)
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--list-requests", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", help="Also write the report to this file.")
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        hosts = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        with override_settings(ALLOWED_HOSTS=hosts), transaction.atomic():
+            started = time.perf_counter()
+            shops, customers, products = self.generate(options)
+            self.stdout.write(
+                f"Generated {len(shops)} shops, {len(products)} products, "
+                f"{len(customers)} customers and {options['drivers']} drivers "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+
+            clients = {}
+            report = [
+                self.create_orders(clients, customers, products, options["orders"]),
+                self.list_orders(clients, customers + shops, options["list_requests"]),
+                self.assign_drivers(),
+            ]
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        for step in report:
+            self.stdout.write(
+                f"{step['step']:<26} calls={step['calls']:<6} failures={step['failures']:<4} "
+                f"rate={step['rate']:.1f}/s p50={step['p50_ms']:.2f}ms "
+                f"p95={step['p95_ms']:.2f}ms p99={step['p99_ms']:.2f}ms "
+                f"queries avg={step['queries_avg']:.1f} max={step['queries_max']}"
+            )
+        if options["json"]:
+            with open(options["json"], "w") as fh:
+                json.dump(report, fh, indent=2)
+
+    def generate(self, options):
+        prefix = f"load{int(time.time())}"
+
+        def create_users(role, count):
+            return CustomUser.objects.bulk_create(
+                CustomUser(
+                    email=f"{prefix}-{role}{i}@load.local",
+                    username=f"{prefix}-{role}{i}",
+                    first_name="Load",
+                    role=role,
+                )
+                for i in range(count)
+            )
+
+        def address():
+            return f"{random.randint(1, 200)} {random.choice(STREETS)}"
+
+        shops = create_users("shop", options["shops"])
+        ShopProfile.objects.bulk_create(
+            ShopProfile(user=shop, address=address()) for shop in shops
+        )
+        customers = create_users("customer", options["customers"])
+        CustomerProfile.objects.bulk_create(
+            CustomerProfile(user=customer, address=address()) for customer in customers
+        )
+        drivers = create_users("driver", options["drivers"])
+        DriverProfile.objects.bulk_create(
+            DriverProfile(
+                user=driver,
+                vehicle_type="van",
+                capacity=random.choice([10, 25, 50, 100, 250]),
+            )
+            for driver in drivers
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                price=Decimal(random.randint(100, 10000)) / 100,
+                weight=round(random.uniform(0.1, 20), 2),
+                supplier=shop,
+                is_active=True,
+            )
+            for shop in shops
+            for i in range(options["products"])
+        )
+        driver_index.invalidate()
+        return shops, customers, products
+
+    def client_for(self, clients, user):
+        if user.pk not in clients:
+            clients[user.pk] = Client()
+            clients[user.pk].force_login(user)
+        return clients[user.pk]
+
+    def measure(self, name, calls):
+        """
+        Run ``calls``, callables returning whether the call succeeded, and
+        summarize their latency and query counts.
+        """
+        timings, queries, failures = [], [], 0
+        started = time.perf_counter()
+        for call in calls:
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                ok = call()
+                timings.append(time.perf_counter() - began)
+            queries.append(len(captured))
+            failures += not ok
+        elapsed = time.perf_counter() - started
+
+        timings = np.array(timings or [0.0]) * 1000
+        return {
+            "step": name,
+            "calls": len(queries),
+            "failures": failures,
+            "rate": len(queries) / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(timings, 50)),
+            "p95_ms": float(np.percentile(timings, 95)),
+            "p99_ms": float(np.percentile(timings, 99)),
+            "queries_avg": float(np.mean(queries)) if queries else 0.0,
+            "queries_max": max(queries, default=0),
+        }
+
+    def create_orders(self, clients, customers, products, count):
+        def call(client, product):
+            url = reverse("orders:create-order-from-product", args=[product.pk])
+            response = client.post(url, {"quantity": random.randint(1, 3)})
+            return response.status_code < 400
+
+        requests = []
+        for _ in range(count):
+            client = self.client_for(clients, random.choice(customers))
+            product = random.choice(products)
+            requests.append(
+                lambda client=client, product=product: call(client, product)
+            )
+        return self.measure("create_order_from_product", requests)
+
+    def list_orders(self, clients, users, count):
+        url = reverse("orders:order-list")
+        requests = []
+        for _ in range(count):
+            client = self.client_for(clients, random.choice(users))
+            requests.append(lambda client=client: client.get(url).status_code < 400)
+        return self.measure("order_list", requests)
+
+    def assign_drivers(self):
+        order_ids = list(
+            Order.objects.filter(status="created").values_list("pk", flat=True)
+        )
+        Order.objects.filter(pk__in=order_ids).update(status="ready_to_collect")
+        return self.measure(
+            "assign_driver",
+            [
+                lambda order_id=order_id: assign_driver(order_id) is not None
+                for order_id in order_ids
+            ],
+        )
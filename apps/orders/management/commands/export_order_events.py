@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.orders.events import iter_events_ndjson
+
+
+class Command(BaseCommand):
+    help = "Write order events newer than a cursor (event id) as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=int, default=0)
+        parser.add_argument("--limit", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["limit"] is not None and options["limit"] < 0:
+            raise CommandError("--limit must not be negative.")
+        for line in iter_events_ndjson(
+            since=options["since"],
+            limit=options["limit"],
+            chunk_size=options["chunk_size"],
+        ):
+            self.stdout.write(line, ending="")
@@ -20,6 +20,14 @@ class OrderItem(models.Model):
 
 
 class Order(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["shop", "-created_at", "-id"]),
+            models.Index(fields=["customer", "-created_at", "-id"]),
+            models.Index(fields=["driver", "-created_at", "-id"]),
+            models.Index(fields=["-created_at", "-id"]),
+        ]
+
     ORDER_STATUS_CHOICES = [
         ("created", _("Order created")),
         ("submitted", _("Order submitted")),
@@ -29,11 +37,13 @@ class Order(models.Model):
         ("in_transit", _("Order in transit")),
         ("delivered", _("Order delivered")),
     ]
+    # Statuses that keep a driver busy
+    ACTIVE_STATUSES = ["assigned", "in_transit"]
     total_amount = models.DecimalField(
-        _("Total amount"), max_digits=10, decimal_places=10, default=0
+        _("Total amount"), max_digits=10, decimal_places=2, default=0
     )
     delivery_price = models.DecimalField(
-        _("Delivery price"), max_digits=10, decimal_places=10, default=0
+        _("Delivery price"), max_digits=10, decimal_places=2, default=0
     )
     total_weight = models.FloatField(
         default=0,
@@ -79,5 +89,60 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted state so saves can tell what changed
+        instance._loaded_state = (
+            instance.__dict__.get("status"),
+            instance.__dict__.get("driver_id"),
+        )
+        return instance
+
     def __str__(self):
         return f"Order {self.id} - {self.status}"
+
+
+class DeferredAssignment(models.Model):
+    """An order waiting for a free driver, retried with exponential backoff."""
+
+    order = models.OneToOneField(
+        Order, related_name="deferred_assignment", on_delete=models.CASCADE
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Deferred assignment for order {self.order_id} ({self.attempts})"
+
+
+class OrderEvent(models.Model):
+    """Append-only record of an order's status and driver changes."""
+
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"])]
+
+    order = models.ForeignKey(
+        Order,
+        related_name="events",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        help_text="Events outlive their order, so this is not a database constraint",
+    )
+    from_status = models.CharField(
+        max_length=20, choices=Order.ORDER_STATUS_CHOICES, null=True, blank=True
+    )
+    to_status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    driver = models.ForeignKey(
+        CustomUser,
+        related_name="order_events",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="Driver set by this change, empty if the driver did not change",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status}"
@@ -0,0 +1,6 @@
+from delivery_service.pagination import KeysetPagination
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 50
@@ -0,0 +1,94 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import DeferredAssignment
+from delivery_service.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, f"ORDER_ASSIGNMENT_RETRY_{name}", default)
+
+
+def backoff_delay(attempt):
+    """
+    Seconds to wait before the given retry attempt.
+
+    Exponential in the attempt number and capped; the upper half of the
+    window is jittered so orders that failed together do not retry together.
+    """
+    base = _setting("BASE_DELAY", 5)
+    window = min(_setting("MAX_DELAY", 300), base * 2 ** max(attempt - 1, 0))
+    return window / 2 + random.uniform(0, window / 2)
+
+
+def defer_assignment(order_id):
+    """
+    Queue an order for another assignment attempt. Each order is queued at
+    most once; it is dropped after ``ORDER_ASSIGNMENT_RETRY_MAX_ATTEMPTS``.
+    Returns the queue entry, or None if the order was given up on.
+    """
+    entry, _ = DeferredAssignment.objects.get_or_create(
+        order_id=order_id, defaults={"next_attempt_at": timezone.now()}
+    )
+    entry.attempts += 1
+
+    if entry.attempts > _setting("MAX_ATTEMPTS", 20):
+        logger.warning(
+            f"Giving up on assigning a driver to order {order_id} "
+            f"after {entry.attempts - 1} attempts."
+        )
+        entry.delete()
+        registry.inc("order_assignment_abandoned_total")
+        return None
+
+    delay = backoff_delay(entry.attempts)
+    entry.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    entry.save(update_fields=["attempts", "next_attempt_at"])
+    registry.inc("order_assignment_retries_total")
+    logger.info(
+        f"No driver for order {order_id}; retry {entry.attempts} in {delay:.1f}s."
+    )
+    return entry
+
+
+def clear_deferred_assignment(order_id):
+    DeferredAssignment.objects.filter(order_id=order_id).delete()
+
+
+def due_assignments(limit=100):
+    """Lock and return ids of orders whose next attempt is due."""
+    return list(
+        DeferredAssignment.objects.select_for_update(skip_locked=True)
+        .filter(next_attempt_at__lte=timezone.now())
+        .order_by("next_attempt_at")
+        .values_list("order_id", flat=True)[:limit]
+    )
+
+
+def wake_deferred_assignments(count=1):
+    """
+    Make the longest-waiting queued orders due now, e.g. because a driver
+    has just become free, and process them once the transaction commits.
+    """
+    from apps.orders.tasks import process_deferred_assignments
+
+    waiting = list(
+        DeferredAssignment.objects.order_by("created_at").values_list("pk", flat=True)[
+            :count
+        ]
+    )
+    if not waiting:
+        return 0
+
+    DeferredAssignment.objects.filter(pk__in=waiting).update(
+        next_attempt_at=timezone.now()
+    )
+    transaction.on_commit(process_deferred_assignments.delay)
+    return len(waiting)
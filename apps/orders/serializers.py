@@ -1,7 +1,35 @@
 from rest_framework import serializers
 from .models import Order
 
-class OrderSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Limit the serialized output to the field names passed as ``fields``."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        # Collapse repeated products into a single line per product
+        cart = {}
+        for item in value:
+            cart[item["product_id"]] = cart.get(item["product_id"], 0) + item["quantity"]
+        return cart
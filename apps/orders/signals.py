@@ -1,17 +1,100 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from apps.orders.models import OrderItem
+
+from apps.accounts.models import DriverProfile
+from apps.orders.availability import driver_index, refresh_driver_availability
+from apps.orders.events import record_events
+from apps.orders.models import Order, OrderItem
+from apps.orders.retry import wake_deferred_assignments
+from apps.orders.totals import apply_item_delta, mark_order_dirty, refresh_order_totals
+from apps.orders.transitions import order_status_changed
 
 
 @receiver(post_save, sender=OrderItem)
 def update_order_totals(sender, instance, created, **kwargs):
-    order = instance.order
+    if mark_order_dirty(instance.order_id):
+        return
+
+    if created:
+        # The product is already cached on the item by OrderItem.save()
+        apply_item_delta(
+            instance.order_id,
+            instance.total_price,
+            instance.product.weight * instance.quantity,
+        )
+    else:
+        refresh_order_totals([instance.order_id])
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_order_item_totals(sender, instance, **kwargs):
+    if not mark_order_dirty(instance.order_id):
+        refresh_order_totals([instance.order_id])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def update_driver_availability(sender, instance, **kwargs):
+    # Connected before record_order_change, which moves _loaded_state on to
+    # the saved state, so the driver the order had before is still known.
+    driver_ids = {instance.driver_id}
+    previous = getattr(instance, "_loaded_state", None)
+    if previous is not None:
+        driver_ids.add(previous[1])
+    freed = refresh_driver_availability(driver_ids)
+    if freed:
+        wake_deferred_assignments(count=len(freed))
+
+
+@receiver(post_save, sender=DriverProfile)
+@receiver(post_delete, sender=DriverProfile)
+def invalidate_driver_index(sender, instance, **kwargs):
+    driver_index.invalidate()
 
-    total_amount = sum(item.total_price for item in order.items.all())
-    total_weight = sum(
-        item.product.weight * item.quantity for item in order.items.all()
-    )
 
-    order.total_amount = total_amount
-    order.total_weight = total_weight
-    order.save()
+@receiver(order_status_changed)
+def update_availability_on_transition(
+    sender, from_status, to_status, changes, previous_driver_ids=(), **kwargs
+):
+    if (
+        from_status not in Order.ACTIVE_STATUSES
+        and to_status not in Order.ACTIVE_STATUSES
+    ):
+        return
+
+    driver_ids = {fields.get("driver_id") for fields in changes.values()} - {None}
+    driver_ids.update(previous_driver_ids)
+    unknown = [
+        order_id for order_id, fields in changes.items() if "driver_id" not in fields
+    ]
+    if unknown:
+        driver_ids.update(
+            Order.objects.filter(pk__in=unknown, driver__isnull=False).values_list(
+                "driver_id", flat=True
+            )
+        )
+
+    freed = refresh_driver_availability(driver_ids)
+    if freed:
+        wake_deferred_assignments(count=len(freed))
+
+
+@receiver(post_save, sender=Order)
+def record_order_change(sender, instance, created, **kwargs):
+    state = (instance.status, instance.driver_id)
+    previous = getattr(instance, "_loaded_state", None)
+
+    if created:
+        record_events([(instance.pk, None, instance.status, instance.driver_id)])
+    elif previous is not None and previous != state:
+        driver_id = instance.driver_id if previous[1] != instance.driver_id else None
+        record_events([(instance.pk, previous[0], instance.status, driver_id)])
+    instance._loaded_state = state
+
+
+@receiver(order_status_changed)
+def record_transition(sender, from_status, to_status, changes, **kwargs):
+    record_events(
+        (order_id, from_status, to_status, fields.get("driver_id"))
+        for order_id, fields in changes.items()
+    )
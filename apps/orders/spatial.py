@@ -0,0 +1,108 @@
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in km."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+
+class SpatialGrid:
+    """
+    Points bucketed into a fixed grid of ``cell_degrees`` square cells.
+
+    A nearest-neighbour query scans rings of cells around the query point
+    and stops once no unscanned ring can hold anything closer than the
+    k-th best match found so far, so only a handful of cells are visited
+    regardless of how many points the grid holds. Inserts, moves and
+    removals touch a single cell.
+    """
+
+    def __init__(self, cell_degrees=0.02):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_degrees),
+            math.floor(longitude / self.cell_degrees),
+        )
+
+    def insert(self, key, latitude, longitude, weight=0.0):
+        """Add or move ``key``; ``weight`` is the value ``nearest`` filters on."""
+        self.remove(key)
+        cell = self._cell(latitude, longitude)
+        self._points[key] = (latitude, longitude, weight, cell)
+        self._cells.setdefault(cell, {})[key] = (latitude, longitude, weight)
+
+    def remove(self, key):
+        point = self._points.pop(key, None)
+        if point is not None:
+            bucket = self._cells[point[3]]
+            del bucket[key]
+            if not bucket:
+                del self._cells[point[3]]
+
+    def position(self, key):
+        point = self._points.get(key)
+        return point[:2] if point else None
+
+    def _ring(self, row, col, radius):
+        if radius == 0:
+            yield row, col
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    def nearest(self, latitude, longitude, k=1, min_weight=0.0, exclude=(), max_km=50):
+        """
+        Up to ``k`` ``(distance_km, key)`` pairs closest to the given point,
+        nearest first, among points with a weight of at least ``min_weight``
+        within ``max_km``.
+        """
+        if not self._points:
+            return []
+        row, col = self._cell(latitude, longitude)
+        # Shortest possible distance across one cell, narrowest at the poles
+        cell_km = (
+            self.cell_degrees
+            * KM_PER_DEGREE
+            * max(math.cos(math.radians(min(abs(latitude) + 1, 90))), 0.01)
+        )
+        max_radius = int(max_km / cell_km) + 1
+
+        best = []
+        for radius in range(max_radius + 1):
+            if len(best) == k and -best[0][0] <= (radius - 1) * cell_km:
+                break
+            for cell in self._ring(row, col, radius):
+                for key, (lat, lon, weight) in self._cells.get(cell, {}).items():
+                    if weight < min_weight or key in exclude:
+                        continue
+                    distance = distance_km(latitude, longitude, lat, lon)
+                    if distance > max_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, key))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, key))
+        return sorted((-distance, key) for distance, key in best)
@@ -1,36 +1,74 @@
 from __future__ import absolute_import
 
+import logging
+
 from celery import shared_task
-from celery.exceptions import TaskRetry
+from django.db import transaction
 
-from apps.accounts.models import CustomUser
+from apps.delivery.geocoding import geocode
+from apps.orders.availability import find_available_driver, refresh_driver_availability
+from apps.orders.dispatch import dispatch_ready_orders
 from apps.orders.models import Order
+from apps.orders.retry import (
+    clear_deferred_assignment,
+    defer_assignment,
+    due_assignments,
+)
+from apps.orders.transitions import transition
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def assign_driver(order_id):
-    try:
-        order = Order.objects.get(id=order_id)
-    except Order.DoesNotExist:
-        raise TaskRetry("Order not found", exc=None)
-
-    # Check if the order is really in 'ready_to_collect' status
-    if order.status != "ready_to_collect":
-        raise TaskRetry(
-            f"Order {order_id} is not in 'ready_to_collect' status", exc=None
-        )
-
-    # Check for available drivers, who have no other orders in status 'assigned' or 'in_transit'
-    available_driver = (
-        CustomUser.objects.filter(role="driver")
-        .exclude(driver_orders__status__in=["assigned", "in_transit"])
-        .filter(driver_profile__capacity__gte=order.total_weight)
+    order = (
+        Order.objects.filter(id=order_id)
+        .only("status", "total_weight", "pickup_address")
         .first()
     )
 
-    if available_driver:
-        order.driver = available_driver
-        order.status = "assigned"
-        order.save()
-    else:
-        raise TaskRetry("No available driver for the order", exc=None)
+    # Check if the order still exists and is really in 'ready_to_collect' status
+    if order is None or order.status != "ready_to_collect":
+        logger.info(f"Order {order_id} is not waiting for a driver, skipping.")
+        clear_deferred_assignment(order_id)
+        return None
+
+    # Claim the nearest driver with enough capacity and without other orders
+    # in status 'assigned' or 'in_transit'
+    pickup = geocode(order.pickup_address) if order.pickup_address else None
+    available_driver = find_available_driver(order.total_weight, near=pickup)
+
+    if available_driver is None:
+        defer_assignment(order_id)
+        return None
+
+    if not transition(
+        order_id, "ready_to_collect", "assigned", driver_id=available_driver
+    ):
+        # Another worker moved the order first, give the claimed driver back
+        refresh_driver_availability([available_driver])
+        return None
+
+    clear_deferred_assignment(order_id)
+    return available_driver
+
+
+@shared_task
+def process_deferred_assignments(limit=100):
+    with transaction.atomic():
+        order_ids = due_assignments(limit)
+        for order_id in order_ids:
+            assign_driver(order_id)
+    return len(order_ids)
+
+
+@shared_task
+def dispatch_orders(limit=None):
+    result = dispatch_ready_orders(limit=limit)
+    return {
+        "matched": result.matched,
+        "unmatched": result.unmatched,
+        "trips": result.trips,
+        "held": result.held,
+        "orders_per_second": result.orders_per_second,
+    }
@@ -0,0 +1,122 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db.models import (
+    DecimalField,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem
+from apps.products.models import Product
+
+logger = logging.getLogger(__name__)
+
+# Sent with the ``order_ids`` whose total amount or weight was just rewritten
+order_totals_changed = Signal()
+
+# Order ids whose totals are waiting to be flushed, or None when totals are
+# applied immediately.
+_deferred_orders = ContextVar("deferred_order_totals", default=None)
+
+
+def _items_total(field):
+    return (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .order_by()
+        .values("order")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+
+
+def refresh_order_totals(order_ids):
+    """Recompute totals for the given orders in a single set-based UPDATE."""
+    amount = _items_total("total_price")
+    weight = _items_total(F("quantity") * F("product__weight"))
+
+    updated = Order.objects.filter(pk__in=order_ids).update(
+        total_amount=Coalesce(
+            Subquery(amount, output_field=DecimalField()),
+            Value(Decimal("0")),
+            output_field=DecimalField(),
+        ),
+        total_weight=Coalesce(
+            Subquery(weight, output_field=FloatField()),
+            Value(0.0),
+            output_field=FloatField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated:
+        order_totals_changed.send(sender=Order, order_ids=order_ids)
+    return updated
+
+
+def reprice_created_orders(products):
+    """
+    Re-price the items of ``created`` orders for ``products`` (a queryset) at
+    the products' current prices and recompute those orders' totals, in one
+    UPDATE each. Orders past ``created`` keep the prices they were placed at.
+    Returns the number of orders updated.
+    """
+    price = Product.objects.filter(pk=OuterRef("product_id")).values("price")
+    OrderItem.objects.filter(order__status="created", product__in=products).update(
+        total_price=F("quantity") * Subquery(price, output_field=DecimalField())
+    )
+    orders = Order.objects.filter(status="created", items__product__in=products)
+    return refresh_order_totals(orders.values_list("pk", flat=True))
+
+
+def apply_item_delta(order_id, amount, weight):
+    """Shift an order's totals by the given amount and weight without reading it."""
+    updated = Order.objects.filter(pk=order_id).update(
+        total_amount=F("total_amount") + amount,
+        total_weight=F("total_weight") + weight,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        order_totals_changed.send(sender=Order, order_ids=[order_id])
+    return updated
+
+
+def mark_order_dirty(order_id):
+    """Queue an order for recalculation; returns False if totals are not deferred."""
+    pending = _deferred_orders.get()
+    if pending is None:
+        return False
+    pending.add(order_id)
+    return True
+
+
+@contextmanager
+def defer_order_totals():
+    """
+    Suspend per-item totals maintenance and flush it once on exit.
+
+    Nested blocks share the outermost block's queue, so the flush happens
+    exactly once for the whole multi-item write.
+    """
+    if _deferred_orders.get() is not None:
+        yield
+        return
+
+    pending = set()
+    token = _deferred_orders.set(pending)
+    try:
+        yield
+    finally:
+        _deferred_orders.reset(token)
+
+    if pending:
+        logger.debug(f"Flushing totals for {len(pending)} deferred orders.")
+        refresh_order_totals(pending)
@@ -0,0 +1,81 @@
+import logging
+
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+# Allowed moves between Order.ORDER_STATUS_CHOICES
+ORDER_TRANSITIONS = {
+    "created": {"submitted"},
+    "submitted": {"pending", "created"},
+    "pending": {"ready_to_collect"},
+    "ready_to_collect": {"assigned"},
+    "assigned": {"in_transit", "ready_to_collect"},
+    "in_transit": {"delivered"},
+    "delivered": set(),
+}
+
+# Sent after orders changed status; ``changes`` maps each order id to the
+# extra fields written with the transition, and ``previous_driver_ids`` holds
+# the drivers the orders had before when the transition rewrote ``driver_id``.
+order_status_changed = Signal()
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def validate_transition(from_status, to_status):
+    if to_status not in ORDER_TRANSITIONS.get(from_status, ()):
+        raise InvalidTransition(
+            f"Order status cannot change from '{from_status}' to '{to_status}'."
+        )
+
+
+def notify_transition(from_status, to_status, changes, previous_driver_ids=()):
+    if changes:
+        order_status_changed.send(
+            sender=Order,
+            from_status=from_status,
+            to_status=to_status,
+            changes=changes,
+            previous_driver_ids=set(previous_driver_ids),
+        )
+
+
+def transition(order_id, from_status, to_status, **fields):
+    """
+    Move an order from ``from_status`` to ``to_status`` with one conditional
+    UPDATE, writing ``fields`` alongside the status.
+
+    Returns True if this call won the transition, False if the order was not
+    in ``from_status`` any more (e.g. a concurrent worker moved it first).
+    """
+    validate_transition(from_status, to_status)
+
+    previous_driver_ids = []
+    if "driver_id" in fields:
+        # The driver being replaced has to be released once the UPDATE wins.
+        previous_driver_ids = list(
+            Order.objects.filter(
+                pk=order_id, status=from_status, driver__isnull=False
+            ).values_list("driver_id", flat=True)
+        )
+    won = bool(
+        Order.objects.filter(pk=order_id, status=from_status).update(
+            status=to_status, updated_at=timezone.now(), **fields
+        )
+    )
+    if won:
+        notify_transition(
+            from_status, to_status, {order_id: fields}, previous_driver_ids
+        )
+    else:
+        logger.info(
+            f"Order {order_id} was not '{from_status}', "
+            f"transition to '{to_status}' skipped."
+        )
+    return won
@@ -1,7 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import create_order_from_product, order_list
+from .views import (
+    checkout,
+    create_order_from_product,
+    order_events_export,
+    order_list,
+)
 
 app_name = "orders"
 
@@ -12,4 +17,6 @@ urlpatterns = [
         create_order_from_product,
         name="create-order-from-product",
     ),
+    path("checkout/", checkout, name="checkout"),
+    path("events/export/", order_events_export, name="order-events-export"),
 ]
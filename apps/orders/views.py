@@ -1,13 +1,17 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db.models import Q
 
+from .checkout import CheckoutError, checkout_cart
+from .events import iter_events_ndjson
+from .filters import OrderFilter
 from .models import CustomUser, Order, OrderItem, Product
-from .serializers import OrderSerializer
+from .pagination import OrderPagination
+from .serializers import CheckoutSerializer, OrderSerializer
 
 
 def customer_user_required(view_func):
@@ -17,7 +21,9 @@ def customer_user_required(view_func):
 @customer_user_required
 @login_required
 def create_order_from_product(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(
+        Product.objects.select_related("supplier__shop_profile"), id=product_id
+    )
 
     # Check if the customer has an address
     customer_profile = getattr(request.user, "customer_profile", None)
@@ -27,7 +33,7 @@ def create_order_from_product(request, product_id):
         )
 
     # Get shop's address (pickup location)
-    shop_profile = getattr(product.shop, "shop_profile", None)
+    shop_profile = getattr(product.supplier, "shop_profile", None)
     if not shop_profile or not shop_profile.address:
         return JsonResponse(
             {"error": "Product shop does not have a valid address."}, status=400
@@ -47,7 +53,7 @@ def create_order_from_product(request, product_id):
         customer=request.user, status="created"
     ).first()
 
-    if existing_order and existing_order.shop == product.shop:
+    if existing_order and existing_order.shop_id == product.supplier_id:
         # Add item to existing order
         OrderItem.objects.create(
             order=existing_order,
@@ -55,8 +61,6 @@ def create_order_from_product(request, product_id):
             quantity=quantity,
             total_price=total_price,
         )
-        existing_order.total_amount += total_price
-        existing_order.save()
 
         return JsonResponse(
             {"message": "Item added to existing order.", "order_id": existing_order.id},
@@ -65,11 +69,10 @@ def create_order_from_product(request, product_id):
 
     # Create a new order
     order = Order.objects.create(
-        shop=product.shop,
+        shop=product.supplier,
         customer=request.user,
         pickup_address=shop_profile.address,
         dropoff_address=customer_profile.address,
-        total_amount=total_price,
         status="created",
     )
 
@@ -96,10 +99,20 @@ def order_list(request):
         elif role == "driver":
             orders = Order.objects.filter(driver=request.user)
         else:
-            orders = Order.objects.none() 
+            orders = Order.objects.none()
+
+        orders = orders.select_related("shop", "driver", "customer")
+        filterset = OrderFilter(request.query_params, queryset=orders)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = request.query_params.get("fields")
+        fields = [name.strip() for name in fields.split(",")] if fields else None
 
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        paginator = OrderPagination()
+        page = paginator.paginate_queryset(filterset.qs, request)
+        serializer = OrderSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
 
     elif request.method == "POST":
         if getattr(request.user, "role", None) == "customer":
@@ -113,3 +126,49 @@ def order_list(request):
             {"error": "Only customers can create orders."},
             status=status.HTTP_403_FORBIDDEN,
         )
+
+
+@api_view(["POST"])
+def checkout(request):
+    if getattr(request.user, "role", None) != "customer":
+        return Response(
+            {"error": "Only customers can create orders."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    serializer = CheckoutSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        orders = checkout_cart(request.user, serializer.validated_data["items"])
+    except CheckoutError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        OrderSerializer(orders, many=True).data, status=status.HTTP_201_CREATED
+    )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def order_events_export(request):
+    """Stream order events after the ``since`` event id as NDJSON."""
+    try:
+        since = int(request.query_params.get("since", 0))
+        limit = int(request.query_params.get("limit", 0))
+    except ValueError:
+        return Response(
+            {"error": "'since' and 'limit' must be integers."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if limit < 0:
+        return Response(
+            {"error": "'limit' must not be negative."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return StreamingHttpResponse(
+        iter_events_ndjson(since=since, limit=limit or None),
+        content_type="application/x-ndjson",
+    )
@@ -0,0 +1,83 @@
+"""
+Set-based price and availability changes for many products at once.
+
+Each change is a single UPDATE over the selected products, whatever their
+number. ``created`` orders holding those products are then re-priced in one
+aggregate pass, so seasonal repricing of a whole catalogue is one short
+transaction rather than one request per product.
+"""
+
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from apps.orders.totals import reprice_created_orders
+from apps.products.cache import catalogue_cache
+from apps.products.search import reindex_products
+
+logger = logging.getLogger(__name__)
+
+REINDEX_BATCH_SIZE = 1000
+
+
+def _new_price(price_percent, price_delta):
+    price = DecimalField(max_digits=10, decimal_places=2)
+    if price_percent is not None:
+        # The factor keeps its own precision; only the final price is rounded.
+        factor = Value(
+            1 + Decimal(price_percent) / 100,
+            output_field=DecimalField(max_digits=12, decimal_places=6),
+        )
+        expression = Round(F("price") * factor, 2, output_field=price)
+    else:
+        expression = F("price") + Value(Decimal(price_delta), output_field=price)
+    return Greatest(expression, Value(Decimal("0"), output_field=price))
+
+
+def bulk_update_products(
+    products, price_percent=None, price_delta=None, is_active=None
+):
+    """
+    Apply a price change and/or set ``is_active`` on every product in
+    ``products``, a queryset filtered on fields this does not change.
+
+    ``price_percent`` scales prices (``-10`` is 10% off) and ``price_delta``
+    adds an absolute amount; prices never go below zero. Returns
+    ``(products_updated, orders_updated)``.
+    """
+    values = {"updated_at": timezone.now()}
+    if price_percent is not None or price_delta is not None:
+        values["price"] = _new_price(price_percent, price_delta)
+    if is_active is not None:
+        values["is_active"] = is_active
+
+    with transaction.atomic():
+        suppliers = set(
+            products.order_by().values_list("supplier", flat=True).distinct()
+        )
+        updated = products.update(**values)
+        orders = reprice_created_orders(products) if "price" in values else 0
+        if is_active is not None:
+            product_ids = list(products.values_list("pk", flat=True))
+            transaction.on_commit(lambda: _reindex(product_ids))
+        transaction.on_commit(lambda: _invalidate(suppliers))
+
+    logger.info(
+        f"Bulk-updated {updated} products of {len(suppliers)} shops; "
+        f"re-priced {orders} created orders."
+    )
+    return updated, orders
+
+
+def _reindex(product_ids):
+    for start in range(0, len(product_ids), REINDEX_BATCH_SIZE):
+        reindex_products(product_ids[start : start + REINDEX_BATCH_SIZE])
+
+
+def _invalidate(suppliers):
+    for supplier_id in suppliers:
+        catalogue_cache.invalidate_shop(supplier_id)
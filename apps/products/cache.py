@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from delivery_service.metrics import registry
+
+SHOP_VERSION_KEY = "products:catalogue:version:shop:{}"
+CATEGORY_VERSION_KEY = "products:catalogue:version:categories"
+MODIFIED_KEY = "products:catalogue:modified"
+ENTRY_KEY = "products:catalogue:{}:{}:{}:{}"
+
+_MISSING = object()
+
+registry.describe(
+    "product_catalogue_cache_total",
+    "Catalogue cache lookups by result: local_hit, shared_hit or miss.",
+)
+
+
+def _setting(name, default):
+    return getattr(settings, f"PRODUCT_CATALOGUE_CACHE_{name}", default)
+
+
+class CatalogueCache:
+    """
+    Per-shop cache of catalogue data, in front of the Django cache.
+
+    Entries are keyed by the shop's catalogue version and the global
+    category version, both kept in the shared cache. Bumping a version
+    makes every entry stored under the old one unreachable, so stale data is
+    never served and nothing has to be deleted. A bounded LRU in process
+    memory saves the round trip to the shared cache for hot entries; it is
+    keyed by the same versions, so it only has to be checked after reading
+    them. Versions start from the current time in milliseconds, so a
+    version evicted from the shared cache cannot come back at an old value.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or _setting("LOCAL_SIZE", 1024)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _versions(self, shop_id):
+        keys = [SHOP_VERSION_KEY.format(shop_id), CATEGORY_VERSION_KEY]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                cache.add(key, int(time.time() * 1000), timeout=None)
+                versions[key] = cache.get(key)
+        return [versions[key] for key in keys]
+
+    def _bump(self, key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+        cache.set(MODIFIED_KEY, time.time(), timeout=None)
+
+    def last_modified(self):
+        """
+        When any catalogue was last invalidated. Unlike the ``updated_at`` of
+        the products on a page, this also moves when products leave it.
+        """
+        modified = cache.get(MODIFIED_KEY)
+        if modified is None:
+            cache.add(MODIFIED_KEY, time.time(), timeout=None)
+            modified = cache.get(MODIFIED_KEY)
+        return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+    def get_or_set(self, shop_id, name, loader, timeout=None):
+        """
+        Cached ``name`` entry of ``shop_id``'s catalogue, computed by calling
+        ``loader`` if it is not cached under the current versions.
+        """
+        key = ENTRY_KEY.format(shop_id, *self._versions(shop_id), name)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                registry.inc("product_catalogue_cache_total", result="local_hit")
+                return self._entries[key]
+
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            registry.inc("product_catalogue_cache_total", result="miss")
+            value = loader()
+            cache.set(key, value, timeout or _setting("TIMEOUT", 3600))
+        else:
+            registry.inc("product_catalogue_cache_total", result="shared_hit")
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate_shop(self, shop_id):
+        self._bump(SHOP_VERSION_KEY.format(shop_id))
+
+    def invalidate_categories(self):
+        self._bump(CATEGORY_VERSION_KEY)
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+
+
+catalogue_cache = CatalogueCache()
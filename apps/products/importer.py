@@ -0,0 +1,225 @@
+"""
+Streaming import of a shop's products from CSV or NDJSON.
+
+Rows are read one at a time, validated, and upserted by ``(supplier, sku)``
+in batches, so memory use depends on the batch size rather than the file
+size. Each row may have ``sku``, ``name``, ``price``, ``weight``,
+``category`` (a category name) and ``is_active``; ``sku``, ``name`` and
+``price`` are required. Invalid rows are skipped and reported with their
+line number.
+"""
+
+import codecs
+import csv
+import json
+import logging
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.products.cache import catalogue_cache
+from apps.products.models import Category, Product
+from apps.products.search import reindex_products
+
+logger = logging.getLogger(__name__)
+
+STATUS_CACHE_KEY = "products:import:{}"
+FORMATS = ("csv", "ndjson")
+UPDATE_FIELDS = ["name", "category", "price", "weight", "is_active", "updated_at"]
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+
+ImportResult = namedtuple("ImportResult", ["processed", "imported", "failed", "errors"])
+
+
+class RowError(ValueError):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, f"PRODUCT_IMPORT_{name}", default)
+
+
+def set_import_status(import_id, status, result=None, **extra):
+    """Publish the state of an import so any process can report it."""
+    summary = {"status": status, **extra}
+    if result is not None:
+        summary.update(result._asdict())
+    cache.set(
+        STATUS_CACHE_KEY.format(import_id),
+        summary,
+        timeout=_setting("STATUS_TIMEOUT", 86400),
+    )
+
+
+def get_import_status(import_id):
+    return cache.get(STATUS_CACHE_KEY.format(import_id))
+
+
+def detect_format(filename):
+    """Import format implied by ``filename``'s extension, or None."""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        return "csv"
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    return None
+
+
+def iter_rows(stream, format):
+    """
+    Yield ``(line_number, row)`` pairs from a binary ``stream``. Rows that
+    cannot be parsed are yielded as a ``RowError``.
+    """
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == "ndjson":
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = RowError(f"Invalid JSON: {e}")
+            if not isinstance(row, (dict, RowError)):
+                row = RowError("Each line must be a JSON object.")
+            yield number, row
+    else:
+        raise ValueError(f"Unsupported import format: {format}")
+
+
+def _text(row, name, max_length, required=False):
+    value = str(row.get(name) or "").strip()
+    if required and not value:
+        raise RowError(f"{name} is required.")
+    if len(value) > max_length:
+        raise RowError(f"{name} is longer than {max_length} characters.")
+    return value
+
+
+def _price(value):
+    try:
+        price = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise RowError(f"Invalid price: {value!r}.")
+    if not price.is_finite() or price < 0:
+        raise RowError(f"Invalid price: {value!r}.")
+    if price.as_tuple().exponent < -2 or price >= Decimal("1e8"):
+        raise RowError(f"Price {value} must have at most 8 digits and 2 decimals.")
+    return price
+
+
+def _weight(value):
+    if value in (None, ""):
+        return 0.0
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"Invalid weight: {value!r}.")
+    if not 0.0 <= weight <= 100.0:
+        raise RowError(f"Weight {weight} is outside 0-100.")
+    return weight
+
+
+def _flag(value):
+    if value in (None, ""):
+        return True
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f"Invalid is_active: {value!r}.")
+
+
+def build_product(row, supplier, categories):
+    """Validated, unsaved ``Product`` for ``row``; raises ``RowError``."""
+    if isinstance(row, RowError):
+        raise row
+    if row.get("price") in (None, ""):
+        raise RowError("price is required.")
+    category_name = _text(row, "category", 100)
+    category_id = None
+    if category_name:
+        category_id = categories.get(category_name.lower())
+        if category_id is None:
+            raise RowError(f"Unknown category: {category_name!r}.")
+    return Product(
+        supplier=supplier,
+        sku=_text(row, "sku", 64, required=True),
+        name=_text(row, "name", 100, required=True),
+        price=_price(row["price"]),
+        weight=_weight(row.get("weight")),
+        category_id=category_id,
+        is_active=_flag(row.get("is_active")),
+    )
+
+
+def import_products(supplier, rows, batch_size=None, progress=None):
+    """
+    Upsert ``(line_number, row)`` pairs as ``supplier``'s products and
+    return an ``ImportResult``. ``progress`` is called with the running
+    result after every batch. Later rows win when a SKU repeats.
+    """
+    batch_size = batch_size or _setting("BATCH_SIZE", 1000)
+    max_errors = _setting("MAX_ERRORS", 1000)
+    categories = {
+        name.lower(): pk for pk, name in Category.objects.values_list("pk", "name")
+    }
+    processed = imported = failed = reported = 0
+    errors = []
+    batch = {}
+
+    def flush():
+        nonlocal imported
+        products = list(batch.values())
+        batch.clear()
+        if not products:
+            return
+        # One transaction per batch, so its rows and their index entries are
+        # written together and the database syncs once per batch, not per row.
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["supplier", "sku"],
+                update_fields=UPDATE_FIELDS,
+            )
+            reindex_products([product.pk for product in products if product.pk])
+        imported += len(products)
+
+    for number, row in rows:
+        processed += 1
+        try:
+            product = build_product(row, supplier, categories)
+        except RowError as e:
+            failed += 1
+            if len(errors) < max_errors:
+                errors.append({"line": number, "error": str(e)})
+            continue
+        batch.pop(product.sku, None)
+        batch[product.sku] = product
+        if len(batch) >= batch_size:
+            flush()
+            if progress:
+                progress(ImportResult(processed, imported, failed, errors))
+                reported = processed
+    flush()
+
+    transaction.on_commit(lambda: catalogue_cache.invalidate_shop(supplier.pk))
+    result = ImportResult(processed, imported, failed, errors)
+    if progress and processed != reported:
+        progress(result)
+    logger.info(
+        f"Imported {imported} products for shop {supplier.pk}; "
+        f"{failed} of {processed} rows failed."
+    )
+    return result
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import CustomUser
+from apps.products.importer import FORMATS, detect_format, import_products, iter_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or NDJSON file of products into a shop's catalogue, "
+        "upserting by SKU, and report progress and invalid rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--shop", required=True, help="Shop user id or username.")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        shop = options["shop"]
+        lookup = {"pk": int(shop)} if shop.isdigit() else {"username": shop}
+        try:
+            supplier = CustomUser.objects.get(role="shop", **lookup)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No shop user {shop!r}.")
+        format = options["format"] or detect_format(options["path"])
+        if format is None:
+            raise CommandError("Cannot tell the file format; pass --format.")
+
+        started = time.perf_counter()
+
+        def progress(result):
+            self.stdout.write(
+                f"{result.processed} rows read, {result.imported} imported, "
+                f"{result.failed} failed ({time.perf_counter() - started:.1f}s)"
+            )
+
+        with open(options["path"], "rb") as stream:
+            result = import_products(
+                supplier,
+                iter_rows(stream, format),
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
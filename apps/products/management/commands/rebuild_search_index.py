@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.products.search import get_search_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the product search index if needed and fill it from scratch, "
+        "e.g. after products were changed with bulk updates that bypass the "
+        "save signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(
+            f"Indexed {count} products with {type(get_search_backend()).__name__} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
@@ -1,6 +1,6 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import CheckConstraint, Q
+from django.db.models import CheckConstraint, Q, UniqueConstraint
 
 from apps.accounts.models import CustomUser
 
@@ -21,10 +21,15 @@ class Product(models.Model):
                 check=Q(weight__gte=0.0) & Q(weight__lte=100.0),
                 name="weight_range",
             ),
+            UniqueConstraint(fields=["supplier", "sku"], name="unique_supplier_sku"),
         )
-        indexes = [models.Index(fields=["supplier", "category"])]
+        indexes = [
+            models.Index(fields=["supplier", "category"]),
+            models.Index(fields=["is_active", "name", "id"]),
+        ]
 
     name = models.CharField(max_length=100)
+    sku = models.CharField(max_length=64, null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     weight = models.FloatField(
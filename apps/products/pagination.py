@@ -0,0 +1,6 @@
+from delivery_service.pagination import KeysetPagination
+
+
+class ProductPagination(KeysetPagination):
+    ordering = ("name", "id")
+    page_size = 50
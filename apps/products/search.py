@@ -0,0 +1,304 @@
+"""
+Full-text search over active products' names and category names.
+
+Three interchangeable backends share one interface: ``install`` creates any
+storage they need, ``update`` (re)indexes ``(product_id, name, category)``
+documents, ``remove`` drops products, and ``search`` returns ``(product_id,
+score)`` pairs, best first. All terms must match; with ``prefix=True`` the
+last term also matches longer words, for autocomplete. Product names weigh
+more than category names.
+
+The backend is chosen with ``PRODUCT_SEARCH_BACKEND`` (a dotted path), or
+from the database vendor if unset.
+"""
+
+import bisect
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from apps.products.models import Product
+
+logger = logging.getLogger(__name__)
+
+TABLE = "products_search"
+NAME_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase words of ``text`` with diacritics removed."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text.lower())
+
+
+class InMemoryBackend:
+    """
+    Inverted index held in process memory, for tests and small catalogues.
+
+    Scores are TF-IDF with field weights. Each process has its own index,
+    which is built from the database on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def install(self):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._terms = {}
+            self._vocabulary = []
+            self.loaded = False
+
+    def update(self, documents):
+        with self._lock:
+            self._remove([product_id for product_id, _, _ in documents])
+            for product_id, name, category in documents:
+                weights = defaultdict(float)
+                for term in tokenize(name):
+                    weights[term] += NAME_WEIGHT
+                for term in tokenize(category):
+                    weights[term] += CATEGORY_WEIGHT
+                for term, weight in weights.items():
+                    if term not in self._postings:
+                        bisect.insort(self._vocabulary, term)
+                    self._postings[term][product_id] = weight
+                self._terms[product_id] = list(weights)
+
+    def remove(self, product_ids):
+        with self._lock:
+            self._remove(product_ids)
+
+    def _remove(self, product_ids):
+        for product_id in product_ids:
+            for term in self._terms.pop(product_id, ()):
+                postings = self._postings[term]
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\uffff")
+        return self._vocabulary[start:end]
+
+    def search(self, query, limit=20, prefix=False):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self._terms)
+            scores = None
+            for position, term in enumerate(terms):
+                last = position == len(terms) - 1
+                matches = {}
+                for candidate in self._expand(term) if prefix and last else [term]:
+                    postings = self._postings.get(candidate, {})
+                    idf = math.log(1 + total / len(postings)) if postings else 0.0
+                    for product_id, weight in postings.items():
+                        matches[product_id] = max(
+                            matches.get(product_id, 0.0), weight * idf
+                        )
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        product_id: score + matches[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in matches
+                    }
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+class SQLiteBackend:
+    """SQLite FTS5 table ranked by BM25; for development databases."""
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                "name, category, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def update(self, documents):
+        self.remove([product_id for product_id, _, _ in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, name, category) VALUES (%s, %s, %s)",
+                [(pk, name, category or "") for pk, name, category in documents],
+            )
+
+    def remove(self, product_ids):
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})",
+                list(product_ids),
+            )
+
+    def search(self, query, limit=20, prefix=False):
+        terms = [f'"{term}"' for term in tokenize(query)]
+        if not terms:
+            return []
+        if prefix:
+            terms[-1] += "*"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({TABLE}, %s, %s) AS rank FROM {TABLE} "
+                f"WHERE {TABLE} MATCH %s ORDER BY rank, rowid LIMIT %s",
+                [NAME_WEIGHT, CATEGORY_WEIGHT, " ".join(terms), limit],
+            )
+            return [(product_id, -rank) for product_id, rank in cursor.fetchall()]
+
+
+class PostgresBackend:
+    """
+    ``tsvector`` side table with a GIN index, ranked by ``ts_rank_cd``.
+    Uses the ``simple`` configuration, as product names are not prose.
+    """
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                f"product_id bigint PRIMARY KEY REFERENCES "
+                f"{Product._meta.db_table} (id) ON DELETE CASCADE, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TABLE}_document "
+                f"ON {TABLE} USING gin (document)"
+            )
+
+    def update(self, documents):
+        if not documents:
+            return
+        rows = ", ".join(["(%s::bigint, %s::text, %s::text)"] * len(documents))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (product_id, document) "
+                "SELECT id, setweight(to_tsvector('simple', name), 'A') "
+                "|| setweight(to_tsvector('simple', category), 'B') "
+                f"FROM (VALUES {rows}) AS documents (id, name, category) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                [
+                    value
+                    for pk, name, category in documents
+                    for value in (pk, name, category or "")
+                ],
+            )
+
+    def remove(self, product_ids):
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE product_id = ANY(%s)", [list(product_ids)]
+            )
+
+    def search(self, query, limit=20, prefix=False):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if prefix:
+            terms[-1] += ":*"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT product_id, ts_rank_cd(document, query) AS rank "
+                f"FROM {TABLE}, to_tsquery('simple', %s) AS query "
+                "WHERE document @@ query ORDER BY rank DESC, product_id LIMIT %s",
+                [" & ".join(terms), limit],
+            )
+            return cursor.fetchall()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Process-wide backend configured by ``PRODUCT_SEARCH_BACKEND``."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+                if path:
+                    _backend = import_string(path)()
+                elif connection.vendor == "postgresql":
+                    _backend = PostgresBackend()
+                elif connection.vendor == "sqlite":
+                    _backend = SQLiteBackend()
+                else:
+                    _backend = InMemoryBackend()
+    return _backend
+
+
+def product_documents(product_ids=None):
+    """Search documents of active products, optionally limited to ``product_ids``."""
+    products = Product.objects.filter(is_active=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products.values_list("pk", "name", "category__name").order_by("pk")
+
+
+def reindex_products(product_ids):
+    """Bring the index up to date for ``product_ids``, e.g. after they changed."""
+    backend = get_search_backend()
+    documents = list(product_documents(product_ids))
+    indexed = {product_id for product_id, _, _ in documents}
+    backend.remove([pk for pk in product_ids if pk not in indexed])
+    backend.update(documents)
+
+
+def rebuild_index(batch_size=1000):
+    """Index every active product from scratch. Returns the number indexed."""
+    backend = get_search_backend()
+    backend.install()
+    if isinstance(backend, InMemoryBackend):
+        backend.clear()
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+
+    count = 0
+    batch = []
+    for document in product_documents().iterator(chunk_size=batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            backend.update(batch)
+            count += len(batch)
+            batch = []
+    backend.update(batch)
+    count += len(batch)
+    if isinstance(backend, InMemoryBackend):
+        backend.loaded = True
+    logger.info(f"Indexed {count} products for search.")
+    return count
+
+
+def search_products(query, limit=20, prefix=False):
+    """Ranked ``(product_id, score)`` pairs of active products matching ``query``."""
+    backend = get_search_backend()
+    if isinstance(backend, InMemoryBackend) and not backend.loaded:
+        rebuild_index()
+    return backend.search(query, limit=limit, prefix=prefix)
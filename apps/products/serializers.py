@@ -1,5 +1,8 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
+from apps.accounts.models import CustomUser
 from apps.products.models import Category, Product
 
 
@@ -20,16 +23,104 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ["id", "name", "category", "price", "weight", "supplier", "is_active"]
+        fields = [
+            "id",
+            "sku",
+            "name",
+            "category",
+            "price",
+            "weight",
+            "supplier",
+            "is_active",
+        ]
         read_only_fields = ["id", "supplier"]
+        extra_kwargs = {"sku": {"required": False}}
 
     def validate(self, data):
         request = self.context["request"]
         if request.user.role != "shop":
             raise serializers.ValidationError("Only shop users can create products.")
+        sku = data.get("sku")
+        if sku:
+            duplicates = Product.objects.filter(supplier=request.user, sku=sku)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError(
+                    {"sku": "You already have a product with this SKU."}
+                )
         return data
 
     def create(self, validated_data):
         request = self.context["request"]
         validated_data["supplier"] = request.user
         return super().create(validated_data)
+
+
+class CatalogueProductSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source="category.name", default=None)
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "sku",
+            "name",
+            "category",
+            "category_name",
+            "price",
+            "weight",
+            "supplier",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+
+class BulkProductUpdateSerializer(serializers.Serializer):
+    """
+    Selects products by ``ids``, ``category`` and ``supplier`` (all given
+    filters must match) and describes the change: ``price_percent`` or
+    ``price_delta``, and/or ``is_active``.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(), required=False
+    )
+    supplier = serializers.PrimaryKeyRelatedField(
+        queryset=CustomUser.objects.filter(role="shop"), required=False
+    )
+    price_percent = serializers.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=Decimal("-100"),
+        max_value=Decimal("1000"),
+        required=False,
+    )
+    price_delta = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False
+    )
+    is_active = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if "price_percent" in data and "price_delta" in data:
+            raise serializers.ValidationError(
+                "Give either price_percent or price_delta, not both."
+            )
+        if not {"price_percent", "price_delta", "is_active"} & set(data):
+            raise serializers.ValidationError(
+                "Give price_percent, price_delta or is_active."
+            )
+        return data
+
+    def get_queryset(self):
+        products = Product.objects.all()
+        if "ids" in self.validated_data:
+            products = products.filter(pk__in=self.validated_data["ids"])
+        if "category" in self.validated_data:
+            products = products.filter(category=self.validated_data["category"])
+        if "supplier" in self.validated_data:
+            products = products.filter(supplier=self.validated_data["supplier"])
+        return products
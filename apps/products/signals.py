@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.accounts.models import ShopProfile
+from apps.products.cache import catalogue_cache
+from apps.products.models import Category, Product
+from apps.products.search import get_search_backend, reindex_products
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: reindex_products([instance.pk]))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().remove([instance.pk]))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if created:
+        return
+    product_ids = list(instance.product_set.values_list("pk", flat=True))
+    transaction.on_commit(lambda: reindex_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_catalogue(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalogue_cache.invalidate_shop(instance.supplier_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_catalogues(sender, instance, **kwargs):
+    transaction.on_commit(catalogue_cache.invalidate_categories)
+
+
+@receiver(post_save, sender=ShopProfile)
+def invalidate_shop_catalogue(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalogue_cache.invalidate_shop(instance.user_id))
+
+
+@receiver(m2m_changed, sender=ShopProfile.product_categories.through)
+def invalidate_shop_categories(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        transaction.on_commit(catalogue_cache.invalidate_categories)
+    else:
+        transaction.on_commit(lambda: catalogue_cache.invalidate_shop(instance.user_id))
+
+
+def install_search_backend(sender, **kwargs):
+    get_search_backend().install()
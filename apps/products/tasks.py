@@ -0,0 +1,36 @@
+from celery import shared_task
+from django.core.files.storage import default_storage
+
+from apps.accounts.models import CustomUser
+from apps.products.importer import (
+    import_products,
+    iter_rows,
+    set_import_status,
+)
+
+
+@shared_task
+def import_products_file(import_id, supplier_id, name, format):
+    """
+    Import the uploaded file ``name`` from the default storage, publishing
+    progress after every batch, and delete the file afterwards.
+    """
+    supplier = CustomUser.objects.get(pk=supplier_id)
+    set_import_status(import_id, "running", supplier=supplier_id)
+    try:
+        with default_storage.open(name, "rb") as stream:
+            result = import_products(
+                supplier,
+                iter_rows(stream, format),
+                progress=lambda result: set_import_status(
+                    import_id, "running", result, supplier=supplier_id
+                ),
+            )
+    except Exception as e:
+        set_import_status(import_id, "failed", supplier=supplier_id, error=str(e))
+        raise
+    finally:
+        default_storage.delete(name)
+
+    set_import_status(import_id, "done", result, supplier=supplier_id)
+    return result._asdict()
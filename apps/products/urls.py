@@ -1,11 +1,41 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import CreateCategoryView, CreateProductView, ProductListView
+from .views import (
+    CreateCategoryView,
+    CreateProductView,
+    ProductAutocompleteView,
+    ProductBulkUpdateView,
+    ProductCatalogueView,
+    ProductImportStatusView,
+    ProductImportView,
+    ProductListView,
+    ProductSearchView,
+    ShopCatalogueView,
+)
 
 app_name = "products"
 
 urlpatterns = [
     path("create-product/", CreateProductView.as_view(), name="create-product"),
     path("create-category/", CreateCategoryView.as_view(), name="create-category"),
+    path("catalogue/", ProductCatalogueView.as_view(), name="catalogue"),
+    path(
+        "shops/<int:shop_id>/catalogue/",
+        ShopCatalogueView.as_view(),
+        name="shop-catalogue",
+    ),
+    path("bulk-update/", ProductBulkUpdateView.as_view(), name="bulk-update"),
+    path("imports/", ProductImportView.as_view(), name="import-products"),
+    path(
+        "imports/<str:import_id>/",
+        ProductImportStatusView.as_view(),
+        name="import-status",
+    ),
+    path("search/", ProductSearchView.as_view(), name="search"),
+    path(
+        "search/autocomplete/",
+        ProductAutocompleteView.as_view(),
+        name="search-autocomplete",
+    ),
 ]
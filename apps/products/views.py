@@ -1,14 +1,45 @@
+import hashlib
+import uuid
+
+from django.core.files.storage import default_storage
 from django.db.models import Q
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.generic import ListView
 from django.views.generic.edit import CreateView, DeleteView, FormView, UpdateView
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions
 from rest_framework.response import Response
-from rest_framework.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from rest_framework.status import (
+    HTTP_201_CREATED,
+    HTTP_202_ACCEPTED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_403_FORBIDDEN,
+    HTTP_404_NOT_FOUND,
+)
 from rest_framework.views import APIView
 
+from apps.accounts.models import CustomUser
+from apps.products.cache import catalogue_cache
+from apps.products.bulk import bulk_update_products
+from apps.products.filters import ProductFilter
+from apps.products.importer import (
+    detect_format,
+    get_import_status,
+    set_import_status,
+)
 from apps.products.models import Product
-from apps.products.serializers import CategorySerializer, ProductSerializer
+from apps.products.pagination import ProductPagination
+from apps.products.search import search_products
+from apps.products.serializers import (
+    BulkProductUpdateSerializer,
+    CatalogueProductSerializer,
+    CategorySerializer,
+    ProductSerializer,
+)
+from apps.products.tasks import import_products_file
 
 from .models import Category, Product
 
@@ -43,6 +74,234 @@ class CreateProductView(generics.CreateAPIView):
         serializer.save(supplier=self.request.user)
 
 
+class ProductCatalogueView(generics.ListAPIView):
+    """
+    Active products ordered by name, filterable by category, supplier and
+    price range, and paginated by keyset so deep pages cost the same as the
+    first one.
+
+    Each page carries an ``ETag`` derived from the ids and ``updated_at`` of
+    the products on it, and a ``Last-Modified`` that also accounts for
+    products leaving the page. A client revalidating a page that has not
+    changed gets a 304 without the page being serialized.
+    """
+
+    serializer_class = CatalogueProductSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ProductPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductFilter
+
+    def get_queryset(self):
+        return Product.objects.filter(is_active=True).select_related("category")
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        etag, last_modified = page_validators(page, self.paginator.has_next)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+def page_validators(products, has_next):
+    """
+    ETag and last modification timestamp of a page of products. The
+    products' categories count too, as their names are on the page. The
+    timestamp is no older than the last catalogue change, so it moves when
+    a product is deactivated, deleted or pushed onto another page.
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    timestamps = [catalogue_cache.last_modified()]
+    for product in products:
+        digest.update(f"{product.pk}:{product.updated_at.isoformat()};".encode())
+        timestamps.append(product.updated_at)
+        category = product.category
+        if category is not None:
+            digest.update(f"{category.pk}:{category.updated_at.isoformat()};".encode())
+            timestamps.append(category.updated_at)
+    digest.update(b"more" if has_next else b"end")
+    return quote_etag(digest.hexdigest()), int(max(timestamps).timestamp())
+
+
+class ShopCatalogueView(APIView):
+    """
+    A shop's categories and active products, served from the catalogue
+    cache and rebuilt only after the shop's products or categories change.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, shop_id):
+        catalogue = catalogue_cache.get_or_set(
+            shop_id, "catalogue", lambda: load_shop_catalogue(shop_id)
+        )
+        if catalogue is None:
+            return Response({"error": "Shop not found."}, status=HTTP_404_NOT_FOUND)
+        return Response(catalogue)
+
+
+def load_shop_catalogue(shop_id):
+    if not CustomUser.objects.filter(pk=shop_id, role="shop").exists():
+        return None
+    products = (
+        Product.objects.filter(supplier_id=shop_id, is_active=True)
+        .select_related("category")
+        .order_by("name", "id")
+    )
+    return {
+        "shop": shop_id,
+        "categories": list(
+            Category.objects.filter(shopprofile__user_id=shop_id)
+            .order_by("name")
+            .values("id", "name")
+        ),
+        "products": [
+            dict(product)
+            for product in CatalogueProductSerializer(products, many=True).data
+        ],
+    }
+
+
+class ProductSearchView(APIView):
+    """
+    Active products matching the words in ``q``, best match first, limited
+    to ``limit`` results. Ranking is done by the search backend; the
+    products are then fetched in one query.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    prefix = False
+    default_limit = 20
+    max_limit = 100
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except (TypeError, ValueError):
+            return self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        ranked = search_products(query, self.get_limit(request), prefix=self.prefix)
+        products = Product.objects.filter(
+            pk__in=[product_id for product_id, _ in ranked], is_active=True
+        ).select_related("category")
+        products = {product.pk: product for product in products}
+        ordered = [products[pk] for pk, _ in ranked if pk in products]
+        return Response({"results": self.serialize(ordered)})
+
+    def serialize(self, products):
+        return CatalogueProductSerializer(products, many=True).data
+
+
+class ProductAutocompleteView(ProductSearchView):
+    """Suggestions for a partially typed query; the last word may be a prefix."""
+
+    prefix = True
+    default_limit = 10
+    max_limit = 20
+
+    def serialize(self, products):
+        return [{"id": product.pk, "name": product.name} for product in products]
+
+
+class ProductBulkUpdateView(APIView):
+    """
+    Change the price and/or availability of every product matching the
+    given filters in one transaction. Shops can only change their own
+    products; admins must give at least one filter.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        is_admin = user.is_staff or user.role == "admin"
+        if user.role != "shop" and not is_admin:
+            return Response(
+                {"error": "Only shop users or admin can update products."},
+                status=HTTP_403_FORBIDDEN,
+            )
+        serializer = BulkProductUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        products = serializer.get_queryset()
+        if user.role == "shop":
+            products = products.filter(supplier=user)
+        elif not {"ids", "category", "supplier"} & set(serializer.validated_data):
+            return Response(
+                {"error": "Give ids, category or supplier to select products."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        updated, orders = bulk_update_products(
+            products,
+            price_percent=serializer.validated_data.get("price_percent"),
+            price_delta=serializer.validated_data.get("price_delta"),
+            is_active=serializer.validated_data.get("is_active"),
+        )
+        return Response({"products_updated": updated, "orders_updated": orders})
+
+
+class ProductImportView(APIView):
+    """
+    Upload a CSV or NDJSON file of products to upsert by SKU. The file is
+    stored and imported by a Celery task; progress and per-row errors are
+    available from the import status endpoint.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != "shop":
+            return Response(
+                {"error": "Only shop users can import products."},
+                status=HTTP_403_FORBIDDEN,
+            )
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "No file uploaded."}, status=HTTP_400_BAD_REQUEST)
+        format = request.data.get("format") or detect_format(upload.name)
+        if format not in ("csv", "ndjson"):
+            return Response(
+                {"error": "Upload a .csv or .ndjson file, or set format."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        import_id = uuid.uuid4().hex
+        name = default_storage.save(f"product-imports/{import_id}.{format}", upload)
+        set_import_status(import_id, "queued", supplier=request.user.pk)
+        import_products_file.delay(import_id, request.user.pk, name, format)
+        return Response(
+            {
+                "import_id": import_id,
+                "status_url": request.build_absolute_uri(
+                    reverse("products:import-status", args=[import_id])
+                ),
+            },
+            status=HTTP_202_ACCEPTED,
+        )
+
+
+class ProductImportStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, import_id):
+        status = get_import_status(import_id)
+        if status is None or (
+            status.get("supplier") != request.user.pk and not request.user.is_staff
+        ):
+            return Response({"error": "Import not found."}, status=HTTP_404_NOT_FOUND)
+        return Response(status)
+
+
 class UpdateProductView(UpdateView):
     pass
 
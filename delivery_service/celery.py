@@ -3,10 +3,37 @@ import os
 from celery import Celery
 from django.conf import settings
 
+from delivery_service import task_metrics  # noqa: F401  (connects the signals)
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "delivery_service.settings")
 
 app = Celery("delivery_service")
 
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
-app.autodiscover_tasks(["apps.accounts", "apps.orders"])
+app.autodiscover_tasks(
+    ["apps.accounts", "apps.orders", "apps.delivery", "apps.products"]
+)
+
+app.conf.beat_schedule = {
+    "dispatch-ready-orders": {
+        "task": "apps.orders.tasks.dispatch_orders",
+        "schedule": 10.0,
+    },
+    "process-deferred-assignments": {
+        "task": "apps.orders.tasks.process_deferred_assignments",
+        "schedule": 5.0,
+    },
+    "flush-driver-locations": {
+        "task": "apps.delivery.tasks.flush_driver_locations",
+        "schedule": 5.0,
+    },
+    "refresh-travel-speeds": {
+        "task": "apps.delivery.tasks.refresh_travel_speeds",
+        "schedule": 600.0,
+    },
+    "refresh-distance-matrix": {
+        "task": "apps.delivery.tasks.refresh_distance_matrix",
+        "schedule": 3600.0,
+    },
+}
@@ -0,0 +1,121 @@
+import os
+import threading
+
+
+def _labels(labels):
+    """Prometheus label set for a dict of labels, escaping the values."""
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process store of counters and summaries.
+
+    Each metric is identified by its name and a set of labels. Counters only
+    go up; summaries keep the count, sum and maximum of the observed values,
+    which is enough to derive averages without keeping every sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, text):
+        """Set the help text exported with metric ``name``."""
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def summary(self, name, **labels):
+        """``{"count", "sum", "max"}`` of a summary, or None if never observed."""
+        with self._lock:
+            summary = self._summaries.get(self._key(name, labels))
+            if summary is None:
+                return None
+            count, total, maximum = summary
+        return {"count": count, "sum": total, "max": maximum}
+
+    def snapshot(self):
+        """Copies of all counters and summaries, keyed by ``(name, labels)``."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "summaries": {
+                    key: {"count": count, "sum": total, "max": maximum}
+                    for key, (count, total, maximum) in self._summaries.items()
+                },
+            }
+
+    def to_prometheus(self, **const_labels):
+        """
+        Render all metrics in the Prometheus text exposition format, adding
+        ``const_labels`` to every sample. Summaries are exported as
+        ``_count`` and ``_sum`` plus a ``_max`` gauge.
+        """
+        snapshot = self.snapshot()
+        families = {}
+        for (name, labels), value in snapshot["counters"].items():
+            families.setdefault((name, "counter"), []).append(("", labels, value))
+        for (name, labels), summary in snapshot["summaries"].items():
+            samples = families.setdefault((name, "summary"), [])
+            samples.append(("_count", labels, summary["count"]))
+            samples.append(("_sum", labels, summary["sum"]))
+            families.setdefault((f"{name}_max", "gauge"), []).append(
+                ("", labels, summary["max"])
+            )
+
+        lines = []
+        for (name, kind), samples in sorted(families.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in sorted(samples):
+                labels = _labels({**const_labels, **dict(labels)})
+                lines.append(f"{name}{suffix}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path, **const_labels):
+        """Atomically write the metrics to ``path``, e.g. for a textfile collector."""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as fh:
+            fh.write(self.to_prometheus(**const_labels))
+        os.replace(temporary, path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+registry = MetricsRegistry()
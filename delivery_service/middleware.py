@@ -0,0 +1,116 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from delivery_service.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_ROWS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def _setting(name, default):
+    return getattr(settings, f"SQL_INSTRUMENTATION_{name}", default)
+
+
+def fingerprint(sql):
+    """
+    Normalize ``sql`` so that queries differing only in their parameters,
+    the length of an ``IN`` list or the number of inserted rows are equal.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDERS.sub("(?)", sql.replace("%s", "?"))
+    sql = _ROWS.sub("(?)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts, times and fingerprints queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        """SELECT fingerprints run at least ``threshold`` times, most frequent first."""
+        return [
+            (sql, count)
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold and sql.upper().startswith("SELECT")
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record the number and total time of SQL queries run by each request.
+
+    Enabled with ``SQL_INSTRUMENTATION_ENABLED``; otherwise Django drops the
+    middleware at startup and it costs nothing. The figures are returned in
+    a ``Server-Timing`` header and aggregated per URL name in the metrics
+    registry. A SELECT repeated ``SQL_INSTRUMENTATION_REPEAT_THRESHOLD``
+    times within one request is reported as a probable N+1. Queries run
+    while a streaming response is being consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not _setting("ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = _setting("REPEAT_THRESHOLD", 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        repeated = recorder.repeated(self.threshold)
+        self.record(view, elapsed, recorder, repeated)
+
+        timings = [
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"',
+            f"app;dur={elapsed * 1000:.2f}",
+        ]
+        if repeated:
+            timings.append(f'n-plus-one;desc="{len(repeated)} repeated queries"')
+        if "Server-Timing" in response.headers:
+            timings.insert(0, response.headers["Server-Timing"])
+        response.headers["Server-Timing"] = ", ".join(timings)
+        return response
+
+    def record(self, view, elapsed, recorder, repeated):
+        registry.inc("http_requests_total", view=view)
+        registry.observe("http_request_duration_seconds", elapsed, view=view)
+        registry.observe("http_request_db_queries", recorder.count, view=view)
+        registry.observe(
+            "http_request_db_duration_seconds", recorder.duration, view=view
+        )
+        for sql, count in repeated:
+            registry.inc("http_request_n_plus_one_total", view=view, query=sql[:200])
+            logger.warning(f"Probable N+1 in {view}: {count}x {sql}")
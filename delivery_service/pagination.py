@@ -0,0 +1,116 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the full ``ordering`` key.
+
+    Each page is fetched with ``WHERE (a, b) < (last_a, last_b)`` expanded to
+    plain lookups, so the cost of a page does not depend on how deep into
+    the result set it is. All ordering fields must share one direction and the
+    last one must be unique (usually the primary key).
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        self.descending = self.ordering[0].startswith("-")
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(
+                self.seek_filter(self.decode_cursor(queryset, encoded))
+            )
+
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[: self.page_size]
+        self.last_position = (
+            [getattr(page[-1], name) for name in self.fields] if page else None
+        )
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(
+                request.query_params.get(self.page_size_query_param, self.page_size)
+            )
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def seek_filter(self, position):
+        lookup = "lt" if self.descending else "gt"
+        condition = Q()
+        for depth, name in enumerate(self.fields):
+            step = Q(**{f"{name}__{lookup}": position[depth]})
+            for prefix, value in zip(self.fields[:depth], position):
+                step &= Q(**{prefix: value})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, default=str).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, queryset, encoded):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.fields):
+                raise ValueError(position)
+            return [
+                queryset.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last_position)
+        )
+
+    def get_first_link(self):
+        return remove_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "first": self.get_first_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "first": {"type": "string", "format": "uri"},
+                "results": schema,
+            },
+        }
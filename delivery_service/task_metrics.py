@@ -0,0 +1,113 @@
+"""
+Celery task metrics recorded from Celery signals into the metrics registry.
+
+Publishing stamps each message with its send time, so the worker can
+measure how long the task waited in the queue before it started. Workers
+have their own registry per process; set ``CELERY_METRICS_FILE`` (which may
+contain ``{pid}``) to have each process write its metrics there in the
+Prometheus text format, at most every ``CELERY_METRICS_FILE_INTERVAL``
+seconds.
+"""
+
+import logging
+import os
+import time
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_process_shutdown,
+)
+from django.conf import settings
+
+from delivery_service.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SENT_AT_HEADER = "sent_at"
+
+registry.describe("celery_tasks_published_total", "Tasks sent to the broker.")
+registry.describe(
+    "celery_task_queue_wait_seconds", "Time from publishing a task to its start."
+)
+registry.describe("celery_task_runtime_seconds", "Time spent running a task.")
+registry.describe("celery_tasks_total", "Finished task runs by final state.")
+registry.describe("celery_task_retries_total", "Task retries by reason.")
+registry.describe("celery_task_failures_total", "Task failures by exception type.")
+
+_started = {}
+_last_written = 0.0
+
+
+def _task_name(sender):
+    return getattr(sender, "name", sender) or "unknown"
+
+
+@before_task_publish.connect
+def stamp_sent_at(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(SENT_AT_HEADER, time.time())
+    registry.inc("celery_tasks_published_total", task=_task_name(sender))
+
+
+@task_prerun.connect
+def record_start(sender=None, task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+    sent_at = task.request.get(SENT_AT_HEADER) if task else None
+    if sent_at:
+        wait = max(time.time() - float(sent_at), 0.0)
+        registry.observe("celery_task_queue_wait_seconds", wait, task=_task_name(task))
+
+
+@task_postrun.connect
+def record_finish(sender=None, task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    name = _task_name(task)
+    if started is not None:
+        registry.observe(
+            "celery_task_runtime_seconds", time.perf_counter() - started, task=name
+        )
+    registry.inc("celery_tasks_total", task=name, state=state or "UNKNOWN")
+    write_metrics_file()
+
+
+@task_retry.connect
+def record_retry(sender=None, reason=None, **kwargs):
+    reason = type(reason).__name__ if isinstance(reason, BaseException) else reason
+    registry.inc(
+        "celery_task_retries_total", task=_task_name(sender), reason=reason or "unknown"
+    )
+
+
+@task_failure.connect
+def record_failure(sender=None, exception=None, **kwargs):
+    registry.inc(
+        "celery_task_failures_total",
+        task=_task_name(sender),
+        exception=type(exception).__name__,
+    )
+
+
+@worker_process_shutdown.connect
+def flush_metrics_file(**kwargs):
+    write_metrics_file(force=True)
+
+
+def write_metrics_file(force=False):
+    """Write the metrics to ``CELERY_METRICS_FILE`` if set and due."""
+    global _last_written
+
+    path = getattr(settings, "CELERY_METRICS_FILE", None)
+    interval = getattr(settings, "CELERY_METRICS_FILE_INTERVAL", 15)
+    now = time.monotonic()
+    if not path or (not force and now - _last_written < interval):
+        return
+    _last_written = now
+    pid = os.getpid()
+    try:
+        registry.write_textfile(path.format(pid=pid), pid=pid)
+    except OSError as e:
+        logger.warning(f"Could not write Celery metrics to {path}: {e}")
@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from delivery_service.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("apps.accounts.urls")),
     path("orders/", include("apps.orders.urls")),
     path("products/", include("apps.products.urls")),
+    path("delivery/", include("apps.delivery.urls")),
+    path("metrics/", metrics, name="metrics"),
 ]
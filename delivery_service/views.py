@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from delivery_service.metrics import registry
+
+
+def metrics(request):
+    """
+    Metrics of this process in the Prometheus text format. Only served to
+    the addresses in ``METRICS_ALLOWED_IPS`` (localhost by default).
+    """
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden("Metrics are only available locally.")
+    return HttpResponse(
+        registry.to_prometheus(), content_type="text/plain; version=0.0.4"
+    )
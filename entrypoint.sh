@@ -8,10 +8,13 @@ done
 
 echo "PostgreSQL is up!"
 
-# Start Django development server in background
-python manage.py runserver 0.0.0.0:8000 &
+# Start the ASGI server in background; live order streams need it
+uvicorn delivery_service.asgi:application --host 0.0.0.0 --port 8000 --reload &
 
 # Start Celery worker in background
 celery -A delivery_service worker --loglevel=debug &
 
+# Start Celery beat for periodic tasks (order dispatch) in background
+celery -A delivery_service beat --loglevel=info &
+
 wait
\ No newline at end of file
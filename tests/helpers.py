@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+
+PASSWORD = "Str0ngP@ssw0rd123"
+
+
+def create_user(username, role, address=None, **kwargs):
+    user = get_user_model().objects.create_user(
+        email=f"{username}@test.com",
+        username=username,
+        first_name=username.title(),
+        password=PASSWORD,
+        role=role,
+        **kwargs,
+    )
+    if address:
+        profile = getattr(user, f"{role}_profile")
+        profile.address = address
+        profile.save()
+    return user
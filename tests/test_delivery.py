@@ -0,0 +1,786 @@
+import asyncio
+import json
+import os
+import threading
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import QuerySet
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.delivery.eta import (
+    hour_of_week,
+    route_eta,
+    speed_table,
+    update_travel_speeds,
+    zones_of,
+)
+from apps.delivery.geocoding import (
+    Gazetteer,
+    geocode_many,
+    haversine,
+    haversine_matrix,
+    normalize_address,
+    refresh_frequent_dropoffs,
+    route_distances,
+    shop_dropoff_matrix,
+)
+from apps.delivery.live import OrderFeed
+from apps.delivery.models import (
+    DeliveryTariff,
+    DriverLocation,
+    GeocodedAddress,
+    TravelSpeed,
+)
+from apps.delivery.checks import check_pubsub_broker
+from apps.delivery.pubsub import (
+    InMemoryBroker,
+    broker_path,
+    driver_channel,
+    get_broker,
+    redis_url,
+)
+from apps.delivery.pricing import TariffTable, requote_open_orders
+from apps.delivery.routing import plan_driver_route, plan_route
+from apps.delivery.tracking import LocationBuffer, location_buffer
+from apps.orders.checkout import checkout_cart
+from apps.orders.models import Order, OrderEvent
+from apps.orders.totals import apply_item_delta
+from apps.products.models import Product
+from apps.orders.transitions import transition
+from tests.helpers import create_user
+
+GAZETTEER = """address,latitude,longitude
+Market Street,51.5072,-0.1276
+5 Elm Avenue,48.8566,2.3522
+Harbour Road,52.5200,13.4050
+Bridge Lane,51.5250,-0.1000
+"""
+
+
+class GazetteerMixin:
+    """Serve geocoding from a small temporary gazetteer file."""
+
+    def setUp(self):
+        super().setUp()
+        fd, self.gazetteer_path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(GAZETTEER)
+        self.gazetteer = Gazetteer(self.gazetteer_path)
+        patcher = patch("apps.delivery.geocoding.gazetteer", self.gazetteer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(os.remove, self.gazetteer_path)
+
+
+def create_tariffs():
+    DeliveryTariff.objects.create(
+        name="City",
+        max_distance_km=5,
+        base_price=Decimal("3.00"),
+        price_per_km=Decimal("0.50"),
+        price_per_kg=Decimal("0.10"),
+    )
+    DeliveryTariff.objects.create(
+        name="Region",
+        max_distance_km=50,
+        base_price=Decimal("5.00"),
+        price_per_km=Decimal("0.40"),
+        price_per_kg=Decimal("0.20"),
+    )
+
+
+def twenty_km(pickups, dropoffs):
+    return np.full(len(pickups), 20.0)
+
+
+class PricingTestCase(TestCase):
+
+    def setUp(self):
+        create_tariffs()
+        self.tariffs = TariffTable.load()
+
+    def test_quote_uses_zone_of_each_distance(self):
+        """Verify each delivery is priced with the tariff of its distance zone."""
+        prices = self.tariffs.quote([10, 10, 10], [0, 5, 20])
+        np.testing.assert_allclose(prices, [4.0, 6.5, 15.0])
+
+    def test_quote_beyond_last_zone_is_nan(self):
+        """Ensure deliveries outside every zone are not priced."""
+        prices = self.tariffs.quote([1, 1], [10, 51])
+        self.assertFalse(np.isnan(prices[0]))
+        self.assertTrue(np.isnan(prices[1]))
+
+    def test_quote_without_tariffs(self):
+        """Ensure an empty tariff table prices nothing."""
+        self.assertTrue(np.isnan(TariffTable([]).quote([1], [1])).all())
+
+    def test_requote_open_orders(self):
+        """Verify open orders are re-quoted and delivered ones are left alone."""
+        shop = create_user("shop", "shop")
+        open_order = Order.objects.create(shop=shop, total_weight=10)
+        delivered = Order.objects.create(shop=shop, total_weight=10, status="delivered")
+
+        changed = requote_open_orders(
+            distance_resolver=lambda pickups, dropoffs: np.full(len(pickups), 20.0)
+        )
+
+        self.assertEqual(changed, 1)
+        open_order.refresh_from_db()
+        delivered.refresh_from_db()
+        self.assertEqual(open_order.delivery_price, Decimal("15.00"))
+        self.assertEqual(delivered.delivery_price, Decimal("0"))
+
+    def test_tariff_change_schedules_requote(self):
+        """Verify editing a tariff re-quotes orders after commit."""
+        tariff = DeliveryTariff.objects.get(name="City")
+        with self.captureOnCommitCallbacks() as callbacks:
+            tariff.base_price = Decimal("4.00")
+            tariff.save()
+        self.assertEqual(len(callbacks), 1)
+
+    def test_tariff_changes_queue_a_single_requote(self):
+        """Ensure editing several tariffs queues one delayed re-quote, not one each."""
+        cache.clear()
+        with patch("apps.delivery.tasks.requote_orders.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for tariff in DeliveryTariff.objects.all():
+                    tariff.base_price += 1
+                    tariff.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                DeliveryTariff.objects.get(name="City").save()
+        apply_async.assert_called_once_with(countdown=60)
+
+    @override_settings(DELIVERY_DISTANCE_RESOLVER="tests.test_delivery.twenty_km")
+    def test_new_and_changed_orders_are_quoted(self):
+        """Verify orders are priced on creation and re-priced when their weight changes."""
+        shop = create_user("shop", "shop")
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(shop=shop, total_weight=10)
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_price, Decimal("15.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_item_delta(order.pk, Decimal("1.00"), 5.0)
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_price, Decimal("16.00"))
+
+    @override_settings(DELIVERY_DISTANCE_RESOLVER="tests.test_delivery.twenty_km")
+    def test_checkout_orders_are_quoted_in_one_batch(self):
+        """Ensure a checkout's orders are priced by one vectorized call."""
+        customer = create_user("customer", "customer", address="1 High St")
+        products = []
+        for name in ("north", "south"):
+            shop = create_user(name, "shop", address=f"{name} road")
+            products.append(
+                Product.objects.create(
+                    name=name, price=1, weight=10, supplier=shop, is_active=True
+                )
+            )
+        with patch(
+            "apps.delivery.pricing.TariffTable.quote", wraps=self.tariffs.quote
+        ) as quote:
+            with self.captureOnCommitCallbacks(execute=True):
+                orders = checkout_cart(customer, {p.pk: 1 for p in products})
+        quote.assert_called_once()
+        prices = Order.objects.filter(pk__in=[o.pk for o in orders]).values_list(
+            "delivery_price", flat=True
+        )
+        self.assertEqual(list(prices), [Decimal("15.00")] * 2)
+
+
+class GeocodingTestCase(GazetteerMixin, TestCase):
+
+    def test_normalize_address(self):
+        """Verify case, punctuation and abbreviations are normalized."""
+        self.assertEqual(normalize_address("  12, Market St. "), "12 market street")
+        self.assertEqual(normalize_address(None), "")
+
+    def test_geocode_falls_back_to_street(self):
+        """Verify house numbers fall back to street-level gazetteer entries."""
+        points = geocode_many(["12 Market St", "Nowhere Lane"])
+        self.assertEqual(points["12 Market St"], (51.5072, -0.1276))
+        self.assertIsNone(points["Nowhere Lane"])
+
+    def test_each_address_is_geocoded_once(self):
+        """Ensure repeated lookups, including misses, are served from the cache table."""
+        geocode_many(["12 Market St", "Nowhere Lane"])
+        self.assertEqual(GeocodedAddress.objects.count(), 2)
+
+        with patch.object(self.gazetteer, "lookup") as lookup:
+            with CaptureQueriesContext(connection) as queries:
+                points = geocode_many(["12 market street", "Nowhere Lane"])
+        lookup.assert_not_called()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(points["12 market street"], (51.5072, -0.1276))
+
+    def test_haversine(self):
+        """Verify great-circle distances against a known city pair."""
+        london, paris = (51.5072, -0.1276), (48.8566, 2.3522)
+        self.assertAlmostEqual(haversine([london], [paris])[0], 343.5, delta=1)
+        matrix = haversine_matrix([london, paris], [london, paris])
+        self.assertEqual(matrix.shape, (2, 2))
+        np.testing.assert_allclose(np.diag(matrix), [0, 0], atol=1e-9)
+        self.assertAlmostEqual(matrix[0, 1], matrix[1, 0])
+
+    def test_route_distances(self):
+        """Verify route distances are scaled and unknown addresses yield NaN."""
+        distances = route_distances(
+            ["Market Street", "Market Street"], ["5 Elm Ave", "Nowhere"]
+        )
+        self.assertAlmostEqual(distances[0], 343.5 * 1.3, delta=2)
+        self.assertTrue(np.isnan(distances[1]))
+
+    def test_shop_dropoff_matrix(self):
+        """Verify the matrix covers geocoded shops and frequent drop-offs."""
+        cache.clear()
+        shop = create_user("shop", "shop", address="1 Market Street")
+        for address in ["5 Elm Avenue", "5 elm ave", "Harbour Road", "Unknown"]:
+            Order.objects.create(shop=shop, dropoff_address=address)
+
+        matrix = shop_dropoff_matrix()
+        self.assertAlmostEqual(matrix.distance(shop.id, "5 Elm Ave"), 343.5, delta=1)
+        self.assertIsNotNone(matrix.distance(shop.id, "Harbour Road"))
+        self.assertIsNone(matrix.distance(shop.id, "Unknown"))
+
+    def test_shop_dropoff_matrix_is_keyed_on_versions(self):
+        """Ensure cached matrices are served without queries until a version moves."""
+        cache.clear()
+        shop = create_user("shop", "shop", address="1 Market Street")
+        Order.objects.create(shop=shop, dropoff_address="5 Elm Avenue")
+        shop_dropoff_matrix()
+        with self.assertNumQueries(0):
+            matrix = shop_dropoff_matrix()
+        self.assertIsNone(matrix.distance(shop.id, "Harbour Road"))
+
+        Order.objects.create(shop=shop, dropoff_address="Harbour Road")
+        refresh_frequent_dropoffs()
+        self.assertIsNotNone(shop_dropoff_matrix().distance(shop.id, "Harbour Road"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = shop.shop_profile
+            profile.address = "Bridge Lane"
+            profile.save()
+        matrix = shop_dropoff_matrix()
+        self.assertAlmostEqual(
+            matrix.distance(shop.id, "Harbour Road"),
+            haversine([(51.5250, -0.1000)], [(52.5200, 13.4050)])[0],
+        )
+
+    @override_settings(DELIVERY_GEOCODE_MISS_TTL=60)
+    def test_misses_are_retried_after_their_ttl(self):
+        """Verify a cached miss is looked up again once it has expired."""
+        geocode_many(["Nowhere Lane"])
+        with patch.object(self.gazetteer, "lookup", return_value=(1.0, 2.0)):
+            self.assertIsNone(geocode_many(["Nowhere Lane"])["Nowhere Lane"])
+            GeocodedAddress.objects.update(
+                created_at=timezone.now() - timedelta(seconds=61)
+            )
+            self.assertEqual(geocode_many(["Nowhere Lane"])["Nowhere Lane"], (1.0, 2.0))
+        self.assertEqual(GeocodedAddress.objects.get().latitude, 1.0)
+
+
+class RoutingTestCase(GazetteerMixin, TestCase):
+
+    def assert_precedence(self, visit, pairs):
+        position = {stop: i for i, stop in enumerate(visit)}
+        for pickup, dropoff in pairs:
+            self.assertLess(position[pickup], position[dropoff])
+
+    def test_route_along_a_line(self):
+        """Verify stops on a line are visited in order without backtracking."""
+        points = [(0.0, lon) for lon in (0.3, 0.1, 0.4, 0.2)]
+        visit, distance = plan_route(points, [(1, 3), (3, 0)], start=(0.0, 0.0))
+        self.assertEqual(visit, [1, 3, 0, 2])
+        self.assertAlmostEqual(distance, haversine([(0, 0)], [(0, 0.4)])[0])
+
+    def test_pickups_precede_dropoffs(self):
+        """Ensure the optimizer never drops an order off before collecting it."""
+        # Drop-offs near the start and pickups far away tempt a greedy tour
+        points = [(0.0, 1.0), (0.0, 0.1), (0.0, 1.1), (0.0, 0.2)]
+        pairs = [(0, 1), (2, 3)]
+        visit, _ = plan_route(points, pairs, start=(0.0, 0.0))
+        self.assert_precedence(visit, pairs)
+
+    def test_fifty_orders_within_a_second(self):
+        """Verify 50 orders (100 stops) are planned well under a second."""
+        rng = np.random.default_rng(7)
+        points = [tuple(p) for p in rng.uniform([51.4, -0.3], [51.6, 0.1], (100, 2))]
+        pairs = [(2 * k, 2 * k + 1) for k in range(50)]
+
+        started = time.perf_counter()
+        visit, distance = plan_route(points, pairs, time_budget=0.5)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(sorted(visit), list(range(100)))
+        self.assert_precedence(visit, pairs)
+
+    def test_plan_driver_route(self):
+        """Verify a driver's orders become pickup/drop-off stops in a valid order."""
+        shop = create_user("shop", "shop")
+        driver = create_user("driver", "driver")
+        assigned = Order.objects.create(
+            shop=shop,
+            driver=driver,
+            status="assigned",
+            pickup_address="Market Street",
+            dropoff_address="Harbour Road",
+        )
+        in_transit = Order.objects.create(
+            shop=shop,
+            driver=driver,
+            status="in_transit",
+            pickup_address="Market Street",
+            dropoff_address="5 Elm Avenue",
+        )
+        lost = Order.objects.create(
+            shop=shop,
+            driver=driver,
+            status="assigned",
+            pickup_address="Market Street",
+            dropoff_address="Nowhere",
+        )
+
+        plan = plan_driver_route(driver.id, start=(51.5, -0.12))
+        stops = [(stop.order_id, stop.kind) for stop in plan.stops]
+        self.assertEqual(
+            stops,
+            [
+                (assigned.id, "pickup"),
+                (in_transit.id, "dropoff"),
+                (assigned.id, "dropoff"),
+            ],
+        )
+        self.assertEqual(plan.unrouted, [lost.id])
+
+    def test_route_view_is_limited_to_driver(self):
+        """Ensure drivers can only see their own route."""
+        driver = create_user("driver", "driver")
+        other = create_user("other", "driver")
+        client = APIClient()
+        client.force_authenticate(driver)
+
+        response = client.get(reverse("delivery:driver-route", args=[driver.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["stops"], [])
+        response = client.get(reverse("delivery:driver-route", args=[other.id]))
+        self.assertEqual(response.status_code, 403)
+
+
+class TrackingTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.driver = create_user("driver", "driver")
+        self.buffer = LocationBuffer(capacity=100, flush_size=3, flush_interval=60)
+        self.addCleanup(self.buffer.drain)
+        self.addCleanup(location_buffer.drain)
+
+    def test_flush_when_buffer_fills(self):
+        """Verify pings are stored in one batch once the flush size is reached."""
+        self.buffer.add(self.driver.id, 51.5, -0.12)
+        self.buffer.add(self.driver.id, 51.6, -0.13)
+        self.assertEqual(DriverLocation.objects.count(), 0)
+
+        self.buffer.add(self.driver.id, 51.7, -0.14)
+        self.assertEqual(DriverLocation.objects.count(), 3)
+        profile = self.driver.driver_profile
+        profile.refresh_from_db()
+        self.assertEqual((profile.latitude, profile.longitude), (51.7, -0.14))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_latest_position_without_queries(self):
+        """Ensure the latest position is read from memory or the cache only."""
+        now = timezone.now()
+        self.buffer.add_many(
+            [
+                (self.driver.id, 51.6, -0.13, now),
+                (self.driver.id, 51.5, -0.12, now - timezone.timedelta(seconds=5)),
+            ]
+        )
+        other = LocationBuffer()
+        with CaptureQueriesContext(connection) as queries:
+            local = self.buffer.latest(self.driver.id)
+            shared = other.latest(self.driver.id)
+            many = other.latest_many([self.driver.id, 0])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(local, (51.6, -0.13, now))
+        self.assertEqual(shared, local)
+        self.assertEqual(many, {self.driver.id: local})
+
+    def test_latest_position_is_shared_between_processes(self):
+        """Ensure a process cannot overwrite a newer fix stored by another one."""
+        now = timezone.now()
+        other = LocationBuffer(flush_interval=60)
+        self.addCleanup(other.drain)
+        other.add(self.driver.id, 51.6, -0.13, now)
+        latest = self.buffer.add(
+            self.driver.id, 51.5, -0.12, now - timezone.timedelta(seconds=5)
+        )
+        self.assertEqual(latest, {})
+        self.assertEqual(self.buffer.latest(self.driver.id), (51.6, -0.13, now))
+
+        self.buffer.add(self.driver.id, 51.7, -0.14, now + timezone.timedelta(1))
+        self.assertEqual(other.latest(self.driver.id)[:2], (51.7, -0.14))
+
+    def test_timer_flushes_without_further_pings(self):
+        """Verify waiting pings are flushed once they are flush_interval old."""
+        buffer = LocationBuffer(flush_size=10, flush_interval=0.05)
+        with patch("apps.delivery.tasks.store_driver_locations.delay") as delay:
+            buffer.add(self.driver.id, 51.5, -0.12)
+            deadline = time.monotonic() + 5
+            while not delay.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(delay.call_args.args[0]), 1)
+        self.assertEqual(buffer.drain(), [])
+
+    def test_full_buffer_drops_oldest(self):
+        """Verify an overflowing ring buffer keeps the newest pings."""
+        buffer = LocationBuffer(capacity=2, flush_size=10, flush_interval=60)
+        for latitude in (1.0, 2.0, 3.0):
+            buffer.add(self.driver.id, latitude, 0.0)
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual([row[1] for row in buffer.drain()], [2.0, 3.0])
+
+    def test_report_location_batch(self):
+        """Verify drivers can post a batch of pings and read back the latest."""
+        client = APIClient()
+        client.force_authenticate(self.driver)
+        pings = [
+            {"latitude": 51.5, "longitude": -0.12},
+            {"latitude": 51.6, "longitude": -0.13},
+        ]
+
+        response = client.post(
+            reverse("delivery:report-location"), pings, format="json"
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["accepted"], 2)
+
+        response = client.get(
+            reverse("delivery:driver-location", args=[self.driver.id])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["latitude"], 51.6)
+
+    def test_report_location_validation(self):
+        """Ensure out-of-range coordinates and non-drivers are rejected."""
+        client = APIClient()
+        client.force_authenticate(self.driver)
+        url = reverse("delivery:report-location")
+        response = client.post(url, {"latitude": 91, "longitude": 0}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        client.force_authenticate(create_user("customer", "customer"))
+        response = client.post(url, {"latitude": 1, "longitude": 0}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(None)
+        response = client.post(url, {"latitude": 1, "longitude": 0}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class LiveTrackingTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.customer = create_user("customer", "customer")
+        self.driver = create_user("driver", "driver")
+        self.order = Order.objects.create(
+            shop=self.shop, customer=self.customer, status="ready_to_collect"
+        )
+
+    async def test_broker_delivers_across_threads(self):
+        """Verify messages published from another thread reach subscribers."""
+        broker = InMemoryBroker(queue_size=2)
+        subscription = broker.subscribe(["order:1"])
+        thread = threading.Thread(
+            target=broker.publish, args=("order:1", {"type": "status"})
+        )
+        thread.start()
+        thread.join()
+
+        message = await subscription.get(timeout=1)
+        self.assertEqual(message, {"channel": "order:1", "type": "status"})
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+        subscription.close()
+        self.assertEqual(broker.subscriber_count("order:1"), 0)
+
+    async def test_slow_subscriber_keeps_newest_messages(self):
+        """Ensure a full subscriber queue drops its oldest message."""
+        broker = InMemoryBroker(queue_size=2)
+        subscription = broker.subscribe(["order:1"])
+        for n in range(3):
+            broker.publish("order:1", {"n": n})
+        await asyncio.sleep(0)
+        self.assertEqual((await subscription.get(timeout=1))["n"], 1)
+        self.assertEqual((await subscription.get(timeout=1))["n"], 2)
+
+    def test_transition_publishes_after_commit(self):
+        """Verify a status change is pushed to the order and customer channels."""
+        with patch("apps.delivery.live.publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                transition(
+                    self.order.id,
+                    "ready_to_collect",
+                    "assigned",
+                    driver_id=self.driver.id,
+                )
+        channels = [call.args[0] for call in publish.call_args_list]
+        self.assertEqual(
+            channels, [f"order:{self.order.id}", f"customer:{self.customer.id}"]
+        )
+        self.assertEqual(publish.call_args.args[1]["driver"], self.driver.id)
+
+    async def test_feed_follows_assigned_driver(self):
+        """Verify position updates are followed only while a driver carries the order."""
+        feed = OrderFeed([f"order:{self.order.id}"], {})
+        channel = driver_channel(self.driver.id)
+        feed.handle(
+            {
+                "type": "status",
+                "order": self.order.id,
+                "status": "assigned",
+                "driver": self.driver.id,
+            }
+        )
+        self.assertIn(channel, feed.subscription.channels)
+        feed.handle(
+            {
+                "type": "status",
+                "order": self.order.id,
+                "status": "in_transit",
+                "driver": None,
+            }
+        )
+        self.assertIn(channel, feed.subscription.channels)
+        feed.handle(
+            {
+                "type": "status",
+                "order": self.order.id,
+                "status": "delivered",
+                "driver": None,
+            }
+        )
+        self.assertNotIn(channel, feed.subscription.channels)
+        feed.close()
+
+    async def test_order_stream(self):
+        """Verify the order stream sends a snapshot and then live updates."""
+        await self.async_client.aforce_login(self.customer)
+        response = await self.async_client.get(
+            reverse("delivery:order-stream", args=[self.order.id])
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+
+        snapshot = await anext(events)
+        self.assertTrue(snapshot.startswith(b"event: snapshot"))
+
+        get_broker().publish(
+            f"order:{self.order.id}",
+            {
+                "type": "status",
+                "order": self.order.id,
+                "status": "assigned",
+                "driver": self.driver.id,
+            },
+        )
+        update = await asyncio.wait_for(anext(events), 1)
+        data = json.loads(update.decode().split("data: ")[1])
+        self.assertEqual(data["status"], "assigned")
+        await events.aclose()
+
+    async def test_change_during_snapshot_read_is_not_lost(self):
+        """Ensure a transition published while the snapshot is read still arrives."""
+        await self.async_client.aforce_login(self.customer)
+        read_snapshot = QuerySet.afirst
+        message = {
+            "type": "status",
+            "order": self.order.id,
+            "status": "assigned",
+            "driver": self.driver.id,
+        }
+
+        async def afirst(queryset):
+            get_broker().publish(f"order:{self.order.id}", message)
+            return await read_snapshot(queryset)
+
+        with patch.object(QuerySet, "afirst", afirst):
+            response = await self.async_client.get(
+                reverse("delivery:order-stream", args=[self.order.id])
+            )
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b"event: snapshot"))
+        update = await asyncio.wait_for(anext(events), 1)
+        self.assertEqual(
+            json.loads(update.decode().split("data: ")[1])["status"], "assigned"
+        )
+        await events.aclose()
+
+    async def test_stream_is_limited_to_participants(self):
+        """Ensure only the order's customer, shop, driver or staff can follow it."""
+        stranger = await get_user_model().objects.acreate(
+            username="stranger", email="stranger@test.com", role="customer"
+        )
+        await self.async_client.aforce_login(stranger)
+        response = await self.async_client.get(
+            reverse("delivery:order-stream", args=[self.order.id])
+        )
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get(
+            reverse("delivery:customer-stream", args=[self.customer.id])
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_streams_refuse_wsgi_requests(self):
+        """Ensure streams fail fast instead of hanging when served over WSGI."""
+        self.client.force_login(self.customer)
+        for url in (
+            reverse("delivery:order-stream", args=[self.order.id]),
+            reverse("delivery:customer-stream", args=[self.customer.id]),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 501)
+
+
+class BrokerConfigurationTestCase(TestCase):
+
+    @override_settings(CELERY_BROKER_URL="redis://redis:6379/0")
+    def test_redis_is_the_default_when_configured(self):
+        """Verify the Redis broker is chosen whenever a Redis URL is configured."""
+        self.assertEqual(broker_path(), "apps.delivery.pubsub.RedisBroker")
+        with override_settings(DELIVERY_PUBSUB_REDIS_URL="redis://pubsub:6379/2"):
+            self.assertEqual(redis_url(), "redis://pubsub:6379/2")
+        with override_settings(DELIVERY_PUBSUB_BROKER="x.Broker"):
+            self.assertEqual(broker_path(), "x.Broker")
+
+    @override_settings(
+        CELERY_BROKER_URL="amqp://rabbit", CELERY_TASK_ALWAYS_EAGER=False
+    )
+    def test_process_local_broker_is_flagged_outside_debug(self):
+        """Ensure the system check warns when workers cannot reach subscribers."""
+        self.assertEqual(broker_path(), "apps.delivery.pubsub.InMemoryBroker")
+        with override_settings(DEBUG=False):
+            self.assertEqual(
+                [warning.id for warning in check_pubsub_broker(None)],
+                ["delivery.W001"],
+            )
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_pubsub_broker(None), [])
+
+
+@override_settings(DELIVERY_ETA_MIN_SAMPLES=1, DELIVERY_ETA_DEFAULT_SPEED=25.0)
+class EtaTestCase(GazetteerMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.shop = create_user("shop", "shop")
+        self.customer = create_user("customer", "customer")
+        self.started = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def deliver(self, minutes, pickup="Market Street", dropoff="Bridge Lane"):
+        order = Order.objects.create(
+            shop=self.shop,
+            customer=self.customer,
+            status="delivered",
+            pickup_address=pickup,
+            dropoff_address=dropoff,
+        )
+        departed = OrderEvent.objects.create(
+            order=order, from_status="assigned", to_status="in_transit"
+        )
+        arrived = OrderEvent.objects.create(
+            order=order, from_status="in_transit", to_status="delivered"
+        )
+        OrderEvent.objects.filter(pk=departed.pk).update(created_at=self.started)
+        OrderEvent.objects.filter(pk=arrived.pk).update(
+            created_at=self.started + timedelta(minutes=minutes)
+        )
+        return order
+
+    def test_speeds_are_built_incrementally(self):
+        """Verify delivery legs are folded into their zone and hour only once."""
+        self.deliver(10)
+        self.assertEqual(update_travel_speeds(), 1)
+        self.deliver(20)
+        self.deliver(1, dropoff="Nowhere")
+        self.assertEqual(update_travel_speeds(), 1)
+        self.assertEqual(update_travel_speeds(), 0)
+
+        row = TravelSpeed.objects.get()
+        self.assertEqual(row.samples, 2)
+        self.assertEqual(row.zone, zones_of([(51.5250, -0.1000)])[0])
+        self.assertEqual(row.hour_of_week, hour_of_week(self.started))
+        self.assertAlmostEqual(row.duration_seconds, 1800)
+
+    def test_implausible_legs_are_ignored(self):
+        """Ensure legs with impossible speeds do not skew the tables."""
+        self.deliver(0.01)
+        self.assertEqual(update_travel_speeds(), 0)
+        self.assertFalse(TravelSpeed.objects.exists())
+
+    def test_speed_lookup_falls_back(self):
+        """Verify unknown slots fall back to the hour average, then the default."""
+        self.deliver(10)
+        update_travel_speeds()
+        row = TravelSpeed.objects.get()
+        hour = row.hour_of_week
+        other_hour = (hour + 1) % 168
+
+        speeds = speed_table.speeds(
+            [row.zone, row.zone, "0:0", "0:0"], [hour, other_hour, hour, other_hour]
+        )
+        np.testing.assert_allclose(
+            speeds, [row.speed_kmh, row.speed_kmh, row.speed_kmh, 25.0]
+        )
+
+    def test_route_eta(self):
+        """Verify arrival times accumulate legs and stop time in one call."""
+        points = [(51.5, -0.1), (51.6, -0.1), (51.7, -0.1)]
+        with override_settings(DELIVERY_ETA_STOP_SECONDS=60):
+            etas = route_eta(points, start=(51.5, -0.1))
+        legs = haversine(points[:1] + points[:-1], points) * 1.3 / 25.0 * 3600
+        np.testing.assert_allclose(etas, np.cumsum(legs) + [0, 60, 120])
+
+    def test_order_eta(self):
+        """Verify customers get an arrival estimate for their open orders."""
+        order = Order.objects.create(
+            shop=self.shop,
+            customer=self.customer,
+            status="pending",
+            pickup_address="Market Street",
+            dropoff_address="Bridge Lane",
+        )
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get(reverse("delivery:order-eta", args=[order.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.data["eta_seconds"], 0)
+
+        client.force_authenticate(create_user("other", "customer"))
+        response = client.get(reverse("delivery:order-eta", args=[order.id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_order_eta_requires_authentication(self):
+        """Ensure anonymous callers cannot read unassigned orders through the ETA."""
+        order = Order.objects.create(
+            shop=self.shop, customer=self.customer, status="pending"
+        )
+        response = APIClient().get(reverse("delivery:order-eta", args=[order.id]))
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn("status", response.data)
@@ -0,0 +1,217 @@
+import os
+import tempfile
+import time
+
+from celery.signals import task_failure, task_prerun, task_retry
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.delivery.tasks import store_driver_locations
+from delivery_service.metrics import MetricsRegistry, registry
+from delivery_service.middleware import QueryRecorder, fingerprint
+from delivery_service.task_metrics import write_metrics_file
+from tests.helpers import PASSWORD
+
+MIDDLEWARE = [
+    "delivery_service.middleware.QueryInstrumentationMiddleware",
+    *settings.MIDDLEWARE,
+]
+
+
+class MetricsRegistryTestCase(TestCase):
+
+    def test_counters_and_summaries(self):
+        """Verify counters add up and summaries keep count, sum and maximum per label set."""
+        metrics = MetricsRegistry()
+        metrics.inc("requests", view="a")
+        metrics.inc("requests", 2, view="a")
+        metrics.observe("latency", 0.5, view="a")
+        metrics.observe("latency", 1.5, view="a")
+        metrics.observe("latency", 9.0, view="b")
+
+        self.assertEqual(metrics.counter("requests", view="a"), 3)
+        self.assertEqual(metrics.counter("requests", view="b"), 0)
+        self.assertEqual(
+            metrics.summary("latency", view="a"), {"count": 2, "sum": 2.0, "max": 1.5}
+        )
+        self.assertIsNone(metrics.summary("latency", view="c"))
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {"counters": {}, "summaries": {}})
+
+    def test_prometheus_text_format(self):
+        """Verify metrics render as Prometheus counters, summaries and max gauges."""
+        metrics = MetricsRegistry()
+        metrics.describe("jobs_total", "Jobs run.")
+        metrics.inc("jobs_total", 2, job='say "hi"')
+        metrics.observe("job_seconds", 0.25, job="a")
+        metrics.observe("job_seconds", 0.75, job="a")
+
+        lines = metrics.to_prometheus(pid=7).splitlines()
+
+        self.assertIn("# HELP jobs_total Jobs run.", lines)
+        self.assertIn("# TYPE jobs_total counter", lines)
+        self.assertIn('jobs_total{pid="7",job="say \\"hi\\""} 2', lines)
+        self.assertIn("# TYPE job_seconds summary", lines)
+        self.assertIn('job_seconds_count{pid="7",job="a"} 2', lines)
+        self.assertIn('job_seconds_sum{pid="7",job="a"} 1.0', lines)
+        self.assertIn('job_seconds_max{pid="7",job="a"} 0.75', lines)
+
+
+class QueryInstrumentationTestCase(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@test.com",
+            username="admin",
+            first_name="Admin",
+            password=PASSWORD,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fingerprint_ignores_parameters(self):
+        """Ensure queries differing only in parameters share a fingerprint."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"),
+            fingerprint("SELECT  *  FROM t WHERE id IN (%s) AND name = 'it''s'"),
+        )
+        self.assertEqual(
+            fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)"),
+            "INSERT INTO t (a, b) VALUES (?)",
+        )
+        self.assertNotEqual(
+            fingerprint("SELECT * FROM t WHERE id = 1"),
+            fingerprint("SELECT * FROM u WHERE id = 1"),
+        )
+
+    def test_recorder_flags_repeated_selects(self):
+        """Verify only SELECTs repeated at least the threshold number of times are reported."""
+        recorder = QueryRecorder()
+        execute = lambda sql, params, many, context: None
+        for i in range(3):
+            recorder(execute, f"SELECT * FROM t WHERE id = {i}", None, False, {})
+            recorder(execute, "UPDATE t SET a = %s", [i], False, {})
+        recorder(execute, "SELECT * FROM u", None, False, {})
+
+        self.assertEqual(recorder.count, 7)
+        self.assertEqual(recorder.repeated(3), [("SELECT * FROM t WHERE id = ?", 3)])
+
+    @override_settings(MIDDLEWARE=MIDDLEWARE, SQL_INSTRUMENTATION_ENABLED=True)
+    def test_requests_are_instrumented(self):
+        """Verify Server-Timing headers and per-URL-name aggregates are recorded."""
+        url = reverse("accounts:customuser-list")
+        for _ in range(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+        self.assertNotIn("n-plus-one", response["Server-Timing"])
+
+        view = "accounts:customuser-list"
+        self.assertEqual(registry.counter("http_requests_total", view=view), 2)
+        self.assertEqual(
+            registry.summary("http_request_db_queries", view=view)["sum"], 2
+        )
+
+    @override_settings(
+        MIDDLEWARE=MIDDLEWARE,
+        SQL_INSTRUMENTATION_ENABLED=True,
+        SQL_INSTRUMENTATION_REPEAT_THRESHOLD=1,
+    )
+    def test_repeated_queries_are_flagged(self):
+        """Ensure queries reaching the repeat threshold are flagged as probable N+1."""
+        with self.assertLogs("delivery_service.middleware", "WARNING"):
+            response = self.client.get(reverse("accounts:customuser-list"))
+
+        self.assertIn("n-plus-one", response["Server-Timing"])
+        counters = registry.snapshot()["counters"]
+        self.assertTrue(
+            any(name == "http_request_n_plus_one_total" for name, _ in counters)
+        )
+
+    @override_settings(MIDDLEWARE=MIDDLEWARE, SQL_INSTRUMENTATION_ENABLED=False)
+    def test_disabled_middleware_is_not_used(self):
+        """Verify the middleware removes itself from the chain when disabled."""
+        response = self.client.get(reverse("accounts:customuser-list"))
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(registry.snapshot(), {"counters": {}, "summaries": {}})
+
+
+class TaskMetricsTestCase(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.task = store_driver_locations
+        self.name = self.task.name
+
+    def test_task_runs_are_recorded(self):
+        """Verify run time and final state are recorded per task name."""
+        self.task.delay([])
+
+        self.assertEqual(
+            registry.counter("celery_tasks_total", task=self.name, state="SUCCESS"), 1
+        )
+        self.assertEqual(
+            registry.summary("celery_task_runtime_seconds", task=self.name)["count"], 1
+        )
+
+    def test_queue_wait_is_measured_from_the_sent_header(self):
+        """Ensure the wait between publishing and starting a task is observed."""
+        self.task.push_request(sent_at=time.time() - 2)
+        try:
+            task_prerun.send(sender=self.task, task_id="abc", task=self.task)
+        finally:
+            self.task.pop_request()
+
+        wait = registry.summary("celery_task_queue_wait_seconds", task=self.name)
+        self.assertEqual(wait["count"], 1)
+        self.assertGreaterEqual(wait["sum"], 2)
+
+    def test_retries_and_failures_are_counted_by_reason(self):
+        """Verify retries and failures are broken down by their cause."""
+        task_retry.send(sender=self.task, reason=TimeoutError("slow"))
+        task_failure.send(sender=self.task, exception=ValueError("bad"))
+
+        self.assertEqual(
+            registry.counter(
+                "celery_task_retries_total", task=self.name, reason="TimeoutError"
+            ),
+            1,
+        )
+        self.assertEqual(
+            registry.counter(
+                "celery_task_failures_total", task=self.name, exception="ValueError"
+            ),
+            1,
+        )
+
+    def test_metrics_file_is_written(self):
+        """Ensure each process writes its metrics to the configured file."""
+        self.task.delay([])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "celery-{pid}.prom")
+            with override_settings(CELERY_METRICS_FILE=path):
+                write_metrics_file(force=True)
+
+            with open(path.format(pid=os.getpid())) as fh:
+                content = fh.read()
+
+        self.assertIn(f'celery_tasks_total{{pid="{os.getpid()}"', content)
+
+    def test_metrics_endpoint_is_local_only(self):
+        """Verify the metrics endpoint serves localhost and refuses other addresses."""
+        self.task.delay([])
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"celery_tasks_total", response.content)
+
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,949 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.orders.availability import (
+    CHANGE_CACHE_KEY,
+    SEQUENCE_CACHE_KEY,
+    VERSION_CACHE_KEY,
+    DriverAvailabilityIndex,
+    claim_driver,
+    driver_index,
+    update_driver_positions,
+)
+from apps.orders.consolidation import consolidate_orders, pack_orders
+from apps.orders.dispatch import dispatch_ready_orders, match_orders_to_drivers
+from apps.orders.models import DeferredAssignment, Order, OrderEvent, OrderItem
+from apps.orders.retry import backoff_delay, defer_assignment
+from apps.orders.spatial import SpatialGrid, distance_km
+from apps.orders.tasks import assign_driver, process_deferred_assignments
+from apps.orders.transitions import (
+    InvalidTransition,
+    order_status_changed,
+    transition,
+)
+from apps.orders.totals import defer_order_totals, refresh_order_totals
+from apps.products.models import Product
+from tests.helpers import PASSWORD, create_user
+
+
+def create_product(supplier, name, price, weight=1.0, is_active=True):
+    return Product.objects.create(
+        name=name,
+        price=Decimal(price),
+        weight=weight,
+        supplier=supplier,
+        is_active=is_active,
+    )
+
+
+class OrderTotalsTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.customer = create_user("customer", "customer")
+        self.order = Order.objects.create(shop=self.shop, customer=self.customer)
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                price=Decimal("2.50") * (i + 1),
+                weight=1.5 * (i + 1),
+                supplier=self.shop,
+                is_active=True,
+            )
+            for i in range(3)
+        ]
+
+    def test_totals_follow_item_creation(self):
+        """Verify each new item shifts the order totals by its own price and weight."""
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.products[1], quantity=1)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("10.00"))
+        self.assertAlmostEqual(self.order.total_weight, 6.0)
+
+    def test_item_creation_query_count_is_constant(self):
+        """Ensure adding an item does not re-read the rest of the order."""
+        for product in self.products[:2]:
+            OrderItem.objects.create(order=self.order, product=product)
+
+        with CaptureQueriesContext(connection) as queries:
+            OrderItem.objects.create(order=self.order, product=self.products[2])
+        self.assertEqual(len(queries), 2, "Expected one INSERT and one UPDATE")
+
+    def test_update_and_delete_recompute_totals(self):
+        """Verify changing or removing an item recalculates the order totals."""
+        item = OrderItem.objects.create(order=self.order, product=self.products[0])
+        OrderItem.objects.create(order=self.order, product=self.products[1])
+
+        item.quantity = 3
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("12.50"))
+        self.assertAlmostEqual(self.order.total_weight, 7.5)
+
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("5.00"))
+        self.assertAlmostEqual(self.order.total_weight, 3.0)
+
+    def test_deferred_totals_flush_once(self):
+        """Ensure deferred writes leave totals untouched until a single flush."""
+        with CaptureQueriesContext(connection) as queries:
+            with defer_order_totals():
+                for product in self.products:
+                    OrderItem.objects.create(order=self.order, product=product)
+                self.order.refresh_from_db()
+                self.assertEqual(self.order.total_amount, Decimal("0"))
+
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1, "Totals should be flushed in one UPDATE")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("15.00"))
+        self.assertAlmostEqual(self.order.total_weight, 9.0)
+
+    def test_refresh_empty_order(self):
+        """Verify an order without items is reset to zero totals."""
+        Order.objects.filter(pk=self.order.pk).update(
+            total_amount=Decimal("7"), total_weight=3.0
+        )
+        refresh_order_totals([self.order.pk])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("0"))
+        self.assertEqual(self.order.total_weight, 0.0)
+
+
+class CheckoutTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop", address="1 Market Street")
+        self.other_shop = create_user("other", "shop", address="9 Harbour Road")
+        self.customer = create_user("customer", "customer", address="5 Elm Avenue")
+        self.products = [
+            create_product(self.shop, f"Product {i}", "3.00", weight=2.0)
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.url = reverse("orders:checkout")
+
+    def post_cart(self, items):
+        return self.client.post(self.url, {"items": items}, format="json")
+
+    def test_checkout_creates_order_with_all_items(self):
+        """Verify a cart becomes one order with priced items and totals."""
+        response = self.post_cart(
+            [{"product_id": p.id, "quantity": 2} for p in self.products]
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data), 1)
+
+        order = Order.objects.get(pk=response.data[0]["id"])
+        self.assertEqual(order.items.count(), 5)
+        self.assertEqual(order.total_amount, Decimal("30.00"))
+        self.assertAlmostEqual(order.total_weight, 20.0)
+        self.assertEqual(order.pickup_address, "1 Market Street")
+        self.assertEqual(order.dropoff_address, "5 Elm Avenue")
+
+    def test_checkout_query_count_does_not_grow_with_cart(self):
+        """Ensure the number of queries is independent of the cart size."""
+        with CaptureQueriesContext(connection) as small:
+            self.post_cart([{"product_id": self.products[0].id}])
+        with CaptureQueriesContext(connection) as large:
+            self.post_cart([{"product_id": p.id} for p in self.products])
+        self.assertEqual(len(small), len(large))
+
+    def test_checkout_splits_cart_per_shop(self):
+        """Verify products from different shops end up in separate orders."""
+        foreign = create_product(self.other_shop, "Foreign", "4.00")
+        response = self.post_cart(
+            [{"product_id": self.products[0].id}, {"product_id": foreign.id}]
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            {order["shop"] for order in response.data},
+            {self.shop.id, self.other_shop.id},
+        )
+
+    def test_checkout_merges_duplicate_lines(self):
+        """Verify repeated products are collapsed into one item."""
+        product = self.products[0]
+        response = self.post_cart(
+            [{"product_id": product.id}, {"product_id": product.id, "quantity": 2}]
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        item = OrderItem.objects.get(order_id=response.data[0]["id"])
+        self.assertEqual(item.quantity, 3)
+
+    def test_checkout_rejects_unavailable_products(self):
+        """Ensure inactive or unknown products abort the whole checkout."""
+        inactive = create_product(self.shop, "Hidden", "1.00", is_active=False)
+        response = self.post_cart(
+            [{"product_id": self.products[0].id}, {"product_id": inactive.id}]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_requires_customer(self):
+        """Ensure only customers can check out."""
+        self.client.force_authenticate(self.shop)
+        response = self.post_cart([{"product_id": self.products[0].id}])
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_order_from_product(self):
+        """Verify single-product orders use the supplier as shop and reuse open orders."""
+        self.client.force_login(self.customer)
+        url = reverse("orders:create-order-from-product", args=[self.products[0].id])
+
+        response = self.client.post(url, {"quantity": 2})
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.json()["order_id"])
+        self.assertEqual(order.shop, self.shop)
+        self.assertEqual(order.pickup_address, "1 Market Street")
+        self.assertEqual(order.total_amount, Decimal("6.00"))
+
+        response = self.client.post(url, {"quantity": 1})
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal("9.00"))
+
+
+class OrderListTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.customer = create_user("customer", "customer")
+        self.orders = [
+            Order.objects.create(shop=self.shop, customer=self.customer)
+            for _ in range(7)
+        ]
+        # Give several orders the same timestamp to exercise the id tie-breaker
+        now = timezone.now()
+        Order.objects.filter(pk__in=[o.pk for o in self.orders[:4]]).update(
+            created_at=now - timedelta(hours=1)
+        )
+        Order.objects.filter(pk__in=[o.pk for o in self.orders[4:]]).update(
+            created_at=now
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.url = reverse("orders:order-list")
+
+    def collect_pages(self, params):
+        ids, url = [], self.url
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids.extend(order["id"] for order in response.data["results"])
+            url, params = response.data["next"], None
+        return ids
+
+    def test_keyset_pages_cover_all_orders_once(self):
+        """Verify walking the cursor returns every order exactly once, newest first."""
+        ids = self.collect_pages({"page_size": 3})
+        expected = [o.pk for o in self.orders[4:]][::-1] + [
+            o.pk for o in self.orders[:4]
+        ][::-1]
+        self.assertEqual(ids, expected)
+
+    def test_query_count_is_independent_of_page_depth(self):
+        """Ensure later pages cost the same number of queries as the first."""
+        first = self.client.get(self.url, {"page_size": 2})
+        with CaptureQueriesContext(connection) as first_queries:
+            self.client.get(self.url, {"page_size": 2})
+        with CaptureQueriesContext(connection) as next_queries:
+            self.client.get(first.data["next"])
+        self.assertEqual(len(first_queries), len(next_queries))
+
+    def test_sparse_fieldsets(self):
+        """Verify ?fields= limits the serialized fields."""
+        response = self.client.get(self.url, {"fields": "id,status"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "status"})
+
+    def test_status_filter(self):
+        """Verify orders can be filtered by status."""
+        Order.objects.filter(pk=self.orders[0].pk).update(status="delivered")
+        response = self.client.get(self.url, {"status": "delivered"})
+        self.assertEqual(
+            [order["id"] for order in response.data["results"]], [self.orders[0].pk]
+        )
+
+    def test_invalid_cursor(self):
+        """Ensure a malformed cursor is rejected."""
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_orders_are_scoped_to_user(self):
+        """Ensure users only see their own orders."""
+        other = create_user("other", "customer")
+        self.client.force_authenticate(other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["results"], [])
+
+
+class DispatchTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.drivers = {}
+        for capacity in (10, 50, 200):
+            driver = create_user(f"driver{capacity}", "driver")
+            driver.driver_profile.capacity = capacity
+            driver.driver_profile.save()
+            self.drivers[capacity] = driver
+
+    def create_ready_order(self, weight):
+        return Order.objects.create(
+            shop=self.shop, status="ready_to_collect", total_weight=weight
+        )
+
+    def test_best_fit_matching(self):
+        """Verify each order gets the smallest driver that can carry it."""
+        assignments = match_orders_to_drivers(
+            [(1, 8.0), (2, 40.0), (3, 45.0), (4, 500.0)],
+            [("small", 10), ("medium", 50), ("large", 200)],
+        )
+        self.assertEqual(assignments, {3: "medium", 2: "large", 1: "small"})
+
+    def test_dispatch_assigns_pending_orders(self):
+        """Verify ready orders are assigned to distinct, sufficiently large drivers."""
+        light = self.create_ready_order(5)
+        heavy = self.create_ready_order(150)
+        result = dispatch_ready_orders()
+
+        self.assertEqual((result.matched, result.unmatched), (2, 0))
+        light.refresh_from_db()
+        heavy.refresh_from_db()
+        self.assertEqual(light.status, "assigned")
+        self.assertEqual(light.driver, self.drivers[10])
+        self.assertEqual(heavy.driver, self.drivers[200])
+
+    def test_dispatch_skips_busy_drivers(self):
+        """Ensure drivers with an active order are not assigned again."""
+        Order.objects.create(
+            shop=self.shop, status="in_transit", driver=self.drivers[10]
+        )
+        order = self.create_ready_order(5)
+        dispatch_ready_orders()
+        order.refresh_from_db()
+        self.assertEqual(order.driver, self.drivers[50])
+
+    def test_dispatch_query_count_is_constant(self):
+        """Ensure the dispatcher does not issue queries per order."""
+        self.create_ready_order(1)
+        with CaptureQueriesContext(connection) as single:
+            dispatch_ready_orders()
+
+        for order in Order.objects.all():
+            order.status = "delivered"
+            order.save()
+        for weight in (1, 2, 3):
+            self.create_ready_order(weight)
+        with CaptureQueriesContext(connection) as batch:
+            result = dispatch_ready_orders()
+
+        self.assertEqual(result.matched, 3)
+        self.assertEqual(len(single), len(batch))
+
+    def test_benchmark_leaves_other_drivers_alone(self):
+        """Ensure the dispatch benchmark only touches the rows and cache it creates."""
+        with self.assertRaises(CommandError):
+            call_command("benchmark_dispatch", orders=3, drivers=3, stdout=StringIO())
+
+        Order.objects.create(
+            shop=self.shop, status="in_transit", driver=self.drivers[10]
+        )
+        state = cache.get_many([VERSION_CACHE_KEY, SEQUENCE_CACHE_KEY])
+        call_command(
+            "benchmark_dispatch",
+            orders=3,
+            drivers=3,
+            not_production=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(cache.get_many([VERSION_CACHE_KEY, SEQUENCE_CACHE_KEY]), state)
+        profile = self.drivers[10].driver_profile
+        profile.refresh_from_db()
+        self.assertFalse(profile.is_available)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class ConsolidationTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.driver = create_user("driver", "driver")
+        self.driver.driver_profile.capacity = 50
+        self.driver.driver_profile.save()
+
+    def create_ready_order(self, weight, pickup_address="1 Market St"):
+        return Order.objects.create(
+            shop=self.shop,
+            status="ready_to_collect",
+            total_weight=weight,
+            pickup_address=pickup_address,
+        )
+
+    def test_pack_orders_first_fit_decreasing(self):
+        """Verify orders are packed into as few trips as the capacity allows."""
+        trips = pack_orders([(1, 30), (2, 20), (3, 25), (4, 25), (5, 60)], 50)
+        self.assertEqual(
+            sorted(sorted(trip.order_ids) for trip in trips), [[1, 2], [3, 4], [5]]
+        )
+        trips = pack_orders([(1, 1), (2, 1), (3, 1)], 50, max_orders=2)
+        self.assertEqual(len(trips), 2)
+
+    def test_young_groups_are_held(self):
+        """Ensure a pickup group waits until its oldest order has aged past the window."""
+        now = timezone.now()
+        orders = [
+            (1, "shop", "1 Market St", 5, now - timedelta(seconds=30)),
+            (2, "shop", "1 market street", 5, now),
+            (3, "shop", None, 5, now),
+        ]
+        trips, held = consolidate_orders(orders, 50, window=60, now=now)
+        self.assertEqual(trips, [([3], 5.0)])
+        self.assertEqual(held, [1, 2])
+
+        trips, held = consolidate_orders(orders, 50, window=10, now=now)
+        self.assertEqual(sorted(trip.order_ids for trip in trips), [[1, 2], [3]])
+        self.assertEqual(held, [])
+
+    @override_settings(ORDER_CONSOLIDATION_WINDOW=0)
+    def test_dispatch_sends_one_driver_per_trip(self):
+        """Verify orders from the same pickup are assigned to one driver together."""
+        orders = [self.create_ready_order(weight) for weight in (10, 15, 20)]
+        other = self.create_ready_order(5, pickup_address="Harbour Road")
+
+        result = dispatch_ready_orders()
+        self.assertEqual((result.matched, result.trips), (3, 1))
+        self.assertEqual(result.unmatched, 1)
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.driver, self.driver)
+        other.refresh_from_db()
+        self.assertEqual(other.status, "ready_to_collect")
+
+        profile = self.driver.driver_profile
+        profile.refresh_from_db()
+        self.assertEqual(profile.active_load, 3)
+
+    @override_settings(ORDER_CONSOLIDATION_WINDOW=300)
+    def test_dispatch_holds_fresh_pickups(self):
+        """Ensure fresh orders wait for the consolidation window before dispatch."""
+        self.create_ready_order(10)
+        self.create_ready_order(10)
+        result = dispatch_ready_orders()
+        self.assertEqual((result.matched, result.unmatched, result.held), (0, 0, 2))
+
+    @override_settings(ORDER_CONSOLIDATION_WINDOW=300)
+    def test_dispatch_releases_single_orders_to_idle_drivers(self):
+        """Verify a lone fresh order is not held while a driver is idle."""
+        order = self.create_ready_order(10)
+        result = dispatch_ready_orders()
+        self.assertEqual((result.matched, result.held), (1, 0))
+        order.refresh_from_db()
+        self.assertEqual(order.driver, self.driver)
+
+        self.create_ready_order(10)
+        result = dispatch_ready_orders()
+        self.assertEqual((result.matched, result.held), (0, 1))
+
+    @override_settings(ORDER_CONSOLIDATION_WINDOW=300)
+    def test_later_saves_do_not_restart_the_window(self):
+        """Ensure orders are timed from when they became ready, not their last save."""
+        orders = [self.create_ready_order(weight) for weight in (10, 15)]
+        OrderEvent.objects.update(created_at=timezone.now() - timedelta(seconds=600))
+        orders[0].pickup_address = "1 Market Street"
+        orders[0].save()
+
+        result = dispatch_ready_orders()
+        self.assertEqual((result.matched, result.trips, result.held), (2, 1, 0))
+
+    def test_idle_drivers_take_single_orders_oldest_first(self):
+        """Verify only as many lone orders are released as there are spare drivers."""
+        now = timezone.now()
+        orders = [
+            (1, "shop", "1 Market St", 5, now - timedelta(seconds=20)),
+            (2, "shop", "Harbour Road", 5, now - timedelta(seconds=30)),
+            (3, "shop", "Mill Lane", 5, now),
+            (4, "shop", None, 5, now),
+        ]
+        trips, held = consolidate_orders(orders, 50, window=60, now=now, idle=3)
+        self.assertEqual([trip.order_ids for trip in trips], [[4], [2], [1]])
+        self.assertEqual(held, [3])
+
+
+class DriverAvailabilityTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.small = create_user("small", "driver")
+        self.large = create_user("large", "driver")
+        self.large.driver_profile.capacity = 100
+        self.large.driver_profile.save()
+
+    def test_assign_driver_uses_best_fit(self):
+        """Verify assign_driver claims the smallest driver that can carry the order."""
+        order = Order.objects.create(
+            shop=self.shop, status="ready_to_collect", total_weight=50
+        )
+        assign_driver(order.id)
+
+        order.refresh_from_db()
+        self.assertEqual(order.driver, self.large)
+        profile = self.large.driver_profile
+        profile.refresh_from_db()
+        self.assertFalse(profile.is_available)
+        self.assertEqual(profile.active_load, 1)
+        self.assertIsNone(driver_index.find(50))
+
+    def test_driver_is_released_on_delivery(self):
+        """Verify a delivered order makes its driver available again."""
+        order = Order.objects.create(
+            shop=self.shop, status="assigned", driver=self.small
+        )
+        self.assertEqual(driver_index.find(5), self.large.id)
+
+        order.status = "delivered"
+        order.save()
+        profile = self.small.driver_profile
+        profile.refresh_from_db()
+        self.assertTrue(profile.is_available)
+        self.assertEqual(profile.active_load, 0)
+        self.assertEqual(driver_index.find(5), self.small.id)
+
+    def test_saving_a_reassignment_releases_the_previous_driver(self):
+        """Verify saving an order with another driver frees the one it had."""
+        order = Order.objects.create(
+            shop=self.shop, status="assigned", driver=self.small
+        )
+        order = Order.objects.get(pk=order.pk)
+        order.driver = self.large
+        order.save()
+
+        small, large = self.small.driver_profile, self.large.driver_profile
+        small.refresh_from_db()
+        large.refresh_from_db()
+        self.assertEqual((small.is_available, small.active_load), (True, 0))
+        self.assertEqual((large.is_available, large.active_load), (False, 1))
+
+    def test_saving_an_unassignment_releases_the_driver(self):
+        """Verify clearing an order's driver on save frees that driver."""
+        order = Order.objects.create(
+            shop=self.shop, status="assigned", driver=self.small
+        )
+        order.driver = None
+        order.status = "ready_to_collect"
+        order.save()
+
+        profile = self.small.driver_profile
+        profile.refresh_from_db()
+        self.assertEqual((profile.is_available, profile.active_load), (True, 0))
+        self.assertEqual(driver_index.find(5), self.small.id)
+
+    def test_claim_driver_only_once(self):
+        """Ensure a driver cannot be claimed by two workers."""
+        self.assertTrue(claim_driver(self.small.id))
+        self.assertFalse(claim_driver(self.small.id))
+
+    def test_claims_reach_other_processes_without_a_reload(self):
+        """Verify another process applies a claim from the change log, not the database."""
+        other_process = DriverAvailabilityIndex()
+        self.assertEqual(other_process.find(5), self.small.id)
+
+        self.assertTrue(claim_driver(self.small.id))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(other_process.find(5), self.large.id)
+        self.assertEqual(len(queries), 0)
+
+    def test_lost_changes_fall_back_to_a_reload(self):
+        """Ensure a process reloads from the database when a change has expired."""
+        other_process = DriverAvailabilityIndex()
+        other_process.find(5)
+        claim_driver(self.small.id)
+        cache.delete(CHANGE_CACHE_KEY.format(cache.get(SEQUENCE_CACHE_KEY)))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(other_process.find(5), self.large.id)
+        self.assertEqual(len(queries), 1)
+
+    def test_lookup_does_not_query_database(self):
+        """Ensure lookups are served from the in-process index once loaded."""
+        driver_index.find(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(driver_index.find(20), self.large.id)
+        self.assertEqual(len(queries), 0)
+
+
+class DriverSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.near = create_user("near", "driver")
+        self.far = create_user("far", "driver")
+        self.far.driver_profile.capacity = 100
+        self.far.driver_profile.save()
+        now = timezone.now()
+        update_driver_positions(
+            {self.near.id: (51.50, -0.12, now), self.far.id: (51.60, -0.12, now)}
+        )
+
+    def test_grid_nearest(self):
+        """Verify the grid returns the k nearest points with enough weight."""
+        grid = SpatialGrid(cell_degrees=0.01)
+        grid.insert("a", 51.500, -0.120, 10)
+        grid.insert("b", 51.510, -0.120, 50)
+        grid.insert("c", 51.530, -0.120, 50)
+        grid.insert("d", 52.500, -0.120, 50)
+
+        nearest = grid.nearest(51.5, -0.12, k=2)
+        self.assertEqual([key for _, key in nearest], ["a", "b"])
+        self.assertAlmostEqual(nearest[1][0], distance_km(51.5, -0.12, 51.51, -0.12))
+        nearest = grid.nearest(51.5, -0.12, k=5, min_weight=20)
+        self.assertEqual([key for _, key in nearest], ["b", "c"])
+
+        grid.insert("c", 51.505, -0.120, 50)
+        grid.remove("a")
+        nearest = grid.nearest(51.5, -0.12, k=1, exclude={"x"})
+        self.assertEqual(nearest[0][1], "c")
+
+    def test_nearest_respects_capacity(self):
+        """Ensure the closest driver is skipped when too small for the order."""
+        self.assertEqual(driver_index.nearest(51.5, -0.12)[0][1], self.near.id)
+        self.assertEqual(
+            driver_index.nearest(51.5, -0.12, min_capacity=50)[0][1], self.far.id
+        )
+
+    def test_assign_driver_picks_nearest(self):
+        """Verify assign_driver claims the free driver closest to the pickup."""
+        order = Order.objects.create(
+            shop=self.shop,
+            status="ready_to_collect",
+            total_weight=5,
+            pickup_address="Market Street",
+        )
+        with patch("apps.orders.tasks.geocode", return_value=(51.59, -0.12)):
+            self.assertEqual(assign_driver(order.id), self.far.id)
+
+    def test_positions_only_move_forward(self):
+        """Ensure an older position fix does not replace a newer one."""
+        old = timezone.now() - timedelta(minutes=5)
+        self.assertEqual(update_driver_positions({self.near.id: (0.0, 0.0, old)}), 0)
+        profile = self.near.driver_profile
+        profile.refresh_from_db()
+        self.assertEqual((profile.latitude, profile.longitude), (51.50, -0.12))
+
+    def test_moves_are_applied_locally(self):
+        """Verify position updates re-rank drivers without a reload."""
+        driver_index.nearest(51.5, -0.12)
+        update_driver_positions({self.far.id: (51.50, -0.12, timezone.now())})
+        with CaptureQueriesContext(connection) as queries:
+            nearest = driver_index.nearest(51.5, -0.12, min_capacity=50)
+        self.assertEqual(len(queries), 0)
+        self.assertAlmostEqual(nearest[0][0], 0.0)
+
+
+@override_settings(
+    ORDER_ASSIGNMENT_RETRY_BASE_DELAY=4,
+    ORDER_ASSIGNMENT_RETRY_MAX_DELAY=60,
+    ORDER_ASSIGNMENT_RETRY_MAX_ATTEMPTS=3,
+)
+class DeferredAssignmentTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.order = Order.objects.create(
+            shop=self.shop, status="ready_to_collect", total_weight=5
+        )
+
+    def test_backoff_grows_and_is_capped(self):
+        """Verify delays double per attempt, stay jittered and never exceed the cap."""
+        for attempt, window in [(1, 4), (2, 8), (3, 16), (10, 60)]:
+            for _ in range(20):
+                delay = backoff_delay(attempt)
+                self.assertGreaterEqual(delay, window / 2)
+                self.assertLessEqual(delay, window)
+
+    def test_assign_driver_defers_when_no_driver(self):
+        """Verify an order without a free driver is queued once, not retried in a loop."""
+        self.assertIsNone(assign_driver(self.order.id))
+        self.assertIsNone(assign_driver(self.order.id))
+
+        entry = DeferredAssignment.objects.get(order=self.order)
+        self.assertEqual(entry.attempts, 2)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+
+    def test_gives_up_after_max_attempts(self):
+        """Ensure orders are dropped from the queue after the attempt cap."""
+        for _ in range(3):
+            self.assertIsNotNone(defer_assignment(self.order.id))
+        self.assertIsNone(defer_assignment(self.order.id))
+        self.assertFalse(DeferredAssignment.objects.exists())
+
+    def test_freed_driver_wakes_queue(self):
+        """Verify a driver finishing a delivery makes waiting orders due immediately."""
+        driver = create_user("driver", "driver")
+        busy = Order.objects.create(shop=self.shop, status="in_transit", driver=driver)
+        assign_driver(self.order.id)
+        entry = DeferredAssignment.objects.get(order=self.order)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            busy.status = "delivered"
+            busy.save()
+        # Queue wake-up and the live status push
+        self.assertEqual(len(callbacks), 2)
+        entry.refresh_from_db()
+        self.assertLessEqual(entry.next_attempt_at, timezone.now())
+
+        self.assertEqual(process_deferred_assignments(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.driver, driver)
+        self.assertFalse(DeferredAssignment.objects.exists())
+
+    def test_saving_an_order_of_a_free_driver_does_not_wake_queue(self):
+        """Ensure only a driver going from busy to free wakes the queue."""
+        driver = create_user("driver", "driver")
+        done = Order.objects.create(shop=self.shop, status="delivered", driver=driver)
+        defer_assignment(self.order.id)
+        entry = DeferredAssignment.objects.get(order=self.order)
+
+        with patch("apps.orders.signals.wake_deferred_assignments") as wake:
+            done.dropoff_address = "Harbour Road"
+            done.save()
+        wake.assert_not_called()
+        entry.refresh_from_db()
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+
+
+class OrderTransitionTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.driver = create_user("driver", "driver")
+        self.order = Order.objects.create(shop=self.shop, status="ready_to_collect")
+        self.events = []
+        order_status_changed.connect(self.record_event)
+
+    def tearDown(self):
+        order_status_changed.disconnect(self.record_event)
+
+    def record_event(self, sender, from_status, to_status, changes, **kwargs):
+        self.events.append((from_status, to_status, changes))
+
+    def test_transition_is_single_conditional_update(self):
+        """Verify a transition issues one UPDATE guarded by the current status."""
+        with CaptureQueriesContext(connection) as queries:
+            won = transition(self.order.id, "pending", "ready_to_collect")
+        self.assertFalse(won)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]["sql"].startswith("UPDATE"))
+        self.assertIn('"status" = ', queries[0]["sql"].split("WHERE")[1])
+
+    def test_only_first_transition_wins(self):
+        """Ensure concurrent transitions from the same status cannot both succeed."""
+        self.assertTrue(
+            transition(
+                self.order.id, "ready_to_collect", "assigned", driver_id=self.driver.id
+            )
+        )
+        self.assertFalse(
+            transition(
+                self.order.id, "ready_to_collect", "assigned", driver_id=self.driver.id
+            )
+        )
+        self.assertEqual(
+            self.events,
+            [
+                (
+                    "ready_to_collect",
+                    "assigned",
+                    {self.order.id: {"driver_id": self.driver.id}},
+                )
+            ],
+        )
+
+    def test_invalid_transition(self):
+        """Ensure transitions outside the table are rejected."""
+        with self.assertRaises(InvalidTransition):
+            transition(self.order.id, "ready_to_collect", "delivered")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "ready_to_collect")
+
+    def test_transitions_maintain_driver_availability(self):
+        """Verify assigning and delivering through transitions updates the driver."""
+        profile = self.driver.driver_profile
+        transition(
+            self.order.id, "ready_to_collect", "assigned", driver_id=self.driver.id
+        )
+        profile.refresh_from_db()
+        self.assertFalse(profile.is_available)
+
+        transition(self.order.id, "assigned", "in_transit")
+        transition(self.order.id, "in_transit", "delivered")
+        profile.refresh_from_db()
+        self.assertTrue(profile.is_available)
+        self.assertEqual(profile.active_load, 0)
+
+    def test_unassign_transition_releases_the_driver(self):
+        """Verify moving an order back to ready_to_collect frees its driver."""
+        transition(
+            self.order.id, "ready_to_collect", "assigned", driver_id=self.driver.id
+        )
+        transition(self.order.id, "assigned", "ready_to_collect", driver_id=None)
+
+        profile = self.driver.driver_profile
+        profile.refresh_from_db()
+        self.assertEqual((profile.is_available, profile.active_load), (True, 0))
+        self.assertEqual(self.events[-1][2], {self.order.id: {"driver_id": None}})
+
+    def test_reassign_transitions_release_the_previous_driver(self):
+        """Verify handing an order to another driver frees the first one."""
+        other = create_user("other", "driver")
+        transition(
+            self.order.id, "ready_to_collect", "assigned", driver_id=self.driver.id
+        )
+        transition(self.order.id, "assigned", "ready_to_collect", driver_id=None)
+        transition(self.order.id, "ready_to_collect", "assigned", driver_id=other.id)
+
+        first, second = self.driver.driver_profile, other.driver_profile
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.is_available, first.active_load), (True, 0))
+        self.assertEqual((second.is_available, second.active_load), (False, 1))
+
+
+class OrderEventTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.driver = create_user("driver", "driver")
+        self.order = Order.objects.create(shop=self.shop, status="ready_to_collect")
+
+    def history(self):
+        return list(
+            OrderEvent.objects.filter(order=self.order)
+            .order_by("id")
+            .values_list("from_status", "to_status", "driver_id")
+        )
+
+    def test_events_follow_order_lifecycle(self):
+        """Verify creation, transitions and direct saves are all logged."""
+        transition(
+            self.order.id, "ready_to_collect", "assigned", driver_id=self.driver.id
+        )
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = "in_transit"
+        order.save()
+        order.save()
+
+        self.assertEqual(
+            self.history(),
+            [
+                (None, "ready_to_collect", None),
+                ("ready_to_collect", "assigned", self.driver.id),
+                ("assigned", "in_transit", None),
+            ],
+        )
+
+    def test_export_streams_ndjson_after_cursor(self):
+        """Verify the export streams only events newer than the cursor."""
+        first = OrderEvent.objects.get(order=self.order)
+        transition(self.order.id, "ready_to_collect", "assigned")
+
+        admin = get_user_model().objects.create_superuser(
+            email="admin@test.com",
+            username="admin",
+            first_name="Admin",
+            password=PASSWORD,
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get(
+            reverse("orders:order-events-export"), {"since": first.id}
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        event = json.loads(lines[0])
+        self.assertEqual(event["order_id"], self.order.id)
+        self.assertEqual(event["to_status"], "assigned")
+        self.assertGreater(event["id"], first.id)
+
+    def test_export_requires_admin(self):
+        """Ensure regular users cannot export the event log."""
+        client = APIClient()
+        client.force_authenticate(self.shop)
+        response = client.get(reverse("orders:order-events-export"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_command(self):
+        """Verify the management command writes one JSON object per line."""
+        out = StringIO()
+        call_command("export_order_events", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [json.loads(line)["order_id"] for line in lines], [self.order.id]
+        )
+
+    def test_export_rejects_negative_limit(self):
+        """Ensure a negative limit is rejected before streaming starts."""
+        admin = get_user_model().objects.create_superuser(
+            email="admin@test.com",
+            username="admin",
+            first_name="Admin",
+            password=PASSWORD,
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get(reverse("orders:order-events-export"), {"limit": -1})
+        self.assertEqual(response.status_code, 400)
+
+        with self.assertRaises(CommandError):
+            call_command("export_order_events", limit=-1, stdout=StringIO())
+
+    def test_events_outlive_deleted_orders(self):
+        """Verify deleting an order keeps its events in the log."""
+        order_id = self.order.id
+        self.order.delete()
+        self.assertEqual(
+            list(OrderEvent.objects.values_list("order_id", flat=True)), [order_id]
+        )
+
+
+class WorkloadBenchmarkTestCase(TestCase):
+
+    def test_benchmark_workload_runs_and_rolls_back(self):
+        """Verify the load generator reports every step and leaves no data behind."""
+        out = StringIO()
+        call_command(
+            "benchmark_workload",
+            shops=2,
+            products=2,
+            customers=3,
+            drivers=3,
+            orders=5,
+            list_requests=3,
+            stdout=out,
+        )
+        output = out.getvalue()
+        for step in ("create_order_from_product", "order_list", "assign_driver"):
+            self.assertIn(step, output)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
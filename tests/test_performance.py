@@ -0,0 +1,431 @@
+"""
+Query-count and latency budgets for every URL of the project apps.
+
+Each endpoint is requested against seeded data of growing size. A test
+fails when an endpoint exceeds its query ceiling or latency budget, or when
+its query count grows with the amount of data. Latency budgets are
+generous and multiplied by ``PERFORMANCE_LATENCY_SCALE`` (``0`` disables
+them) for slow machines. The measurements are written as JSON to the path
+in ``PERFORMANCE_REPORT``, when set, so reports can be compared between
+releases.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+
+from apps.accounts.models import CustomerProfile
+from apps.delivery.tracking import LocationBuffer
+from apps.orders.events import record_events
+from apps.orders.models import Order
+from apps.products.models import Category, Product
+from tests.helpers import PASSWORD, create_user
+
+SIZES = (5, 25)
+APP_NAMESPACES = ("accounts", "orders", "products", "delivery")
+REPORT_PATH = os.environ.get("PERFORMANCE_REPORT")
+LATENCY_SCALE = float(os.environ.get("PERFORMANCE_LATENCY_SCALE", 1))
+
+# Endpoints that hash a password are dominated by the hasher, not by queries.
+HASHING_BUDGET_MS = 2000
+
+Endpoint = namedtuple(
+    "Endpoint",
+    [
+        "role",
+        "method",
+        "path",
+        "max_queries",
+        "data",
+        "budget_ms",
+        "status",
+        "json",
+        "asgi",
+    ],
+    defaults=(None, 500, 200, False, False),
+)
+
+
+class Seed:
+    """Fixed users plus data that can be grown to a given size."""
+
+    def __init__(self):
+        self.admin = create_user("admin", "admin", is_staff=True, is_superuser=True)
+        self.shop = create_user("shop", "shop", address="1 Market Street")
+        self.customer = create_user("customer", "customer", address="5 Elm Avenue")
+        self.driver = create_user("driver", "driver")
+        self.product = Product.objects.create(
+            name="Product", price=Decimal("3.00"), supplier=self.shop, is_active=True
+        )
+        self.order = Order.objects.create(
+            shop=self.shop,
+            customer=self.customer,
+            driver=self.driver,
+            status="assigned",
+            pickup_address="1 Market Street",
+            dropoff_address="5 Elm Avenue",
+        )
+        self.size = 0
+
+    def user(self, role):
+        return getattr(self, role) if role else None
+
+    def grow(self, size):
+        count = size - self.size
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(
+                email=f"user{self.size + i}@test.com",
+                username=f"user{self.size + i}",
+                first_name="User",
+                role="customer",
+            )
+            for i in range(count)
+        )
+        CustomerProfile.objects.bulk_create(
+            CustomerProfile(user=user, address="5 Elm Avenue") for user in users
+        )
+        Category.objects.bulk_create(
+            Category(name=f"Category {self.size + i}") for i in range(count)
+        )
+        Product.objects.bulk_create(
+            Product(
+                name=f"Product {self.size + i}",
+                price=Decimal("2.50"),
+                supplier=self.shop,
+                is_active=True,
+            )
+            for i in range(count)
+        )
+        statuses = ["pending", "assigned", "delivered"]
+        orders = Order.objects.bulk_create(
+            Order(
+                shop=self.shop,
+                customer=self.customer,
+                driver=self.driver if statuses[i % 3] != "pending" else None,
+                status=statuses[i % 3],
+                pickup_address="1 Market Street",
+                dropoff_address="5 Elm Avenue",
+            )
+            for i in range(count)
+        )
+        record_events(
+            (order.pk, None, order.status, order.driver_id) for order in orders
+        )
+        # A customer without an open order, and one that can be deleted.
+        self.buyer, self.spare = users[0], users[-1]
+        self.size = size
+
+
+def url(name, arg=None):
+    """Path of ``name``, taking its argument from the ``arg`` attribute of the seed."""
+    return lambda seed: reverse(name, args=[getattr(seed, arg).pk] if arg else None)
+
+
+def new_user_form(prefix):
+    return lambda seed: {
+        "username": f"{prefix}{seed.size}",
+        "email": f"{prefix}{seed.size}@test.com",
+        "first_name": "New",
+        "password": PASSWORD,
+        "role": "customer",
+    }
+
+
+ENDPOINTS = {
+    # accounts
+    "accounts:index": Endpoint(None, "get", url("accounts:index"), 0),
+    "accounts:api-root": Endpoint("customer", "get", url("accounts:api-root"), 0),
+    "accounts:customuser-list": Endpoint(
+        "admin", "get", url("accounts:customuser-list"), 1
+    ),
+    "accounts:customuser-detail": Endpoint(
+        "customer", "get", url("accounts:customuser-detail", "customer"), 1
+    ),
+    "accounts:customuser-me": Endpoint(
+        "customer", "get", url("accounts:customuser-me"), 0
+    ),
+    "accounts:user-list-page": Endpoint(
+        "admin", "get", url("accounts:user-list-page"), 1
+    ),
+    "accounts:register": Endpoint(None, "get", url("accounts:register"), 0),
+    "accounts:register_user": Endpoint(
+        None,
+        "post",
+        url("accounts:register_user"),
+        13,
+        new_user_form("registered"),
+        budget_ms=HASHING_BUDGET_MS,
+        status=204,
+    ),
+    "accounts:login": Endpoint(None, "get", url("accounts:login"), 0),
+    "accounts:login_user": Endpoint(
+        None,
+        "post",
+        url("accounts:login_user"),
+        10,
+        lambda seed: {"email": seed.customer.email, "password": PASSWORD},
+        budget_ms=HASHING_BUDGET_MS,
+        status=204,
+    ),
+    "accounts:logout": Endpoint(
+        "customer", "get", url("accounts:logout"), 4, status=302
+    ),
+    "accounts:user_detail": Endpoint(
+        "admin", "get", url("accounts:user_detail", "shop"), 3
+    ),
+    "accounts:htmx_user_list": Endpoint(
+        "admin", "get", url("accounts:htmx_user_list"), 3
+    ),
+    "accounts:create_user": Endpoint(
+        "admin",
+        "post",
+        url("accounts:create_user"),
+        10,
+        new_user_form("created"),
+        budget_ms=HASHING_BUDGET_MS,
+    ),
+    "accounts:edit_user": Endpoint(
+        "admin", "get", url("accounts:edit_user", "customer"), 3
+    ),
+    "accounts:edit_profile": Endpoint(
+        "admin", "get", url("accounts:edit_profile", "customer"), 4
+    ),
+    "accounts:htmx_user_delete": Endpoint(
+        "admin", "delete", url("accounts:htmx_user_delete", "spare"), 4
+    ),
+    # orders
+    "orders:order-list": Endpoint("customer", "get", url("orders:order-list"), 1),
+    "orders:create-order-from-product": Endpoint(
+        "buyer",
+        "post",
+        url("orders:create-order-from-product", "product"),
+        9,
+        lambda seed: {"quantity": 1},
+        status=201,
+    ),
+    "orders:checkout": Endpoint(
+        "customer",
+        "post",
+        url("orders:checkout"),
+        7,
+        lambda seed: {"items": [{"product_id": seed.product.pk, "quantity": 2}]},
+        status=201,
+        json=True,
+    ),
+    "orders:order-events-export": Endpoint(
+        "admin", "get", url("orders:order-events-export"), 1
+    ),
+    # products
+    "products:create-product": Endpoint(
+        "shop",
+        "post",
+        url("products:create-product"),
+        1,
+        lambda seed: {"name": f"New {seed.size}", "price": "1.00", "weight": 1.0},
+        status=201,
+        json=True,
+    ),
+    "products:catalogue": Endpoint("customer", "get", url("products:catalogue"), 1),
+    "products:shop-catalogue": Endpoint(
+        "customer", "get", url("products:shop-catalogue", "shop"), 3
+    ),
+    "products:search": Endpoint(
+        "customer", "get", lambda seed: reverse("products:search") + "?q=product", 2
+    ),
+    "products:search-autocomplete": Endpoint(
+        "customer",
+        "get",
+        lambda seed: reverse("products:search-autocomplete") + "?q=prod",
+        2,
+    ),
+    "products:bulk-update": Endpoint(
+        "shop",
+        "post",
+        url("products:bulk-update"),
+        10,
+        lambda seed: {"price_percent": "0", "is_active": True},
+        json=True,
+    ),
+    "products:import-products": Endpoint(
+        "shop",
+        "post",
+        url("products:import-products"),
+        10,
+        lambda seed: {
+            "file": SimpleUploadedFile(
+                "products.csv", f"sku,name,price\nS{seed.size},Import,1\n".encode()
+            )
+        },
+        status=202,
+    ),
+    "products:import-status": Endpoint(
+        "shop",
+        "get",
+        lambda seed: reverse("products:import-status", args=["missing"]),
+        0,
+        status=404,
+    ),
+    "products:create-category": Endpoint(
+        "shop",
+        "post",
+        url("products:create-category"),
+        1,
+        lambda seed: {"name": f"New {seed.size}"},
+        status=201,
+        json=True,
+    ),
+    # delivery
+    "delivery:driver-route": Endpoint(
+        "driver", "get", url("delivery:driver-route", "driver"), 2
+    ),
+    "delivery:order-eta": Endpoint(
+        "customer", "get", url("delivery:order-eta", "order"), 2
+    ),
+    "delivery:report-location": Endpoint(
+        "driver",
+        "post",
+        url("delivery:report-location"),
+        0,
+        lambda seed: [{"latitude": 51.5, "longitude": -0.12}] * seed.size,
+        status=202,
+        json=True,
+    ),
+    "delivery:driver-location": Endpoint(
+        "driver", "get", url("delivery:driver-location", "driver"), 0
+    ),
+    "delivery:order-stream": Endpoint(
+        "customer", "get", url("delivery:order-stream", "order"), 3, asgi=True
+    ),
+    "delivery:customer-stream": Endpoint(
+        "customer",
+        "get",
+        url("delivery:customer-stream", "customer"),
+        3,
+        asgi=True,
+    ),
+}
+
+
+def project_url_names():
+    """Namespaced names of every URL pattern in the project apps."""
+    names = set()
+
+    def walk(patterns, namespace):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, pattern.namespace or namespace)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                if namespace in APP_NAMESPACES:
+                    names.add(f"{namespace}:{pattern.name}")
+
+    walk(get_resolver().url_patterns, None)
+    return names
+
+
+class EndpointBudgetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # A private buffer that is not flushed mid-run by pings from other tests.
+        buffer = LocationBuffer(flush_interval=3600)
+        patcher = patch("apps.delivery.views.location_buffer", buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(buffer.drain)
+        # Product imports store their uploads; keep them out of the project.
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def request(self, seed, endpoint):
+        # Event streams only run under ASGI.
+        client = AsyncClient() if endpoint.asgi else APIClient()
+        user = seed.user(endpoint.role)
+        if user:
+            client.force_login(user)
+            if not endpoint.asgi:
+                client.force_authenticate(user)
+        path = endpoint.path(seed)
+        data = endpoint.data(seed) if endpoint.data else None
+        kwargs = {"format": "json"} if endpoint.json else {}
+        send = getattr(client, endpoint.method)
+        if endpoint.asgi:
+            send = async_to_sync(send)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = send(path, data, **kwargs)
+            if response.streaming and not response.is_async:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        response.close()
+        return response.status_code, len(queries), elapsed
+
+    def test_every_url_has_a_budget(self):
+        """Ensure new endpoints cannot be added without a performance budget."""
+        self.assertEqual(set(ENDPOINTS), project_url_names())
+
+    def test_endpoint_budgets(self):
+        """Verify query ceilings, latency budgets and constant query counts per endpoint."""
+        seed = Seed()
+        report = {}
+        for size in SIZES:
+            seed.grow(size)
+            if size == SIZES[0]:
+                # Warm up templates and per-process caches so they are not measured.
+                for endpoint in ENDPOINTS.values():
+                    if endpoint.method == "get":
+                        self.request(seed, endpoint)
+            for name, endpoint in ENDPOINTS.items():
+                status, queries, elapsed = self.request(seed, endpoint)
+                entry = report.setdefault(
+                    name,
+                    {
+                        "max_queries": endpoint.max_queries,
+                        "budget_ms": endpoint.budget_ms * LATENCY_SCALE,
+                        "status": {},
+                        "queries": {},
+                        "latency_ms": {},
+                    },
+                )
+                entry["status"][size] = status
+                entry["queries"][size] = queries
+                entry["latency_ms"][size] = round(elapsed, 2)
+
+        if REPORT_PATH:
+            with open(REPORT_PATH, "w") as fh:
+                json.dump({"sizes": SIZES, "endpoints": report}, fh, indent=2)
+
+        for name, entry in report.items():
+            endpoint = ENDPOINTS[name]
+            with self.subTest(endpoint=name):
+                self.assertEqual(set(entry["status"].values()), {endpoint.status})
+                self.assertLessEqual(
+                    max(entry["queries"].values()), endpoint.max_queries
+                )
+                self.assertEqual(
+                    len(set(entry["queries"].values())),
+                    1,
+                    f"Query count grows with data size: {entry['queries']}",
+                )
+                if LATENCY_SCALE:
+                    self.assertLessEqual(
+                        entry["latency_ms"][SIZES[-1]], entry["budget_ms"]
+                    )
@@ -0,0 +1,682 @@
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from delivery_service.metrics import registry
+
+from apps.orders.models import Order, OrderItem
+from apps.products.cache import CatalogueCache, catalogue_cache
+from apps.products.importer import import_products, iter_rows
+from apps.products.models import Category, Product
+from apps.products.search import (
+    InMemoryBackend,
+    get_search_backend,
+    search_products,
+    tokenize,
+)
+from tests.helpers import create_user
+
+
+class CatalogueTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.other_shop = create_user("other", "shop")
+        self.customer = create_user("customer", "customer")
+        self.fruit = Category.objects.create(name="Fruit")
+        self.bakery = Category.objects.create(name="Bakery")
+        Product.objects.bulk_create(
+            Product(
+                name=f"Product {i:02d}",
+                price=Decimal(i + 1),
+                category=self.fruit if i % 2 else self.bakery,
+                supplier=self.shop if i < 6 else self.other_shop,
+                is_active=i != 0,
+            )
+            for i in range(10)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.url = reverse("products:catalogue")
+
+    def names(self, response):
+        return [product["name"] for product in response.data["results"]]
+
+    def test_catalogue_lists_active_products_by_name(self):
+        """Verify only active products are listed, in name order, across pages."""
+        response = self.client.get(self.url, {"page_size": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.names(response),
+            ["Product 01", "Product 02", "Product 03", "Product 04"],
+        )
+        self.assertEqual(response.data["results"][0]["category_name"], "Fruit")
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            self.names(response),
+            ["Product 05", "Product 06", "Product 07", "Product 08"],
+        )
+
+    def test_catalogue_filters(self):
+        """Ensure category, supplier and price range filters can be combined."""
+        response = self.client.get(
+            self.url,
+            {
+                "category": self.fruit.pk,
+                "supplier": self.shop.pk,
+                "min_price": "2",
+                "max_price": "5",
+            },
+        )
+        self.assertEqual(self.names(response), ["Product 01", "Product 03"])
+
+        response = self.client.get(self.url, {"min_price": "cheap"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        """Verify categories are joined rather than fetched per product."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"page_size": 9})
+        self.assertEqual(len(response.data["results"]), 9)
+        self.assertEqual(len(queries), 1)
+
+    def test_unchanged_page_is_not_modified(self):
+        """Ensure revalidating an unchanged page returns 304 and a changed one 200."""
+        response = self.client.get(self.url, {"page_size": 3})
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get(self.url, {"page_size": 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        Product.objects.filter(name="Product 02").update(
+            price=Decimal("9.99"), updated_at=timezone.now() + timedelta(seconds=5)
+        )
+        response = self.client.get(self.url, {"page_size": 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_category_rename_changes_validators(self):
+        """Ensure renaming a category invalidates cached pages that show its name."""
+        response = self.client.get(self.url, {"page_size": 3})
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        Category.objects.filter(pk=self.fruit.pk).update(
+            name="Renamed", updated_at=timezone.now() + timedelta(seconds=5)
+        )
+        response = self.client.get(self.url, {"page_size": 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["category_name"], "Renamed")
+        response = self.client.get(
+            self.url, {"page_size": 3}, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_products_leaving_the_page_move_last_modified(self):
+        """Ensure deactivating a product on a page fails If-Modified-Since revalidation."""
+        response = self.client.get(self.url, {"page_size": 3})
+        last_modified = response["Last-Modified"]
+        product = Product.objects.get(pk=response.data["results"][-1]["id"])
+
+        later = time.time() + 5
+        with patch("apps.products.cache.time.time", return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                product.is_active = False
+                product.save()
+        response = self.client.get(
+            self.url, {"page_size": 3}, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(product.pk, [row["id"] for row in response.data["results"]])
+
+    def test_if_modified_since(self):
+        """Verify Last-Modified can be used to revalidate a page."""
+        response = self.client.get(self.url)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalogue_requires_authentication(self):
+        """Ensure anonymous clients cannot browse the catalogue."""
+        response = APIClient().get(self.url)
+        self.assertIn(response.status_code, (401, 403))
+
+
+class InMemorySearchTestCase(TestCase):
+
+    def setUp(self):
+        self.backend = InMemoryBackend()
+        self.backend.update(
+            [
+                (1, "Green Apple", "Fruit"),
+                (2, "Apple Pie", "Bakery"),
+                (3, "Crème brûlée", "Bakery"),
+                (4, "Pear", "Fruit"),
+            ]
+        )
+
+    def ids(self, query, **kwargs):
+        return [product_id for product_id, _ in self.backend.search(query, **kwargs)]
+
+    def test_tokenize_normalizes_case_and_diacritics(self):
+        """Verify words are lowercased and stripped of accents."""
+        self.assertEqual(tokenize("Crème-Brûlée, 2x!"), ["creme", "brulee", "2x"])
+
+    def test_all_terms_must_match(self):
+        """Ensure every query word must appear in the name or category."""
+        self.assertEqual(self.ids("apple bakery"), [2])
+        self.assertEqual(self.ids("creme brulee"), [3])
+        self.assertEqual(self.ids("apple banana"), [])
+        self.assertEqual(self.ids("   "), [])
+
+    def test_names_rank_above_categories(self):
+        """Verify a name match outranks a category match."""
+        self.backend.update([(5, "Fruit Salad", "Bakery")])
+        self.assertEqual(self.ids("fruit")[0], 5)
+
+    def test_prefix_matches_only_the_last_word(self):
+        """Ensure autocomplete expands only the word being typed."""
+        self.assertEqual(self.ids("app", prefix=True), [1, 2])
+        self.assertEqual(self.ids("app"), [])
+        self.assertEqual(self.ids("gr app", prefix=True), [])
+        self.assertEqual(self.ids("green app", prefix=True), [1])
+
+    def test_updates_and_removals_are_incremental(self):
+        """Verify reindexing a product replaces its terms and removal drops them."""
+        self.backend.update([(4, "Conference Pear", "Fruit")])
+        self.assertEqual(self.ids("conference"), [4])
+
+        self.backend.remove([4])
+        self.assertEqual(self.ids("pear"), [])
+        self.assertEqual(self.ids("con", prefix=True), [])
+
+
+class ProductSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.shop = create_user("shop", "shop")
+        self.customer = create_user("customer", "customer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fruit = Category.objects.create(name="Fruit")
+            self.apple = self.create("Green Apple", self.fruit)
+            self.pie = self.create("Apple Pie")
+            self.pear = self.create("Pear", self.fruit)
+
+    def create(self, name, category=None):
+        return Product.objects.create(
+            name=name,
+            price=Decimal("1.00"),
+            category=category,
+            supplier=self.shop,
+            is_active=True,
+        )
+
+    def search(self, query, name="products:search"):
+        response = self.client.get(reverse(name), {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [product["name"] for product in response.data["results"]]
+
+    def test_search_ranks_names_above_categories(self):
+        """Verify the database backend returns ranked matches with their details."""
+        self.assertEqual(self.search("fruit pear"), ["Pear"])
+        self.assertEqual(self.search("apple")[:2], ["Apple Pie", "Green Apple"])
+        response = self.client.get(reverse("products:search"), {"q": "green"})
+        self.assertEqual(response.data["results"][0]["category_name"], "Fruit")
+
+    def test_autocomplete_matches_prefixes(self):
+        """Ensure a partially typed word suggests product names."""
+        self.assertEqual(
+            self.search("gre", "products:search-autocomplete"), ["Green Apple"]
+        )
+        self.assertEqual(self.search("gre"), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        """Verify products are reindexed when they or their category change."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pear.is_active = False
+            self.pear.save()
+            self.pie.delete()
+            self.fruit.name = "Orchard"
+            self.fruit.save()
+
+        self.assertEqual(self.search("pear"), [])
+        self.assertEqual(self.search("pie"), [])
+        self.assertEqual(self.search("orchard"), ["Green Apple"])
+
+    def test_rebuild_command_indexes_bulk_changes(self):
+        """Ensure the rebuild command picks up changes made without signals."""
+        Product.objects.filter(pk=self.pear.pk).update(name="Quince")
+        self.assertEqual(self.search("quince"), [])
+
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 3 products", out.getvalue())
+        self.assertEqual(self.search("quince"), ["Quince"])
+
+    def test_search_uses_the_database_backend(self):
+        """Verify SQLite databases use the FTS5 backend and search in two queries."""
+        self.assertEqual(type(get_search_backend()).__name__, "SQLiteBackend")
+        with CaptureQueriesContext(connection) as queries:
+            self.search("apple")
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(search_products(""), [])
+
+
+class CatalogueCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalogue_cache.clear_local()
+        registry.reset()
+        self.shop = create_user("shop", "shop")
+        self.customer = create_user("customer", "customer")
+        self.fruit = Category.objects.create(name="Fruit")
+        self.shop.shop_profile.product_categories.add(self.fruit)
+        self.apple = Product.objects.create(
+            name="Apple",
+            price=Decimal("1.00"),
+            category=self.fruit,
+            supplier=self.shop,
+            is_active=True,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.url = reverse("products:shop-catalogue", args=[self.shop.pk])
+
+    def get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def cache_results(self):
+        return {
+            result: registry.counter("product_catalogue_cache_total", result=result)
+            for result in ("local_hit", "shared_hit", "miss")
+        }
+
+    def test_catalogue_is_served_from_cache(self):
+        """Verify repeated reads skip the database and count as cache hits."""
+        data = self.get()
+        self.assertEqual(data["categories"], [{"id": self.fruit.pk, "name": "Fruit"}])
+        self.assertEqual([product["name"] for product in data["products"]], ["Apple"])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(), data)
+        self.assertEqual(len(queries), 0)
+
+        catalogue_cache.clear_local()
+        self.get()
+        self.assertEqual(
+            self.cache_results(), {"local_hit": 1, "shared_hit": 1, "miss": 1}
+        )
+
+    def test_product_changes_bump_the_shop_version(self):
+        """Ensure saving or deleting a product invalidates its shop's catalogue."""
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.price = Decimal("2.50")
+            self.apple.save()
+        self.assertEqual(self.get()["products"][0]["price"], "2.50")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.delete()
+        self.assertEqual(self.get()["products"], [])
+
+    def test_category_changes_invalidate_catalogues(self):
+        """Verify renaming a category or changing a shop's categories refreshes it."""
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fruit.name = "Orchard"
+            self.fruit.save()
+        self.assertEqual(self.get()["products"][0]["category_name"], "Orchard")
+
+        bakery = Category.objects.create(name="Bakery")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.shop_profile.product_categories.add(bakery)
+        self.assertEqual(
+            [category["name"] for category in self.get()["categories"]],
+            ["Bakery", "Orchard"],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bakery.shopprofile_set.clear()
+        self.assertEqual(
+            [category["name"] for category in self.get()["categories"]], ["Orchard"]
+        )
+
+    def test_other_shops_stay_cached(self):
+        """Ensure one shop's changes do not invalidate another shop's entries."""
+        other = create_user("other", "shop")
+        other_url = reverse("products:shop-catalogue", args=[other.pk])
+        self.client.get(other_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(other_url)
+        self.assertEqual(len(queries), 0)
+
+    def test_unknown_shop_is_not_found(self):
+        """Verify a catalogue for a non-shop user returns 404."""
+        url = reverse("products:shop-catalogue", args=[self.customer.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_local_entries_are_evicted_least_recently_used_first(self):
+        """Verify the in-process front keeps only the most recently used entries."""
+        local = CatalogueCache(size=2)
+        calls = []
+
+        def loader(name):
+            calls.append(name)
+            return name
+
+        for name in ["a", "b", "a", "c"]:
+            local.get_or_set(self.shop.pk, name, lambda name=name: loader(name))
+        self.assertEqual(calls, ["a", "b", "c"])
+        self.assertEqual(len(local._entries), 2)
+        self.assertTrue(any(key.endswith(":a") for key in local._entries))
+        self.assertFalse(any(key.endswith(":b") for key in local._entries))
+
+
+class ProductImportTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        catalogue_cache.clear_local()
+        self.shop = create_user("shop", "shop")
+        self.fruit = Category.objects.create(name="Fruit")
+        self.client = APIClient()
+        self.client.force_authenticate(self.shop)
+
+    def run_import(self, data, format="csv", **kwargs):
+        stream = BytesIO(data.encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_products(self.shop, iter_rows(stream, format), **kwargs)
+
+    def test_csv_rows_are_created(self):
+        """Verify CSV rows become the shop's products with their category."""
+        result = self.run_import(
+            "sku,name,price,weight,category,is_active\n"
+            "A1,Apple,1.50,0.2,fruit,yes\n"
+            "B2,Bread,2,,,0\n"
+        )
+        self.assertEqual((result.processed, result.imported, result.failed), (2, 2, 0))
+        apple = Product.objects.get(supplier=self.shop, sku="A1")
+        self.assertEqual(apple.category, self.fruit)
+        self.assertEqual(apple.price, Decimal("1.50"))
+        self.assertFalse(Product.objects.get(sku="B2").is_active)
+
+    def test_existing_skus_are_updated(self):
+        """Ensure a second import updates products by SKU instead of duplicating them."""
+        self.run_import("sku,name,price\nA1,Apple,1\n")
+        self.run_import("sku,name,price\nA1,Green apple,3\nA1,Red apple,4\n")
+        product = Product.objects.get(supplier=self.shop)
+        self.assertEqual((product.name, product.price), ("Red apple", Decimal("4")))
+
+    def test_invalid_rows_are_reported_with_line_numbers(self):
+        """Verify invalid rows are skipped and reported by line."""
+        result = self.run_import(
+            "sku,name,price,weight,category\n"
+            "A1,Apple,1,0.2,Fruit\n"
+            "B2,Bread,-1,,\n"
+            "C3,Cake,1,250,\n"
+            "D4,Dates,1,,Nuts\n"
+            ",Nameless,1,,\n"
+        )
+        self.assertEqual((result.imported, result.failed), (1, 4))
+        self.assertEqual([error["line"] for error in result.errors], [3, 4, 5, 6])
+        self.assertIn("Unknown category", result.errors[2]["error"])
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_ndjson_rows(self):
+        """Verify NDJSON is parsed line by line and bad lines are reported."""
+        lines = [
+            json.dumps({"sku": "A1", "name": "Apple", "price": "1.5"}),
+            "",
+            "{not json",
+            "[1, 2]",
+            json.dumps({"sku": "B2", "name": "Bread", "price": 2, "is_active": False}),
+        ]
+        result = self.run_import("\n".join(lines), format="ndjson")
+        self.assertEqual((result.imported, result.failed), (2, 2))
+        self.assertEqual([error["line"] for error in result.errors], [3, 4])
+
+    def test_progress_is_reported_per_batch(self):
+        """Verify progress is published after every batch."""
+        rows = "".join(f"S{i},Item {i},1\n" for i in range(5))
+        reports = []
+        self.run_import(
+            "sku,name,price\n" + rows, batch_size=2, progress=reports.append
+        )
+        self.assertEqual([report.processed for report in reports], [2, 4, 5])
+        self.assertEqual(Product.objects.count(), 5)
+
+    def test_import_updates_search_and_catalogue_cache(self):
+        """Ensure imported products are searchable and cached catalogues refreshed."""
+        url = reverse("products:shop-catalogue", args=[self.shop.pk])
+        self.assertEqual(self.client.get(url).json()["products"], [])
+        self.run_import("sku,name,price\nA1,Quince jelly,1\n")
+        self.assertEqual(len(self.client.get(url).json()["products"]), 1)
+        product = Product.objects.get(sku="A1")
+        self.assertEqual([pk for pk, _ in search_products("quince")], [product.pk])
+
+    def test_upload_is_imported_by_a_task(self):
+        """Verify an upload is imported and its status reports the result."""
+        upload = SimpleUploadedFile(
+            "products.csv", b"sku,name,price\nA1,Apple,1\nB2,Bread,x\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("products:import-products"), {"file": upload}
+            )
+        self.assertEqual(response.status_code, 202)
+        status = self.client.get(
+            reverse("products:import-status", args=[response.json()["import_id"]])
+        ).json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual((status["imported"], status["failed"]), (1, 1))
+        self.assertTrue(Product.objects.filter(supplier=self.shop, sku="A1").exists())
+
+    def test_upload_requires_a_known_format_and_shop_role(self):
+        """Ensure unknown formats and non-shop users are rejected."""
+        url = reverse("products:import-products")
+        upload = SimpleUploadedFile("products.xlsx", b"...")
+        self.assertEqual(self.client.post(url, {"file": upload}).status_code, 400)
+
+        self.client.force_authenticate(create_user("customer", "customer"))
+        upload = SimpleUploadedFile("products.csv", b"sku,name,price\n")
+        self.assertEqual(self.client.post(url, {"file": upload}).status_code, 403)
+
+    def test_status_is_private_to_the_shop(self):
+        """Ensure other users cannot see an import's status."""
+        upload = SimpleUploadedFile("products.csv", b"sku,name,price\n")
+        response = self.client.post(
+            reverse("products:import-products"), {"file": upload}
+        )
+        url = reverse("products:import-status", args=[response.json()["import_id"]])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_authenticate(create_user("other", "shop"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_import_command(self):
+        """Verify the command imports a file and prints the rows that failed."""
+        path = f"{self.media_root}/products.ndjson"
+        with open(path, "w") as file:
+            file.write('{"sku": "A1", "name": "Apple", "price": 1}\n{"sku": "B2"}\n')
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_products", path, shop=self.shop.username, stdout=out, stderr=err
+        )
+        self.assertIn("1 imported, 1 failed", out.getvalue())
+        self.assertIn("Line 2: price is required.", err.getvalue())
+        self.assertTrue(Product.objects.filter(sku="A1").exists())
+
+
+class BulkProductUpdateTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalogue_cache.clear_local()
+        self.shop = create_user("shop", "shop")
+        self.other = create_user("other", "shop")
+        self.fruit = Category.objects.create(name="Fruit")
+        self.apple = Product.objects.create(
+            name="Apple",
+            price=Decimal("2.00"),
+            category=self.fruit,
+            supplier=self.shop,
+            is_active=True,
+        )
+        self.pear = Product.objects.create(
+            name="Pear",
+            price=Decimal("3.00"),
+            category=self.fruit,
+            supplier=self.shop,
+            is_active=True,
+        )
+        self.bread = Product.objects.create(
+            name="Bread", price=Decimal("1.00"), supplier=self.shop, is_active=True
+        )
+        self.plum = Product.objects.create(
+            name="Plum",
+            price=Decimal("5.00"),
+            category=self.fruit,
+            supplier=self.other,
+            is_active=True,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.shop)
+
+    def update(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("products:bulk-update"), data, format="json"
+            )
+
+    def prices(self):
+        return dict(Product.objects.values_list("name", "price"))
+
+    def order(self, status, *items):
+        order = Order.objects.create(shop=self.shop, status=status)
+        for product, quantity in items:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        order.refresh_from_db()
+        return order
+
+    def test_fractional_percentage_change(self):
+        """Verify fractional percentages are not rounded before they are applied."""
+        self.update(ids=[self.apple.pk], price_percent="7.5")
+        self.update(ids=[self.pear.pk], price_percent="-33.33")
+        prices = self.prices()
+        self.assertEqual(prices["Apple"], Decimal("2.15"))
+        self.assertEqual(prices["Pear"], Decimal("2.00"))
+
+    def test_percentage_change_by_category(self):
+        """Verify a percentage change applies to the shop's products in a category."""
+        response = self.update(category=self.fruit.pk, price_percent="-10")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["products_updated"], 2)
+        self.assertEqual(
+            self.prices(),
+            {
+                "Apple": Decimal("1.80"),
+                "Pear": Decimal("2.70"),
+                "Bread": Decimal("1.00"),
+                "Plum": Decimal("5.00"),
+            },
+        )
+
+    def test_absolute_change_by_ids_never_goes_negative(self):
+        """Ensure absolute changes apply to listed ids and clamp at zero."""
+        self.update(ids=[self.apple.pk, self.bread.pk], price_delta="-1.50")
+        prices = self.prices()
+        self.assertEqual(prices["Apple"], Decimal("0.50"))
+        self.assertEqual(prices["Bread"], Decimal("0.00"))
+        self.assertEqual(prices["Pear"], Decimal("3.00"))
+
+    def test_created_orders_are_repriced(self):
+        """Verify only created orders pick up new prices, in their items and totals."""
+        created = self.order("created", (self.apple, 2), (self.bread, 1))
+        submitted = self.order("submitted", (self.apple, 2))
+        self.assertEqual(created.total_amount, Decimal("5.00"))
+
+        response = self.update(ids=[self.apple.pk], price_delta="1")
+        self.assertEqual(response.json()["orders_updated"], 1)
+        created.refresh_from_db()
+        submitted.refresh_from_db()
+        self.assertEqual(created.total_amount, Decimal("7.00"))
+        self.assertEqual(
+            sorted(created.items.values_list("total_price", flat=True)),
+            [Decimal("1.00"), Decimal("6.00")],
+        )
+        self.assertEqual(submitted.total_amount, Decimal("4.00"))
+
+    def test_update_is_set_based(self):
+        """Ensure the query count does not depend on how many products change."""
+
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.update(price_percent="5")
+            return len(queries)
+
+        few = count()
+        Product.objects.bulk_create(
+            Product(name=f"Extra {i}", price=1, supplier=self.shop) for i in range(50)
+        )
+        self.assertEqual(count(), few)
+
+    def test_deactivation_updates_search_and_cache(self):
+        """Verify deactivated products leave search results and cached catalogues."""
+        url = reverse("products:shop-catalogue", args=[self.shop.pk])
+        self.assertEqual(len(self.client.get(url).json()["products"]), 3)
+        self.update(category=self.fruit.pk, is_active=False)
+        self.assertEqual(len(self.client.get(url).json()["products"]), 1)
+        self.assertEqual(search_products("apple"), [])
+        self.assertTrue(Product.objects.get(pk=self.plum.pk).is_active)
+
+    def test_shops_cannot_update_other_shops_products(self):
+        """Ensure a shop's filters are limited to its own products."""
+        response = self.update(supplier=self.other.pk, price_delta="1")
+        self.assertEqual(response.json()["products_updated"], 0)
+        self.assertEqual(self.prices()["Plum"], Decimal("5.00"))
+
+    def test_invalid_requests(self):
+        """Ensure conflicting, empty or unauthorized changes are rejected."""
+        self.assertEqual(
+            self.update(price_percent="5", price_delta="1").status_code, 400
+        )
+        self.assertEqual(self.update(category=self.fruit.pk).status_code, 400)
+
+        admin = create_user("boss", "admin")
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.update(is_active=False).status_code, 400)
+        response = self.update(supplier=self.other.pk, price_delta="1")
+        self.assertEqual(response.json()["products_updated"], 1)
+
+        self.client.force_authenticate(create_user("customer", "customer"))
+        self.assertEqual(self.update(is_active=False).status_code, 403)